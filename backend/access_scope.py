@@ -0,0 +1,319 @@
+# Per-user access scope cache
+# A user's scope is the teams they belong to, the members of those teams and
+# the projects they can see (own projects + projects of their teams). Building
+# it takes a teams query and a projects query, which almost every handler used
+# to repeat; here it is built once per user and kept for a short TTL.
+#
+# The cache is per process. Handlers that change membership or project
+# ownership invalidate the affected users right away; other workers pick the
+# change up when their entry expires.
+#
+# Projects also carry a materialized ACL, access_principals: 'user:<name>' for
+# the owner and every member of the project's team plus 'team:<team_id>'. With
+# its multikey index, "projects visible to u" is the single equality match
+# {'access_principals': 'user:u'}. The team handlers keep it up to date; the
+# backfill fills it in for projects created before it existed.
+#
+# Usage:
+#   python access_scope.py backfill [batch_size]   # resumable
+#   python access_scope.py status
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from pymongo import UpdateMany, UpdateOne
+
+PRINCIPALS_MIGRATION_ID = 'project_access_principals'
+
+
+def user_principal(username):
+    return f'user:{username}'
+
+
+def team_principal(team_id):
+    return f'team:{team_id}'
+
+
+def project_principals(created_by, team_id=None, members=()):
+    """access_principals for a project: owner, team and team members"""
+    principals = [user_principal(created_by)] if created_by else []
+    if team_id:
+        principals.append(team_principal(team_id))
+        principals.extend(user_principal(username) for username in members if username)
+    return list(dict.fromkeys(principals))
+
+
+class ProjectPrincipals:
+    """Maintains projects.access_principals as team membership changes"""
+
+    def __init__(self, db, mode='auto'):
+        self.projects = db['projects']
+        self.teams = db['teams']
+        self.migrations = db['migrations']
+        self.mode = mode
+        self._checked_at = None
+        self._ready = False
+
+    def enabled(self):
+        """
+        Whether access queries may rely on access_principals:
+        ACCESS_PRINCIPALS_QUERY=true/false, or auto (the default) once the
+        backfill has completed. Rechecked at most once a minute.
+        """
+        if self.mode != 'auto':
+            return self.mode == 'true'
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at > 60:
+            state = self.migrations.find_one({'_id': PRINCIPALS_MIGRATION_ID}, {'completed_at': 1})
+            self._ready = bool(state and state.get('completed_at'))
+            self._checked_at = now
+        return self._ready
+
+    @staticmethod
+    def _member_names(team):
+        return [m.get('username') for m in (team or {}).get('members', [])]
+
+    def member_added(self, team_id, username):
+        self.projects.update_many({'team_id': team_id}, {'$addToSet': {'access_principals': user_principal(username)}})
+
+    def members_removed(self, team_id, usernames, team_deleted=False):
+        # A member who owns one of the team's projects keeps access to that one
+        ops = [
+            UpdateMany({'team_id': team_id, 'created_by': {'$ne': username}}, {'$pull': {'access_principals': user_principal(username)}})
+            for username in usernames if username
+        ]
+        if team_deleted:
+            ops.append(UpdateMany({'team_id': team_id}, {'$pull': {'access_principals': team_principal(team_id)}}))
+        if ops:
+            self.projects.bulk_write(ops, ordered=False)
+
+    def team_deleted(self, team_id, usernames):
+        self.members_removed(team_id, usernames, team_deleted=True)
+
+    def team_assigned_update(self, team_id, members):
+        """Update document that assigns a project to team_id"""
+        return {
+            '$set': {'team_id': team_id},
+            '$addToSet': {'access_principals': {'$each': [team_principal(team_id)] + [user_principal(u) for u in members if u]}}
+        }
+
+    # Backfill
+
+    def _backfill_ops(self, batch):
+        team_ids = list({p['team_id'] for p in batch if p.get('team_id')})
+        members = {
+            team['team_id']: self._member_names(team)
+            for team in self.teams.find({'team_id': {'$in': team_ids}}, {'team_id': 1, 'members.username': 1, '_id': 0})
+        } if team_ids else {}
+        return [
+            UpdateOne(
+                {'_id': p['_id']},
+                {'$set': {'access_principals': project_principals(p.get('created_by'), p.get('team_id'), members.get(p.get('team_id'), []))}}
+            )
+            for p in batch
+        ]
+
+    def backfill(self, batch_size=500, log=print):
+        """
+        Recompute access_principals for every project in _id order, with a
+        checkpoint after each batch so an interrupted run resumes where it stopped.
+        """
+        state = self.migrations.find_one({'_id': PRINCIPALS_MIGRATION_ID}) or {}
+        last_id = state.get('last_id')
+        documents = state.get('documents', 0)
+        projection = {'created_by': 1, 'team_id': 1}
+
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+            batch = list(self.projects.find(query, projection).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+            self.projects.bulk_write(self._backfill_ops(batch), ordered=False)
+            last_id = batch[-1]['_id']
+            documents += len(batch)
+            self.migrations.update_one(
+                {'_id': PRINCIPALS_MIGRATION_ID},
+                {'$set': {'last_id': last_id, 'documents': documents, 'updated_at': datetime.now(timezone.utc)}},
+                upsert=True
+            )
+            log(f"{PRINCIPALS_MIGRATION_ID}: {documents} projects")
+
+        self.migrations.update_one(
+            {'_id': PRINCIPALS_MIGRATION_ID},
+            {'$set': {'completed_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self._checked_at = None
+        return {'documents': documents}
+
+    def status(self):
+        return {
+            'mode': self.mode,
+            'enabled': self.enabled(),
+            'backfill': self.migrations.find_one({'_id': PRINCIPALS_MIGRATION_ID}, {'_id': 0, 'last_id': 0}),
+            'projects_without_principals': self.projects.count_documents({'access_principals': {'$exists': False}})
+        }
+
+
+class AccessScope:
+    def __init__(self, username, team_ids, team_members, projects_collection, use_principals=False):
+        self.username = username
+        self.team_ids = team_ids
+        self.team_members = team_members  # usernames across the user's teams, the user included
+        self.projects_collection = projects_collection
+        self.use_principals = use_principals
+        self.expires_at = None
+        self._project_ids = None
+        self._lock = threading.Lock()
+
+    def project_query(self):
+        """Mongo filter for the projects this user can see"""
+        if self.use_principals:
+            return {'access_principals': user_principal(self.username)}
+        return {
+            '$or': [
+                {'created_by': self.username},
+                {'team_id': {'$in': self.team_ids}}
+            ]
+        }
+
+    @property
+    def has_project_ids(self):
+        return self._project_ids is not None
+
+    @property
+    def project_ids(self):
+        """Accessible project ids, loaded on first use"""
+        if self._project_ids is None:
+            with self._lock:
+                if self._project_ids is None:
+                    self._project_ids = [
+                        p['project_id'] for p in self.projects_collection.find(self.project_query(), {'project_id': 1, '_id': 0})
+                    ]
+                    self._project_id_set = frozenset(self._project_ids)
+        return self._project_ids
+
+    def knows_project(self, project_id):
+        """True when project_id is in the already loaded project ids"""
+        return self._project_ids is not None and project_id in self._project_id_set
+
+
+class AccessScopeCache:
+    def __init__(self, teams_collection, projects_collection, ttl_seconds=60, max_entries=10000, principals=None):
+        self.teams_collection = teams_collection
+        self.projects_collection = projects_collection
+        self.principals = principals
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # username -> AccessScope
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.round_trips_saved = 0
+
+    def _build(self, username):
+        team_ids = []
+        members = {username}
+        for team in self.teams_collection.find({'members.username': username}, {'team_id': 1, 'members.username': 1, '_id': 0}):
+            team_ids.append(team['team_id'])
+            members.update(m['username'] for m in team.get('members', []) if m.get('username'))
+        use_principals = self.principals is not None and self.principals.enabled()
+        return AccessScope(username, team_ids, sorted(members), self.projects_collection, use_principals)
+
+    def get(self, username):
+        """Returns (scope, hit)"""
+        now = time.monotonic()
+        with self.lock:
+            scope = self.entries.get(username)
+            if scope is not None and scope.expires_at > now:
+                self.entries.move_to_end(username)
+                self.hits += 1
+                return scope, True
+            self.misses += 1
+
+        scope = self._build(username)
+        scope.expires_at = now + self.ttl_seconds
+        if self.ttl_seconds > 0:
+            with self.lock:
+                self.entries[username] = scope
+                self.entries.move_to_end(username)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return scope, False
+
+    def record_saved(self, count):
+        with self.lock:
+            self.round_trips_saved += count
+
+    # Invalidation
+
+    def _drop(self, usernames):
+        with self.lock:
+            dropped = 0
+            for username in usernames:
+                if self.entries.pop(username, None) is not None:
+                    dropped += 1
+            self.invalidations += dropped
+
+    def invalidate_users(self, *usernames):
+        self._drop([u for u in usernames if u])
+
+    def invalidate_team(self, team_id, *usernames):
+        """Membership of team_id changed: drop its cached members plus the given users"""
+        with self.lock:
+            affected = [u for u, scope in self.entries.items() if team_id in scope.team_ids]
+        self._drop(affected + [u for u in usernames if u])
+
+    def invalidate_project(self, created_by, team_id=None):
+        """A project was created, reassigned or deleted"""
+        if team_id:
+            self.invalidate_team(team_id, created_by)
+        else:
+            self.invalidate_users(created_by)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'round_trips_saved': self.round_trips_saved
+            }
+
+
+def principals_from_env(db):
+    return ProjectPrincipals(db, mode=os.getenv('ACCESS_PRINCIPALS_QUERY', 'auto').lower())
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/PLANGRID_DATA'), serverSelectionTimeoutMS=5000)
+    db = client[os.getenv('MONGO_DB', 'material_forecast')]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    principals = principals_from_env(db)
+
+    if command == 'backfill':
+        principals.projects.create_index('access_principals')
+        totals = principals.backfill(batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+        print(f"Backfill complete: {totals['documents']} projects")
+    elif command == 'status':
+        print(principals.status())
+    else:
+        raise SystemExit('Usage: python access_scope.py [backfill [batch_size] | status]')
@@ -0,0 +1,338 @@
+# Precomputed views of the reference dataset for the analytics routes
+# Built once when the dataset finishes loading, off the request path. Request
+# handlers only index into these views and never touch the shared DataFrame.
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset_schema import season_values, widen
+
+# Dataset columns /api/analytics/materials can filter on
+CUBE_DIMENSIONS = ('project_location', 'tower_type', 'substation_type', 'region_risk_flag')
+
+
+def material_columns(frame):
+    """quantity_* columns in dataset order (the model's target columns)"""
+    return [col for col in frame.columns if col.startswith('quantity_')]
+
+
+class PayloadCache:
+    """Serialized responses by normalized request key, least recently used dropped first"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
+
+
+class MaterialCube:
+    """
+    Monthly material consumption. `totals` (month x material) backs the
+    unfiltered view; `cube` (month x one axis per dimension x material) backs
+    the filtered ones. Each distinct filter is serialized once and the JSON
+    payload reused.
+    """
+
+    def __init__(self, months, materials, totals, dimensions, levels, cube, serialize=json.dumps, max_payloads=256):
+        self.months = months
+        self.materials = materials
+        self.totals = totals
+        self.dimensions = dimensions
+        self.levels = levels  # dimension -> {value: index along its axis}
+        self.cube = cube
+        self.serialize = serialize
+        self.unfiltered = serialize(self._trends(totals))
+        self.payloads = PayloadCache(max_payloads)
+
+    @classmethod
+    def build(cls, frame, materials=None, dimensions=CUBE_DIMENSIONS, **kwargs):
+        materials = materials or material_columns(frame)
+        # Parsed into a new Series; the frame itself is left untouched
+        periods = pd.to_datetime(frame['timestamp']).dt.to_period('M')
+        quantities = widen(frame, materials)
+        monthly = quantities.groupby(periods).sum()
+        months = [str(period) for period in monthly.index]
+
+        dimensions = [dim for dim in dimensions if dim in frame.columns]
+        month_codes = pd.Categorical(periods, categories=monthly.index).codes
+        keep = month_codes >= 0  # rows without a timestamp are not in any month
+        codes = [month_codes[keep]]
+        levels = {}
+        for dim in dimensions:
+            dim_codes, uniques = pd.factorize(frame[dim].astype(str), sort=True)
+            codes.append(dim_codes[keep])
+            levels[dim] = {value: i for i, value in enumerate(uniques)}
+
+        cube = np.zeros((len(months), *(len(levels[dim]) for dim in dimensions), len(materials)))
+        values = np.nan_to_num(quantities.to_numpy(dtype=np.float64)[keep])
+        np.add.at(cube, tuple(codes), values)
+        return cls(months, materials, monthly.to_numpy(dtype=np.float64), dimensions, levels, cube, **kwargs)
+
+    def _trends(self, values):
+        return {
+            col: {'dates': self.months, 'values': values[:, i].tolist()}
+            for i, col in enumerate(self.materials)
+        }
+
+    def _slice(self, filters):
+        index = [slice(None)]
+        for dim in self.dimensions:
+            if dim in filters:
+                index.append(self.levels[dim][filters[dim]])
+            else:
+                index.append(slice(None))
+        selected = self.cube[tuple(index)]
+        # Sum out the dimensions left unfiltered, keeping month x material
+        return selected.reshape(len(self.months), -1, len(self.materials)).sum(axis=1)
+
+    def payload(self, filters=None):
+        """
+        Serialized {material: {'dates', 'values'}} for the rows matching
+        filters ({dimension: value}); KeyError for an unknown dimension or value.
+        """
+        if not filters:
+            return self.unfiltered
+        for dim, value in filters.items():
+            if dim not in self.levels:
+                raise KeyError(f'Unknown dimension {dim}')
+            if value not in self.levels[dim]:
+                raise KeyError(f'Unknown {dim} {value!r}')
+        key = tuple(sorted(filters.items()))
+        payload = self.payloads.get(key)
+        if payload is None:
+            payload = self.serialize(self._trends(self._slice(filters)))
+            self.payloads.put(key, payload)
+        return payload
+
+
+# Per-project attributes (first value in the dataset) and the columns that get
+# a value -> rows index
+PROJECT_ATTRIBUTES = ('budget', 'project_location', 'tower_type', 'substation_type', 'project_size_km', 'region_risk_flag')
+PROJECT_INDEXES = ('project_id', 'project_location', 'tower_type', 'region_risk_flag')
+
+
+class ProjectTable:
+    """
+    One row per project_id (sorted), with its attributes and material totals,
+    kept as column arrays. Filters are NumPy masks built from per-value row
+    positions and numeric ranges; sorting walks a precomputed order per column.
+    """
+
+    def __init__(self, table, serialize=json.dumps):
+        self.size = len(table)
+        self.columns = {col: table[col].to_numpy() for col in table.columns}
+        self.numeric = [col for col in table.columns if pd.api.types.is_numeric_dtype(table[col])]
+        self.records = table.to_dict('records')
+        self.indexes = {
+            col: {value: positions for value, positions in table.groupby(col, sort=False).indices.items()}
+            for col in PROJECT_INDEXES if col in table.columns
+        }
+        self.orders = {col: np.argsort(values, kind='stable') for col, values in self.columns.items()}
+        self.payload = serialize(self.records)
+
+    @classmethod
+    def build(cls, frame, materials=None, **kwargs):
+        materials = materials or material_columns(frame)
+        attributes = [col for col in PROJECT_ATTRIBUTES if col in frame.columns]
+        table = frame.groupby('project_id').agg({col: 'first' for col in attributes}).reset_index()
+        totals = widen(frame, materials).groupby(frame['project_id']).sum().reset_index()
+        return cls(table.merge(totals, on='project_id'), **kwargs)
+
+    def query(self, filters=None, ranges=None, sort=None, descending=False, offset=0, limit=None):
+        """
+        (total matches, records) for projects matching every filter
+        ({indexed column: [values]}, any value matches) and range
+        ({numeric column: (low, high)}, inclusive, None for open), ordered by
+        sort and paged with offset/limit. ValueError for unknown columns.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for col, values in (filters or {}).items():
+            if col not in self.indexes:
+                raise ValueError(f'Cannot filter on {col}')
+            selected = np.zeros(self.size, dtype=bool)
+            for value in values:
+                positions = self.indexes[col].get(value)
+                if positions is not None:
+                    selected[positions] = True
+            mask &= selected
+        for col, (low, high) in (ranges or {}).items():
+            if col not in self.numeric:
+                raise ValueError(f'Cannot filter on a range of {col}')
+            if low is not None:
+                mask &= self.columns[col] >= low
+            if high is not None:
+                mask &= self.columns[col] <= high
+
+        if sort is None:
+            order = np.arange(self.size)
+        elif sort in self.orders:
+            order = self.orders[sort]
+        else:
+            raise ValueError(f'Cannot sort by {sort}')
+        if descending:
+            order = order[::-1]
+        rows = order[mask[order]]
+        page = rows[offset:None if limit is None else offset + limit]
+        return len(rows), [self.records[i] for i in page]
+
+
+# Dimensions /api/analytics/query can group and filter by (month is derived
+# from timestamp, season from the start month when the dataset has no season
+# column), and the aggregations it offers per numeric column
+QUERY_DIMENSIONS = ('project_location', 'tower_type', 'substation_type', 'region_risk_flag', 'season', 'month')
+QUERY_AGGREGATIONS = ('sum', 'mean', 'min', 'max')
+
+
+class AggregateIndex:
+    """
+    Pre-aggregated dataset for ad-hoc group-by queries. The rows are collapsed
+    once into cells, one per combination of dimension values that occurs,
+    each holding its row count and per-column count/sum/min/max. A query
+    masks and regroups the cells by their category codes, so it costs the
+    number of cells (bounded by the dimension cardinalities), not rows.
+    """
+
+    def __init__(self, dimensions, levels, codes, rows, metrics, counts, sums, mins, maxs, cache_size=512):
+        self.dimensions = dimensions
+        self.levels = levels  # dimension -> values in code order
+        self.level_codes = {dim: {value: i for i, value in enumerate(values)} for dim, values in levels.items()}
+        self.codes = codes  # cells x dimensions
+        self.rows = rows
+        self.metrics = metrics
+        self.metric_index = {col: i for i, col in enumerate(metrics)}
+        self.counts, self.sums, self.mins, self.maxs = counts, sums, mins, maxs  # cells x metrics
+        self.cache = PayloadCache(cache_size)
+
+    @classmethod
+    def build(cls, frame, dimensions=QUERY_DIMENSIONS, **kwargs):
+        dims, levels, code_columns = [], {}, []
+        for dim in dimensions:
+            if dim == 'month' and 'timestamp' in frame.columns:
+                values = pd.to_datetime(frame['timestamp']).dt.to_period('M').astype(str)
+            elif dim == 'season':
+                values = season_values(frame)
+                if values is None:
+                    continue
+            elif dim in frame.columns:
+                values = frame[dim].astype(str)
+            else:
+                continue
+            codes, uniques = pd.factorize(values, sort=True)
+            dims.append(dim)
+            levels[dim] = [str(value) for value in uniques]
+            code_columns.append(codes)
+
+        metrics = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col]) and col not in dims]
+        cells, inverse = np.unique(np.column_stack(code_columns), axis=0, return_inverse=True)
+        grouped = widen(frame, metrics).groupby(inverse.reshape(-1))
+        return cls(
+            dims, levels, cells, np.bincount(inverse.reshape(-1), minlength=len(cells)), metrics,
+            grouped.count().to_numpy(dtype=np.float64),
+            grouped.sum().to_numpy(dtype=np.float64),
+            grouped.min().to_numpy(dtype=np.float64),
+            grouped.max().to_numpy(dtype=np.float64),
+            **kwargs
+        )
+
+    def normalize(self, group_by, metrics, filters):
+        """
+        Validated (group_by, metrics, filters) in canonical form, usable as a
+        cache key; ValueError names the first unknown dimension, column or value
+        """
+        for dim in group_by:
+            if dim not in self.level_codes:
+                raise ValueError(f'Cannot group by {dim}; dimensions: {", ".join(self.dimensions)}')
+        if len(set(group_by)) != len(group_by):
+            raise ValueError('group_by lists a dimension twice')
+        for col, agg in metrics:
+            if col != 'count' and col not in self.metric_index:
+                raise ValueError(f'Unknown metric column {col}')
+            if col != 'count' and agg not in QUERY_AGGREGATIONS:
+                raise ValueError(f'Unknown aggregation {agg}; use one of {", ".join(QUERY_AGGREGATIONS)}')
+        for dim, values in filters.items():
+            if dim not in self.level_codes:
+                raise ValueError(f'Cannot filter on {dim}; dimensions: {", ".join(self.dimensions)}')
+            for value in values:
+                if value not in self.level_codes[dim]:
+                    raise ValueError(f'Unknown {dim} {value!r}')
+        return (
+            tuple(group_by),
+            tuple(dict.fromkeys(metrics)),
+            tuple(sorted((dim, tuple(sorted(set(values)))) for dim, values in filters.items()))
+        )
+
+    def query(self, group_by, metrics, filters):
+        """
+        Rows of {dimension: value, ..., metric: value} for the normalized
+        query, ordered by the group_by values
+        """
+        mask = np.ones(len(self.codes), dtype=bool)
+        for dim, values in filters:
+            allowed = [self.level_codes[dim][value] for value in values]
+            mask &= np.isin(self.codes[:, self.dimensions.index(dim)], allowed)
+        cells = np.flatnonzero(mask)
+        if cells.size == 0:
+            return []
+
+        if group_by:
+            columns = [self.dimensions.index(dim) for dim in group_by]
+            groups, inverse = np.unique(self.codes[np.ix_(cells, columns)], axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            groups, inverse = np.zeros((1, 0), dtype=np.int64), np.zeros(cells.size, dtype=np.int64)
+        size = len(groups)
+
+        results = {}
+        for col, agg in metrics:
+            if col == 'count':
+                values = np.bincount(inverse, weights=self.rows[cells], minlength=size).astype(np.int64)
+            else:
+                m = self.metric_index[col]
+                count = np.bincount(inverse, weights=self.counts[cells, m], minlength=size)
+                if agg in ('sum', 'mean'):
+                    values = np.bincount(inverse, weights=self.sums[cells, m], minlength=size)
+                    if agg == 'mean':
+                        values = np.divide(values, count, out=np.full(size, np.nan), where=count > 0)
+                else:
+                    values = np.full(size, np.inf if agg == 'min' else -np.inf)
+                    (np.fmin if agg == 'min' else np.fmax).at(values, inverse, (self.mins if agg == 'min' else self.maxs)[cells, m])
+                    values[count == 0] = np.nan
+            results['count' if col == 'count' else f'{col}_{agg}'] = values.tolist()
+
+        rows = []
+        for g in range(size):
+            row = {dim: self.levels[dim][code] for dim, code in zip(group_by, groups[g])}
+            for name, values in results.items():
+                value = values[g]
+                row[name] = None if isinstance(value, float) and np.isnan(value) else value
+            rows.append(row)
+        return rows
@@ -1,13 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_mail import Mail, Message
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd
 import numpy as np
 import joblib
 import os
 import secrets
+import csv
+import io
+import json
 from datetime import datetime, timedelta, timezone
 import re
 from pymongo import MongoClient, errors
@@ -18,6 +20,19 @@ import threading
 import time
 from collections import defaultdict
 from email_service import email_service
+from prediction_cache import PredictionCache
+from model_server import ModelServerClient, ModelServerError
+from readiness import ReadinessManager
+from model_registry import (
+    ModelBundle, ModelRegistry, RegistryError, artifact_checksums, checksum_fingerprint, legacy_artifact_paths
+)
+from compiled_model import COMPILED_DIR_NAME, is_fresh, load_compiled
+from forecast_store import ENCODING_COMPACT, store_from_env, values_total_expr
+from access_scope import AccessScopeCache, principals_from_env, project_principals
+from dashboard_rollups import rollups_from_env
+from analytics_views import AggregateIndex, MaterialCube, ProjectTable
+from dataset_cache import load_dataset
+from dataset_schema import SEASON_BY_MONTH, memory_report
 
 load_dotenv()  # load environment variables from .env if present
 app = Flask(__name__)
@@ -71,7 +86,7 @@ CORS(app,
          "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
          "allow_headers": ["Content-Type", "Authorization"],
          "supports_credentials": True,
-         "expose_headers": ["Content-Type", "Authorization"],
+         "expose_headers": ["Content-Type", "Authorization", "X-Mongo-Round-Trips-Saved", "X-Total-Count"],
          "max_age": 3600
      }}
 )
@@ -186,10 +201,14 @@ def create_indexes_async(db):
         # Only create project_id index if collection is empty or doesn't have null values
         if projects_collection.count_documents({'project_id': None}) == 0:
             projects_collection.create_index('project_id', unique=True)
+        projects_collection.create_index('access_principals')
+        db['dashboard_rollups'].create_index([('project_id', 1), ('month', 1)], unique=True)
+        db['dashboard_rollups_dirty'].create_index([('project_id', 1), ('month', 1)], unique=True)
         
         forecasts_collection.create_index([('project_id', 1), ('material', 1), ('created_at', 1)])
         project_forecasts_collection.create_index('project_id', unique=True)
         project_forecasts_collection.create_index('forecasts.forecast_month')
+        db['project_forecast_months'].create_index([('project_id', 1), ('forecast_month', 1)], unique=True)
         inventory_collection.create_index([('material_code', 1), ('warehouse', 1)], unique=True)
         orders_collection.create_index('order_id', unique=True)
         material_actuals_collection.create_index([('project_id', 1), ('month', 1)], unique=True)
@@ -211,97 +230,270 @@ def create_indexes_async(db):
         print(f"Error creating indexes: {e}")
 
 # Global variables for lazy loading
+model_bundle = None  # ModelBundle being served; replaced as a whole on reload
 model = None
 feature_cols = None
 target_cols = None
 label_encoders = None
+model_version = None
 df = None
-models_loading = False
-data_loading = False
+material_cube = None  # monthly material totals of df, see analytics_views.py
+project_table = None  # per-project summary of df, see analytics_views.py
+aggregate_index = None  # pre-aggregated cells of df for /api/analytics/query
+dataset_memory = None  # memory_report() of df
 
-# Load models and encoders asynchronously
-def load_models():
-    global model, feature_cols, target_cols, label_encoders, models_loading
-    if models_loading:
-        return None, None, None, None
+# Load state, single-loader locks and load timings for the lazy resources
+readiness = ReadinessManager(['models', 'data'])
+
+# Seconds a request may block waiting for models/data that are still loading
+RESOURCE_WAIT_SECONDS = float(os.getenv('RESOURCE_WAIT_SECONDS', '5'))
+
+# Reference dataset and its memory-mapped columnar cache (dataset_cache.py)
+DATASET_PATH = os.getenv('DATASET_PATH', '../powergrid_realistic_material_dataset1.csv')
+DATASET_CACHE_DIR = os.getenv('DATASET_CACHE_DIR', '../dataset_cache')
+DATASET_CACHE = os.getenv('DATASET_CACHE', 'true').lower() == 'true'
+
+# Recent /api/analytics/query results kept per worker
+ANALYTICS_QUERY_CACHE_SIZE = int(os.getenv('ANALYTICS_QUERY_CACHE_SIZE', '512'))
+
+# Versioned model bundles; when CURRENT exists it takes precedence over ../*.joblib
+model_registry = ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', '../model_registry'))
+
+# Seconds between checks of the registry's CURRENT version (0 disables hot-swap)
+MODEL_REGISTRY_POLL_SECONDS = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '30'))
+
+# When set, predictions run on the shared model server (model_server.py)
+# instead of a per-worker copy of the model
+MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET', '')
+
+# Threads used by the native boosters per prediction (0 lets XGBoost decide)
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '0')) or None
+
+# Load the compiled_model/ export next to the model artifact when it is up to date
+MODEL_PREFER_COMPILED = os.getenv('MODEL_PREFER_COMPILED', 'true').lower() == 'true'
+
+# Repeated forecasts for identical inputs are served from memory
+prediction_cache = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '1024')),
+    ttl_seconds=int(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '3600'))
+)
+
+def _build_model_bundle(registry_version=None):
+    """Load a ModelBundle from the registry (active or given version) or ../*.joblib"""
+    registry_version = registry_version or model_registry.current_version()
+    # Each artifact is hashed once: verify() checks the files against the
+    # manifest checksums, which then serve the fingerprint and is_fresh()
+    if registry_version:
+        paths = model_registry.verify(registry_version)
+        checksums = model_registry.checksums(registry_version)
+    else:
+        paths = legacy_artifact_paths()
+        checksums = artifact_checksums(paths)
+    version = checksum_fingerprint(checksums)
     
-    try:
-        models_loading = True
-        print("Loading ML models...")
-        model = joblib.load('../multi_xgb_model.joblib')
-        feature_cols = joblib.load('../feature_cols1.joblib')
-        target_cols = joblib.load('../target_cols1.joblib')
-        label_encoders = joblib.load('../label_encoders.joblib')
-        print("ML models loaded successfully")
-        return model, feature_cols, target_cols, label_encoders
-    except Exception as e:
-        print(f"Error loading models: {e}")
-        return None, None, None, None
-    finally:
-        models_loading = False
+    compiled_dir = os.path.join(os.path.dirname(paths['model']), COMPILED_DIR_NAME)
+    if MODEL_SERVER_SOCKET:
+        new_model = ModelServerClient(MODEL_SERVER_SOCKET, timeout=float(os.getenv('MODEL_SERVER_TIMEOUT', '10')))
+        # The server loads its model once at startup; pairing its model with
+        # another version's feature/target columns and encoders would predict
+        # with the wrong model, so the swap is refused until it serves this one
+        server_version = new_model.info()['model_version']
+        if server_version != version:
+            raise ModelServerError(
+                f"Model server at {MODEL_SERVER_SOCKET} serves model {server_version[:12]}, "
+                f"not {registry_version or 'the ../*.joblib model'} ({version[:12]}); restart model_server.py to switch"
+            )
+        print(f"Using shared model server at {MODEL_SERVER_SOCKET}")
+    elif MODEL_PREFER_COMPILED and is_fresh(compiled_dir, checksums):
+        # Same model, so the fingerprint stays that of the pickled artifacts
+        started = time.perf_counter()
+        compiled = load_compiled(compiled_dir)
+        print(f"Loaded compiled model from {compiled_dir} in {time.perf_counter() - started:.2f}s")
+        return ModelBundle(*compiled, version=version, registry_version=registry_version, nthread=INFERENCE_THREADS)
+    else:
+        new_model = joblib.load(paths['model'])
+    
+    return ModelBundle(
+        new_model,
+        joblib.load(paths['feature_cols']),
+        joblib.load(paths['target_cols']),
+        joblib.load(paths['label_encoders']),
+        version=version,
+        registry_version=registry_version,
+        nthread=INFERENCE_THREADS
+    )
 
-# Load data asynchronously
-def load_data():
-    global df, data_loading
-    if data_loading:
-        return None
+def _load_models(registry_version=None):
+    """Load and validate a model bundle, then swap it in with one reference update"""
+    global model_bundle, model, feature_cols, target_cols, label_encoders, model_version
+    print("Loading ML models...")
+    with readiness.phase('models', 'artifacts'):
+        bundle = _build_model_bundle(registry_version)
     
-    try:
-        data_loading = True
-        print("Loading dataset...")
-        df = pd.read_csv('../powergrid_realistic_material_dataset1.csv')
-        print("Dataset loaded successfully")
-        return df
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return None
-    finally:
-        data_loading = False
-
-# Lazy loading functions
-def get_model():
-    global model, feature_cols, target_cols, label_encoders
-    if model is None and not models_loading:
-        return load_models()
+    with readiness.phase('models', 'warmup'):
+        # Canary prediction on the default row; also warms the boosters so the
+        # first real request skips lazy setup
+        bundle.canary()
+    
+    # Requests already holding the previous bundle finish on it
+    model_bundle = bundle
+    model, feature_cols, target_cols, label_encoders = bundle.model, bundle.feature_cols, bundle.target_cols, bundle.label_encoders
+    model_version = bundle.version
+    # A different fingerprint means a new model, so cached predictions are dropped
+    prediction_cache.set_model_version(model_version)
+    if forecast_store.encoding == ENCODING_COMPACT:
+        forecast_store.set_schema(bundle.target_cols)
+    print(f"ML models loaded successfully (version {bundle.registry_version or model_version[:12]})")
+
+def _json_payload(obj):
+    """Response body exactly as jsonify(obj) would produce it"""
+    return app.json.response(obj).get_data()
+
+def _load_data():
+    global df, material_cube, project_table, aggregate_index, dataset_memory
+    print("Loading dataset...")
+    with readiness.phase('data', 'read'):
+        frame = load_dataset(DATASET_PATH, DATASET_CACHE_DIR, use_cache=DATASET_CACHE)
+    with readiness.phase('data', 'material_cube'):
+        cube = MaterialCube.build(frame, serialize=_json_payload)
+    with readiness.phase('data', 'project_table'):
+        table = ProjectTable.build(frame, serialize=_json_payload)
+    with readiness.phase('data', 'aggregate_index'):
+        aggregates = AggregateIndex.build(frame, cache_size=ANALYTICS_QUERY_CACHE_SIZE)
+    # The views are in place before df marks the dataset as available
+    material_cube = cube
+    project_table = table
+    aggregate_index = aggregates
+    df = frame
+    dataset_memory = memory_report(frame)
+    print(f"Dataset loaded successfully ({dataset_memory['bytes'] / 2**20:.1f} MiB in this worker, "
+          f"{dataset_memory['default_dtype_bytes'] / 2**20:.1f} MiB with default dtypes)")
+
+# Load models and encoders (no-op while another thread is already loading them)
+def load_models():
+    readiness.load('models', _load_models)
     return model, feature_cols, target_cols, label_encoders
 
-def get_data():
-    global df
-    if df is None and not data_loading:
-        return load_data()
+# Swap in a new model bundle without restarting the worker
+def reload_models(registry_version=None):
+    return readiness.load('models', lambda: _load_models(registry_version), reload=True)
+
+# Load data (no-op while another thread is already loading it)
+def load_data():
+    readiness.load('data', _load_data)
     return df
 
+# Lazy loading functions: wait a bounded time for a load in progress
+def get_model_bundle(wait_seconds=None):
+    if not readiness.is_ready('models'):
+        readiness.load_in_background('models', _load_models)
+        readiness.wait('models', RESOURCE_WAIT_SECONDS if wait_seconds is None else wait_seconds)
+    return model_bundle
+
+def get_data(wait_seconds=None):
+    if not readiness.is_ready('data'):
+        readiness.load_in_background('data', _load_data)
+        readiness.wait('data', RESOURCE_WAIT_SECONDS if wait_seconds is None else wait_seconds)
+    return df
+
+def watch_model_registry():
+    """Hot-swap the model whenever the registry's CURRENT version changes"""
+    failed_versions = set()
+    while True:
+        time.sleep(MODEL_REGISTRY_POLL_SECONDS)
+        try:
+            current = model_registry.current_version()
+        except OSError as e:
+            print(f"Error reading model registry: {e}")
+            continue
+        bundle = model_bundle
+        if not current or bundle is None or current == bundle.registry_version or current in failed_versions:
+            continue
+        print(f"Model registry switched to {current}, reloading...")
+        # A model server still serving the previous version fails the load
+        # until it is restarted, so that version is retried on the next poll
+        if not reload_models(current) and not MODEL_SERVER_SOCKET:
+            failed_versions.add(current)
+
 # Initialize database first (this is needed for auth)
 client, db, users_collection, projects_collection, forecasts_collection, inventory_collection, orders_collection, material_actuals_collection, project_forecasts_collection, password_reset_tokens_collection, teams_collection, team_invitations_collection, notifications_collection = init_db()
 
+# Month-wise forecast storage; FORECAST_STORAGE=monthly writes one document per project month
+forecast_store = store_from_env(db)
+dashboard_rollups = rollups_from_env(db, forecast_store)
+
+# projects.access_principals (materialized ACL), kept in sync by the team routes
+access_principals = principals_from_env(db)
+
+# Per-user teams/projects scope; mutations below invalidate it, the TTL bounds
+# how long other workers can serve a stale one
+access_scopes = AccessScopeCache(
+    teams_collection,
+    projects_collection,
+    ttl_seconds=float(os.getenv('ACCESS_SCOPE_TTL_SECONDS', '60')),
+    max_entries=int(os.getenv('ACCESS_SCOPE_CACHE_SIZE', '10000')),
+    principals=access_principals
+)
+
 # Load models and data in background threads
 def load_resources_async():
     """Load heavy resources in background threads"""
-    def load_models_thread():
-        load_models()
-    
-    def load_data_thread():
-        load_data()
-    
-    # Start background threads
-    threading.Thread(target=load_models_thread, daemon=True).start()
-    threading.Thread(target=load_data_thread, daemon=True).start()
+    readiness.load_in_background('models', _load_models)
+    readiness.load_in_background('data', _load_data)
+    if MODEL_REGISTRY_POLL_SECONDS > 0:
+        threading.Thread(target=watch_model_registry, daemon=True).start()
+    if os.getenv('MIGRATE_LEGACY_FORECASTS', 'false').lower() == 'true':
+        threading.Thread(target=migrate_legacy_forecasts, daemon=True).start()
+
+def migrate_legacy_forecasts():
+    """Background run of the resumable legacy forecasts migration (one worker at a time)"""
+    try:
+        totals = forecast_store.migrate_legacy(forecasts_collection)
+        if totals:
+            print(f"Legacy forecasts migrated: {totals['documents']} documents")
+    except errors.PyMongoError as e:
+        print(f"Legacy forecasts migration stopped: {e}")
 
 # Start loading resources in background
 load_resources_async()
 
 # Helpers
-def sum_numeric_values(obj):
-    try:
-        return sum(float(v) for v in obj.values() if isinstance(v, (int, float)) or (isinstance(v, str) and v.strip() != ''))
-    except Exception:
-        total = 0.0
-        for v in obj.values():
-            try:
-                total += float(v)
-            except Exception:
-                continue
-        return total
+def is_admin(username):
+    """True when the user has the admin role"""
+    user = users_collection.find_one({'username': username}, {'role': 1, '_id': 0})
+    return bool(user and user.get('role') == 'admin')
+
+def _count_saved_round_trips(count=1):
+    g.mongo_round_trips_saved = g.get('mongo_round_trips_saved', 0) + count
+    access_scopes.record_saved(count)
+
+def get_access_scope(username):
+    """The user's teams, team members and accessible projects, cached per user"""
+    scope, hit = access_scopes.get(username)
+    if hit:
+        _count_saved_round_trips()
+    return scope
+
+def scope_project_ids(scope):
+    """Project ids the scope can access; only the first call per scope queries Mongo"""
+    if scope.has_project_ids:
+        _count_saved_round_trips()
+    return scope.project_ids
+
+def can_access_project(scope, project_id):
+    """True when the user created the project or it belongs to one of their teams"""
+    if scope.knows_project(project_id):
+        _count_saved_round_trips()
+        return True
+    # Unknown here may still be a project created in another worker
+    return projects_collection.find_one({'project_id': project_id, **scope.project_query()}, {'_id': 1}) is not None
+
+@app.after_request
+def report_saved_round_trips(response):
+    saved = g.get('mongo_round_trips_saved')
+    if saved:
+        response.headers['X-Mongo-Round-Trips-Saved'] = str(saved)
+    return response
 
 
 # Authentication routes
@@ -612,20 +804,10 @@ def analytics_overview():
     username = get_jwt_identity()
     
     try:
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
+        scope = get_access_scope(username)
         
         # Get projects accessible to user (own projects + team projects)
-        accessible_projects_query = {
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        }
+        accessible_projects_query = scope.project_query()
         
         # Get user's own project data + team project data
         user_projects = list(projects_collection.find(accessible_projects_query, {'_id': 0}))
@@ -682,19 +864,15 @@ def materials_analytics():
     if df is None:
         return jsonify({'error': 'Data not available - still loading. Please try again in a moment.'}), 503
     
-    # Material consumption trends
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    monthly_materials = df.groupby(df['timestamp'].dt.to_period('M'))[target_cols].sum()
-    
-    # Convert to JSON serializable format
-    trends = {}
-    for col in target_cols:
-        trends[col] = {
-            'dates': [str(period) for period in monthly_materials.index],
-            'values': [float(v) for v in monthly_materials[col].tolist()]
-        }
+    # Material consumption trends per month, precomputed at load; optional
+    # ?project_location=&tower_type=&substation_type=&region_risk_flag= filters
+    filters = {dim: request.args[dim] for dim in material_cube.dimensions if request.args.get(dim)}
+    try:
+        payload = material_cube.payload(filters)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
     
-    return jsonify(trends)
+    return app.response_class(payload, mimetype='application/json')
 
 @app.route('/api/analytics/projects', methods=['GET'])
 @jwt_required()
@@ -704,21 +882,91 @@ def projects_analytics():
     if df is None:
         return jsonify({'error': 'Data not available - still loading. Please try again in a moment.'}), 503
     
-    # Project details
-    project_details = df.groupby('project_id').agg({
-        'budget': 'first',
-        'project_location': 'first',
-        'tower_type': 'first',
-        'substation_type': 'first',
-        'project_size_km': 'first',
-        'region_risk_flag': 'first'
-    }).reset_index()
+    # Project details and material totals, precomputed at load. Optional:
+    #   project_id, project_location, tower_type, region_risk_flag  (repeatable)
+    #   min_<column>, max_<column>  for numeric columns (budget, quantity_*...)
+    #   sort=<column> or sort=-<column>, limit, offset
+    # X-Total-Count carries the number of matches before paging
+    table = project_table
+    if not request.args:
+        response = app.response_class(table.payload, mimetype='application/json')
+        response.headers['X-Total-Count'] = str(table.size)
+        return response
     
-    # Add material totals per project
-    material_totals = df.groupby('project_id')[target_cols].sum().reset_index()
-    project_details = project_details.merge(material_totals, on='project_id')
+    filters = {col: request.args.getlist(col) for col in table.indexes if col in request.args}
+    ranges = {}
+    try:
+        for param, value in request.args.items():
+            bound, _, col = param.partition('_')
+            if bound in ('min', 'max') and col:
+                low, high = ranges.get(col, (None, None))
+                ranges[col] = (float(value), high) if bound == 'min' else (low, float(value))
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'min_*/max_* must be numbers, limit/offset integers'}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'limit and offset must not be negative'}), 400
     
-    return jsonify(project_details.to_dict('records'))
+    sort = request.args.get('sort') or None
+    descending = bool(sort) and sort.startswith('-')
+    try:
+        total, records = table.query(filters, ranges, sort.lstrip('-') if sort else None, descending, offset, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = jsonify(records)
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+@app.route('/api/analytics/query', methods=['GET'])
+@jwt_required()
+def analytics_query():
+    """
+    Ad-hoc slices of the dataset from the pre-aggregated cells:
+      group_by=project_location,tower_type        dimensions (none: one total row)
+      metrics=count,quantity_steel_tons:sum,...   numeric column[:sum|mean|min|max], default count
+      filter=season:Summer,Winter                 repeatable, values of one dimension are OR'd
+    """
+    df = get_data()
+    if df is None:
+        return jsonify({'error': 'Data not available - still loading. Please try again in a moment.'}), 503
+    
+    index = aggregate_index
+    group_by = [dim.strip() for dim in request.args.get('group_by', '').split(',') if dim.strip()]
+    metrics = []
+    for item in (request.args.get('metrics') or 'count').split(','):
+        col, _, agg = item.strip().partition(':')
+        if col:
+            metrics.append(('count', None) if col == 'count' else (col, agg or 'sum'))
+    filters = {}
+    for item in request.args.getlist('filter'):
+        dim, sep, values = item.partition(':')
+        if not sep or not values:
+            return jsonify({'error': f'filter must look like dimension:value[,value...], got {item!r}'}), 400
+        filters.setdefault(dim.strip(), []).extend(value.strip() for value in values.split(','))
+    
+    try:
+        key = index.normalize(group_by, metrics, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    payload = index.cache.get(key)
+    cache_state = 'hit'
+    if payload is None:
+        cache_state = 'miss'
+        group_by, metrics, filters = key
+        payload = _json_payload({
+            'group_by': list(group_by),
+            'metrics': ['count' if col == 'count' else f'{col}_{agg}' for col, agg in metrics],
+            'filters': {dim: list(values) for dim, values in filters},
+            'rows': index.query(group_by, metrics, filters)
+        })
+        index.cache.put(key, payload)
+    
+    response = app.response_class(payload, mimetype='application/json')
+    response.headers['X-Analytics-Cache'] = cache_state
+    return response
 
 # Simple dispatch data endpoint
 @app.route('/api/dispatch', methods=['GET'])
@@ -744,6 +992,13 @@ def dispatch_data():
     except Exception as e:
         return jsonify({'error': f'Failed to build dispatch data: {str(e)}'}), 500
 
+# Upper bound on the number of rows accepted by /api/forecast/batch
+FORECAST_BATCH_MAX_ITEMS = int(os.getenv('FORECAST_BATCH_MAX_ITEMS', '5000'))
+
+def format_forecast_predictions(row, target_cols):
+    """Map one prediction row onto target column names"""
+    return {col: float(row[i]) for i, col in enumerate(target_cols)}
+
 """
 Legacy forecasting route (still computes predictions). After computing, store
 month-wise under project_forecasts with upsert on (project_id, forecast_month).
@@ -752,8 +1007,8 @@ month-wise under project_forecasts with upsert on (project_id, forecast_month).
 @jwt_required()
 def forecast():
     # Get models lazily
-    model, feature_cols, target_cols, label_encoders = get_model()
-    if model is None or feature_cols is None or target_cols is None or label_encoders is None:
+    bundle = get_model_bundle()
+    if bundle is None:
         return jsonify({'error': 'Model not available - still loading. Please try again in a moment.'}), 503
     
     data = request.get_json()
@@ -765,121 +1020,20 @@ def forecast():
     project_id = data.get('project_id', 'unknown')
     
     # Prepare input data
-    input_data = {}
-    for col in feature_cols:
-        if col in data:
-            input_data[col] = data[col]
-        else:
-            # Use default values for missing fields
-            if col == 'budget':
-                input_data[col] = 30000000.0
-            elif col == 'tax_rate':
-                input_data[col] = 18.0
-            elif col == 'project_size_km':
-                input_data[col] = 100.0
-            elif col == 'project_start_month':
-                input_data[col] = 1.0
-            elif col == 'project_end_month':
-                input_data[col] = 12.0
-            elif col == 'lead_time_days':
-                input_data[col] = 45.0
-            elif col == 'commodity_price_index':
-                input_data[col] = 105.0
-            else:
-                input_data[col] = 0.0
-    
-    # Convert numeric fields to proper types
-    numeric_fields = ['budget', 'tax_rate', 'project_size_km', 'project_start_month', 
-                     'project_end_month', 'lead_time_days', 'commodity_price_index']
-    
-    for field in numeric_fields:
-        if field in input_data:
-            try:
-                input_data[field] = float(input_data[field])
-            except (ValueError, TypeError):
-                # Use default values if conversion fails
-                if field == 'budget':
-                    input_data[field] = 30000000.0
-                elif field == 'tax_rate':
-                    input_data[field] = 18.0
-                elif field == 'project_size_km':
-                    input_data[field] = 100.0
-                elif field == 'project_start_month':
-                    input_data[field] = 1.0
-                elif field == 'project_end_month':
-                    input_data[field] = 12.0
-                elif field == 'lead_time_days':
-                    input_data[field] = 45.0
-                elif field == 'commodity_price_index':
-                    input_data[field] = 105.0
-                else:
-                    input_data[field] = 0.0
-    
-    # Encode categorical variables
-    for col in ['project_location', 'tower_type', 'substation_type', 'region_risk_flag']:
-        if col in input_data and col in label_encoders:
-            try:
-                input_data[col] = label_encoders[col].transform([input_data[col]])[0]
-            except:
-                input_data[col] = 0
-    
-    # Create DataFrame
-    input_df = pd.DataFrame([input_data])
-    
-    # Debug: Print input data and data types
-    print("Input data for forecast:")
-    print(input_data)
-    print("Input data types:")
-    for col in input_df.columns:
-        print(f"{col}: {input_df[col].dtype}")
+    input_row, input_data = bundle.pipeline.transform_one(data)
     
     # Make prediction
     try:
-        predictions = model.predict(input_df[feature_cols])
+        predictions = prediction_cache.predict(bundle.engine.predict, input_row, bundle.version)
         
         # Format results
-        results = {}
-        for i, col in enumerate(target_cols):
-            results[col] = float(predictions[0][i])
+        results = format_forecast_predictions(predictions[0], bundle.target_cols)
         
         # Save forecast month-wise under a single project document
         try:
-            # Ensure project doc exists
-            project_forecasts_collection.update_one(
-                {'project_id': project_id},
-                {'$setOnInsert': {'project_id': project_id, 'forecasts': []}},
-                upsert=True
-            )
-
-            # Try to update existing month entry
-            res = project_forecasts_collection.update_one(
-                {'project_id': project_id, 'forecasts.forecast_month': forecast_month},
-                {
-                    '$set': {
-                        'forecasts.$.predictions': results,
-                        'forecasts.$.actual_values': {},
-                        'forecasts.$.updated_at': datetime.now(timezone.utc)
-                    }
-                }
-            )
-
-            if res.matched_count == 0:
-                # Push new month entry
-                project_forecasts_collection.update_one(
-                    {'project_id': project_id},
-                    {
-                        '$push': {
-                            'forecasts': {
-                                'forecast_month': forecast_month,
-                                'predictions': results,
-                                'actual_values': {},
-                                'created_at': datetime.now(timezone.utc),
-                                'updated_at': datetime.now(timezone.utc)
-                            }
-                        }
-                    }
-                )
+            forecast_store.save_month(project_id, forecast_month, results)
             print(f"Upserted forecast for project {project_id}, month {forecast_month}")
+            dashboard_rollups.write([dashboard_rollups.forecast_op(project_id, forecast_month, results)])
             
         except Exception as e:
             print(f"Failed to save forecast: {e}")
@@ -892,6 +1046,188 @@ def forecast():
     except Exception as e:
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
 
+@app.route('/api/forecast/batch', methods=['POST'])
+@jwt_required()
+def batch_forecast():
+    """Forecast many project/month payloads with a single model.predict call"""
+    bundle = get_model_bundle()
+    if bundle is None:
+        return jsonify({'error': 'Model not available - still loading. Please try again in a moment.'}), 503
+    
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Items array is required'}), 400
+    
+    if len(items) > FORECAST_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch too large - at most {FORECAST_BATCH_MAX_ITEMS} items are allowed'}), 400
+    
+    current_month = datetime.now(timezone.utc).strftime('%Y-%m')
+    results = [None] * len(items)
+    valid_rows = []  # (index, project_id, forecast_month, input_data)
+    
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {'index': i, 'error': 'Item must be an object'}
+            continue
+        
+        forecast_month = str(item.get('forecast_month', current_month))
+        if not re.match(r'^\d{4}-(0[1-9]|1[0-2])$', forecast_month):
+            results[i] = {'index': i, 'error': f'Invalid forecast_month {forecast_month!r}, expected YYYY-MM'}
+            continue
+        
+        project_id = item.get('project_id', 'unknown')
+        valid_rows.append((i, project_id, forecast_month, item))
+    
+    if valid_rows:
+        input_matrix, encoded_rows = bundle.pipeline.transform([row[3] for row in valid_rows])
+        try:
+            predictions = prediction_cache.predict(bundle.engine.predict, input_matrix, bundle.version)
+        except Exception as e:
+            return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+        
+        write_ops = []
+        rollup_ops = []
+        for (i, project_id, forecast_month, _), input_data, row in zip(valid_rows, encoded_rows, predictions):
+            row_results = format_forecast_predictions(row, bundle.target_cols)
+            write_ops.extend(forecast_store.month_write_ops(project_id, forecast_month, row_results))
+            rollup_ops.append(dashboard_rollups.forecast_op(project_id, forecast_month, row_results))
+            results[i] = {
+                'index': i,
+                'project_id': project_id,
+                'forecast_month': forecast_month,
+                'predictions': row_results,
+                'input_used': input_data
+            }
+        
+        # Persist every month in one round trip; ops stay ordered so repeated
+        # (project_id, forecast_month) pairs resolve to the last item
+        try:
+            forecast_store.bulk_write(write_ops)
+            print(f"Upserted {len(valid_rows)} batch forecasts")
+            dashboard_rollups.write(rollup_ops)
+        except Exception as e:
+            print(f"Failed to save batch forecasts: {e}")
+            return jsonify({'error': f'Failed to save forecasts: {str(e)}'}), 500
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'total_items': len(items),
+        'successful_predictions': len(valid_rows),
+        'failed_items': len(items) - len(valid_rows)
+    }), 200
+
+# Upper bound on the number of months accepted by the forecast-horizon route
+FORECAST_HORIZON_MAX_MONTHS = int(os.getenv('FORECAST_HORIZON_MAX_MONTHS', '36'))
+
+def add_months(month, count):
+    """Shift a YYYY-MM string by count months"""
+    year, mon = int(month[:4]), int(month[5:7])
+    index = year * 12 + (mon - 1) + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+@app.route('/api/projects/<project_id>/forecast-horizon', methods=['POST'])
+@jwt_required()
+def forecast_horizon(project_id):
+    """
+    Forecast consecutive months for a project with one model call.
+    Each month's row places project_start_month on that calendar month and keeps
+    the project's start->end span, so seasonal position varies across the horizon.
+    """
+    bundle = get_model_bundle()
+    if bundle is None:
+        return jsonify({'error': 'Model not available - still loading. Please try again in a moment.'}), 503
+    
+    data = request.get_json() or {}
+    username = get_jwt_identity()
+    
+    start_month = str(data.get('start_month', datetime.now(timezone.utc).strftime('%Y-%m')))
+    if not re.match(r'^\d{4}-(0[1-9]|1[0-2])$', start_month):
+        return jsonify({'error': 'start_month must be in YYYY-MM format'}), 400
+    
+    try:
+        horizon = int(data.get('horizon', 12))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'horizon must be an integer'}), 400
+    if horizon < 1 or horizon > FORECAST_HORIZON_MAX_MONTHS:
+        return jsonify({'error': f'horizon must be between 1 and {FORECAST_HORIZON_MAX_MONTHS}'}), 400
+    
+    try:
+        # Check if user has access to this project
+        scope = get_access_scope(username)
+        project = projects_collection.find_one({'project_id': project_id, **scope.project_query()}, {'_id': 0})
+        
+        if not project:
+            return jsonify({'error': 'Project not found or access denied'}), 403
+    except errors.PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    
+    # Request fields win; otherwise fall back to what is stored on the project
+    base = {
+        'project_location': project.get('location'),
+        'tower_type': project.get('tower_type'),
+        'substation_type': project.get('substation_type'),
+        'budget': project.get('cost'),
+        'project_size_km': project.get('project_size_km')
+    }
+    base = {k: v for k, v in base.items() if v not in (None, '')}
+    base.update({k: v for k, v in data.items() if k in bundle.feature_cols})
+    
+    try:
+        start_calendar = int(float(base.get('project_start_month', 1)))
+        end_calendar = int(float(base.get('project_end_month', 12)))
+    except (ValueError, TypeError):
+        start_calendar, end_calendar = 1, 12
+    span = (end_calendar - start_calendar) % 12
+    
+    months = [add_months(start_month, i) for i in range(horizon)]
+    rows = []
+    for month in months:
+        calendar_month = int(month[5:7])
+        rows.append({
+            **base,
+            'project_start_month': calendar_month,
+            'project_end_month': (calendar_month - 1 + span) % 12 + 1
+        })
+    
+    input_matrix, encoded_rows = bundle.pipeline.transform(rows)
+    try:
+        predictions = prediction_cache.predict(bundle.engine.predict, input_matrix, bundle.version)
+    except Exception as e:
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+    
+    forecasts = []
+    write_ops = []
+    rollup_ops = []
+    for month, input_data, row in zip(months, encoded_rows, predictions):
+        results = format_forecast_predictions(row, bundle.target_cols)
+        write_ops.extend(forecast_store.month_write_ops(project_id, month, results))
+        rollup_ops.append(dashboard_rollups.forecast_op(project_id, month, results))
+        forecasts.append({
+            'forecast_month': month,
+            'season': SEASON_BY_MONTH[int(month[5:7])],
+            'predictions': results,
+            'input_used': input_data
+        })
+    
+    # All months go to the project's document in one round trip
+    try:
+        forecast_store.bulk_write(write_ops)
+        print(f"Upserted {len(months)} horizon forecasts for project {project_id} from {start_month}")
+        dashboard_rollups.write(rollup_ops)
+    except Exception as e:
+        print(f"Failed to save horizon forecasts: {e}")
+        return jsonify({'error': f'Failed to save forecasts: {str(e)}'}), 500
+    
+    return jsonify({
+        'project_id': project_id,
+        'start_month': start_month,
+        'horizon': horizon,
+        'forecasts': forecasts
+    }), 200
+
 # Projects API
 @app.route('/api/projects', methods=['GET'])
 @jwt_required()
@@ -899,20 +1235,10 @@ def get_projects():
     try:
         username = get_jwt_identity()
         
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
+        scope = get_access_scope(username)
         
         # Get projects created by user OR projects assigned to user's teams
-        query = {
-            '$or': [
-                {'created_by': username},  # User's own projects
-                {'team_id': {'$in': team_ids}}  # Projects from user's teams
-            ]
-        }
+        query = scope.project_query()
         
         projects = list(projects_collection.find(query, {'_id': 0}).sort('created_at', -1))
         
@@ -951,6 +1277,11 @@ def create_project():
             'updated_at': datetime.now(timezone.utc)
         }
         
+        # Check if the team already exists; its members can see the project
+        existing_team = teams_collection.find_one({'team_id': data.get('team_id')}) if data.get('team_id') else None
+        team_members = [m.get('username') for m in (existing_team or {}).get('members', [])]
+        project_data['access_principals'] = project_principals(username, data.get('team_id'), team_members)
+        
         result = projects_collection.insert_one(project_data)
         project_data['_id'] = str(result.inserted_id)
         
@@ -959,9 +1290,6 @@ def create_project():
             team_name = f"{data.get('name')}-Team"
             team_description = f"Team for {data.get('name')} project"
             
-            # Check if team already exists
-            existing_team = teams_collection.find_one({'team_id': data.get('team_id')})
-            
             if not existing_team:
                 # Create new team entry
                 team_data = {
@@ -1022,6 +1350,7 @@ def create_project():
                     }
                 )
         
+        access_scopes.invalidate_project(username, data.get('team_id'))
         return jsonify(project_data), 201
     except errors.PyMongoError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -1091,10 +1420,12 @@ def delete_project(project_id):
         
         # Auto-delete associated team if it exists
         if project.get('team_id'):
-            team_result = teams_collection.delete_one({'team_id': project['team_id']})
-            if team_result.deleted_count > 0:
+            team = teams_collection.find_one_and_delete({'team_id': project['team_id']}, {'members.username': 1})
+            if team:
                 print(f"Auto-deleted team {project['team_id']} for deleted project {project_id}")
+                access_principals.team_deleted(project['team_id'], [m.get('username') for m in team.get('members', [])])
         
+        access_scopes.invalidate_project(username, project.get('team_id'))
         return jsonify({'message': 'Project deleted successfully'}), 200
     except errors.PyMongoError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -1106,21 +1437,10 @@ def get_project_details(project_id):
     username = get_jwt_identity()
     
     try:
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
+        scope = get_access_scope(username)
         
         # Get project details - user can access if they created it OR if it's assigned to their team
-        query = {
-            'project_id': project_id,
-            '$or': [
-                {'created_by': username},  # User's own projects
-                {'team_id': {'$in': team_ids}}  # Projects from user's teams
-            ]
-        }
+        query = {'project_id': project_id, **scope.project_query()}
         
         project = projects_collection.find_one(query, {'_id': 0})
         
@@ -1235,9 +1555,10 @@ def create_teams_for_existing_projects():
                 # Update project with team_id
                 update_result = projects_collection.update_one(
                     {'project_id': project['project_id']},
-                    {'$set': {'team_id': team_id}}
+                    access_principals.team_assigned_update(team_id, [team_owner])
                 )
                 print(f"Updated project, matched: {update_result.matched_count}, modified: {update_result.modified_count}")
+                access_scopes.invalidate_project(project.get('created_by'), team_id)
                 
                 created_teams.append({
                     'project_name': project['name'],
@@ -1305,22 +1626,10 @@ def get_forecasts():
     try:
         username = get_jwt_identity()
         
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
+        scope = get_access_scope(username)
         
         # Get projects accessible to user
-        accessible_projects = list(projects_collection.find({
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        }, {'project_id': 1, '_id': 0}))
-        
-        project_ids = [project['project_id'] for project in accessible_projects]
+        project_ids = scope_project_ids(scope)
         
         # Get forecasts for accessible projects
         forecasts = list(forecasts_collection.find({
@@ -1334,260 +1643,240 @@ def get_forecasts():
 @app.route('/api/dashboard/metrics', methods=['GET'])
 @jwt_required()
 def get_dashboard_metrics():
+    """
+    Dashboard counters for the user's projects. Project counts and forecast
+    accuracy come from one $facet pipeline on projects, order counts from a
+    second one on orders. ?debug=true adds debug_info.
+    """
     try:
         username = get_jwt_identity()
-        print(f"Getting dashboard metrics for user: {username}")
-        
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
-        print(f"User {username} is in teams: {team_ids}")
+        include_debug = request.args.get('debug', 'false').lower() == 'true'
+        scope = get_access_scope(username)
         
-        # Get projects accessible to user (own projects + team projects)
-        accessible_projects_query = {
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
+        current_month = datetime.now(timezone.utc).strftime('%Y-%m')
+        month_start = datetime.strptime(f'{current_month}-01', '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        
+        use_rollups = dashboard_rollups.enabled()
+        if use_rollups and dashboard_rollups.dirty_months():
+            # A rollup that missed an update is only right in the stored entries
+            use_rollups = not dashboard_rollups.dirty_months(scope_project_ids(scope))
+        if use_rollups:
+            # Precomputed per project month, see dashboard_rollups.py
+            month_stages = dashboard_rollups.lookup_stages()
+            has_actuals = {'$and': ['$has_predictions', '$has_actuals']}
+            has_forecast = {'$ne': [{'$ifNull': ['$accuracy', None]}, None]}
+            accuracy = '$accuracy'
+        else:
+            # Accuracy per month entry that has predictions and actual values (an
+            # empty actuals dict counts as zero), over entries forecasting > 0
+            # (whole-value comparisons: a compact actuals array may contain nulls)
+            month_stages = forecast_store.entry_lookup_stages() + [
+                {'$project': {
+                    '_id': 0,
+                    'has_actuals': {'$and': [
+                        {'$not': {'$in': [{'$ifNull': ['$predictions', None]}, {'$literal': [None, {}, []]}]}},
+                        {'$ne': [{'$ifNull': ['$actual_values', None]}, None]}
+                    ]},
+                    'forecast_total': values_total_expr('$predictions'),
+                    'actual_total': values_total_expr('$actual_values')
+                }}
             ]
+            has_actuals = '$has_actuals'
+            has_forecast = {'$and': ['$has_actuals', {'$gt': ['$forecast_total', 0]}]}
+            accuracy = {'$multiply': [
+                {'$subtract': [1, {'$divide': [{'$abs': {'$subtract': ['$actual_total', '$forecast_total']}}, '$forecast_total']}]},
+                100
+            ]}
+        accuracy_group = {
+            '_id': None,
+            'with_actuals': {'$sum': {'$cond': [has_actuals, 1, 0]}},
+            'count': {'$sum': {'$cond': [has_forecast, 1, 0]}},
+            'accuracy_sum': {'$sum': {'$cond': [has_forecast, accuracy, 0]}}
         }
-        
-        # Get total projects count (team-based)
-        total_projects = projects_collection.count_documents(accessible_projects_query)
-        print(f"Total accessible projects for {username}: {total_projects}")
-        
-        # Get active projects count (team-based)
-        active_query = {**accessible_projects_query, 'status': 'IN PROGRESS'}
-        active_projects = projects_collection.count_documents(active_query)
-        print(f"Active projects for {username}: {active_projects}")
-        
-        # Calculate forecast accuracy from stored actual values (new schema)
-        # Get accessible project IDs for filtering forecasts
-        accessible_projects_list = list(projects_collection.find(accessible_projects_query, {'project_id': 1, '_id': 0}))
-        accessible_project_ids = [p['project_id'] for p in accessible_projects_list]
-        
-        # Filter forecasts by accessible projects only
-        raw = list(project_forecasts_collection.find({'project_id': {'$in': accessible_project_ids}}))
-        forecasts_with_actuals = []
-        for doc in raw:
-            for f in doc.get('forecasts', []):
-                if f.get('predictions') and f.get('actual_values') is not None:
-                    # Count even empty dicts as present but zero; use robust sum
-                    f_total = sum_numeric_values(f.get('predictions', {}))
-                    a_total = sum_numeric_values(f.get('actual_values', {}))
-                    f['_calc_forecast_total'] = f_total
-                    f['_calc_actual_total'] = a_total
-                    forecasts_with_actuals.append(f)
-        
-        print(f"Found {len(forecasts_with_actuals)} forecasts with actual values")
-        
-        if forecasts_with_actuals:
-            total_accuracy = 0
-            count = 0
-            individual_accuracies = []
-            
-            for forecast in forecasts_with_actuals:
-                if 'predictions' in forecast:
-                    try:
-                        forecast_total = forecast.get('_calc_forecast_total', sum_numeric_values(forecast['predictions']))
-                        actual_total = forecast.get('_calc_actual_total', sum_numeric_values(forecast.get('actual_values', {})))
-                        
-                        if forecast_total > 0:
-                            accuracy = (1 - abs(actual_total - forecast_total) / forecast_total) * 100
-                            total_accuracy += accuracy
-                            count += 1
-                            individual_accuracies.append(accuracy)
-                            print(f"Project {forecast.get('project_id', 'unknown')}: forecast={forecast_total:.1f}, actual={actual_total:.1f}, accuracy={accuracy:.1f}%")
-                    except (TypeError, ValueError, ZeroDivisionError) as e:
-                        print(f"Error calculating accuracy for project {forecast.get('project_id', 'unknown')}: {e}")
-                        continue
-            
-            print(f"Individual accuracies: {individual_accuracies}")
-            print(f"Total accuracy sum: {total_accuracy:.1f}")
-            print(f"Count of projects: {count}")
-            
-            forecast_accuracy = round(total_accuracy / count, 1) if count > 0 else 0.0
-            print(f"Calculated average: {total_accuracy:.1f} / {count} = {forecast_accuracy}%")
-            print(f"Overall forecast accuracy: {forecast_accuracy}% (from {count} projects)")
-        else:
-            forecast_accuracy = 0.0
-            print("No forecasts with actual values found")
-        
-        # Get pending orders count from orders collection (filtered by accessible projects)
-        orders_query = {
-            '$or': [
+        if include_debug:
+            accuracy_group['accuracies'] = {'$push': {'$cond': [has_forecast, accuracy, None]}}
+        
+        facets = list(projects_collection.aggregate([
+            {'$match': scope.project_query()},
+            {'$facet': {
+                'total': [{'$count': 'n'}],
+                'active': [{'$match': {'status': 'IN PROGRESS'}}, {'$count': 'n'}],
+                'this_month': [{'$match': {'created_at': {'$gte': month_start}}}, {'$count': 'n'}],
+                'project_ids': [{'$group': {'_id': None, 'ids': {'$push': '$project_id'}}}],
+                'accuracy': [{'$project': {'_id': 0, 'project_id': 1}}] + month_stages + [{'$group': accuracy_group}]
+            }}
+        ]))[0]
+        
+        def facet_count(name):
+            return facets[name][0]['n'] if facets[name] else 0
+        
+        accessible_project_ids = facets['project_ids'][0]['ids'] if facets['project_ids'] else []
+        stats = facets['accuracy'][0] if facets['accuracy'] else {'with_actuals': 0, 'count': 0, 'accuracy_sum': 0.0}
+        count = stats['count']
+        total_accuracy = stats['accuracy_sum']
+        forecast_accuracy = round(total_accuracy / count, 1) if count > 0 else 0.0
+        
+        # Orders of accessible projects plus the user's own (legacy orders without project_id)
+        orders = list(orders_collection.aggregate([
+            {'$match': {'$or': [
                 {'project_id': {'$in': accessible_project_ids}},
                 {'created_by': username}
-            ]
-        }
-        
-        pending_orders = orders_collection.count_documents({
-            **orders_query,
-            'status': 'PENDING'
-        })
-        
-        # Get total orders count from orders collection (filtered)
-        total_orders = orders_collection.count_documents(orders_query)
-        
-        print(f"Orders data for {username}: pending={pending_orders}, total={total_orders} (filtered by accessible projects)")
-        
-        # Calculate projects added this month (team-based)
-        current_month = datetime.now(timezone.utc).strftime('%Y-%m')
-        monthly_query = {
-            **accessible_projects_query,
-            'created_at': {
-                '$gte': datetime.strptime(f'{current_month}-01', '%Y-%m-%d').replace(tzinfo=timezone.utc)
-            }
-        }
-        projects_this_month = projects_collection.count_documents(monthly_query)
+            ]}},
+            {'$facet': {
+                'total': [{'$count': 'n'}],
+                'pending': [{'$match': {'status': 'PENDING'}}, {'$count': 'n'}]
+            }}
+        ]))[0]
+        total_orders = orders['total'][0]['n'] if orders['total'] else 0
+        pending_orders = orders['pending'][0]['n'] if orders['pending'] else 0
         
         metrics = {
-            'total_projects': total_projects,
-            'active_projects': active_projects,
+            'total_projects': facet_count('total'),
+            'active_projects': facet_count('active'),
             'forecast_accuracy': forecast_accuracy,
             'pending_orders': pending_orders,
             'total_orders': total_orders,
-            'projects_this_month': projects_this_month,
+            'projects_this_month': facet_count('this_month'),
             'current_month': current_month,
-            'timestamp': datetime.now(timezone.utc).isoformat(),
-            'debug_info': {
-                'forecasts_with_actuals_count': len(forecasts_with_actuals),
-                'individual_accuracies': individual_accuracies if 'individual_accuracies' in locals() else [],
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+        if include_debug:
+            metrics['debug_info'] = {
+                'forecasts_with_actuals_count': stats['with_actuals'],
+                'individual_accuracies': [a for a in stats.get('accuracies', []) if a is not None],
                 'calculation_details': f"{total_accuracy:.1f} / {count} = {forecast_accuracy}%" if count > 0 else "No data",
                 'orders_data': f"pending={pending_orders}, total={total_orders}"
             }
-        }
         
         return jsonify(metrics)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch dashboard metrics: {str(e)}'}), 500
 
+def trend_month_totals(project_ids, month_range=None, column=None):
+    """
+    Per-month forecast/actual totals for dashboard trends, from the rollups
+    when available, otherwise aggregated from the stored month entries.
+    Projects with a dirty rollup month are summed from the stored entries.
+    """
+    if not dashboard_rollups.enabled():
+        return stored_month_totals(project_ids, month_range, column)
+    
+    dirty = {project_id for project_id, _ in dashboard_rollups.dirty_months(project_ids)}
+    if not dirty:
+        return dashboard_rollups.monthly_totals(project_ids, month_range, column)
+    clean = [project_id for project_id in project_ids if project_id not in dirty]
+    totals = {}
+    parts = stored_month_totals(dirty, month_range, column)
+    if clean:
+        parts += dashboard_rollups.monthly_totals(clean, month_range, column)
+    for part in parts:
+        month = totals.setdefault(part['_id'], {'_id': part['_id'], 'forecast_total': 0, 'actual_total': 0, 'count': 0})
+        for key in ('forecast_total', 'actual_total', 'count'):
+            month[key] += part[key]
+    return [totals[month] for month in sorted(totals)]
+
+def stored_month_totals(project_ids, month_range=None, column=None):
+    """trend_month_totals() aggregated from the stored month entries"""
+    if column:
+        forecast = forecast_store.column_value_expr('predictions', column)
+        actual = forecast_store.column_value_expr('actual_values', column)
+    else:
+        forecast, actual = values_total_expr('$predictions'), values_total_expr('$actual_values')
+    stages = [
+        {'$match': {'project_id': {'$in': list(project_ids)}}},
+        {'$project': {'_id': 0, 'project_id': 1}}
+    ] + forecast_store.entry_lookup_stages()
+    if month_range:
+        stages.append({'$match': {'forecast_month': month_range}})
+    stages += [
+        {'$project': {
+            '_id': 0,
+            'month': '$forecast_month',
+            'has_predictions': {'$not': {'$in': [{'$ifNull': ['$predictions', None]}, {'$literal': [None, {}, []]}]}},
+            'forecast': forecast,
+            'actual': actual
+        }},
+        {'$match': {'has_predictions': True, 'month': {'$ne': None}}},
+        {'$group': {
+            '_id': '$month',
+            'forecast_total': {'$sum': '$forecast'},
+            'actual_total': {'$sum': '$actual'},
+            'count': {'$sum': 1}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+    return list(projects_collection.aggregate(stages))
+
 @app.route('/api/dashboard/trends', methods=['GET'])
 @jwt_required()
 def get_dashboard_trends():
+    """
+    Forecast vs actual quantity per month. Optional query parameters:
+    project_id (totals for one project instead of per-project averages),
+    from / to (YYYY-MM, inclusive) and material (a quantity_* column, the
+    prefix may be left out).
+    """
     try:
         username = get_jwt_identity()
-        print(f"Dashboard trends endpoint called for user: {username}")
-        
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
-        
-        # Get projects accessible to user (own projects + team projects)
-        accessible_projects = list(projects_collection.find({
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        }, {'project_id': 1, '_id': 0}))
-        
-        accessible_project_ids = [project['project_id'] for project in accessible_projects]
-        print(f"User {username} has access to {len(accessible_project_ids)} projects")
+        scope = get_access_scope(username)
         
         # Optional filter by specific project_id (must be accessible)
         project_filter = request.args.get('project_id')
         if project_filter:
-            if project_filter in accessible_project_ids:
-                query = {'project_id': project_filter}
-            else:
-                # User trying to access project they don't have access to
+            if not can_access_project(scope, project_filter):
                 return jsonify({'error': 'Access denied to this project'}), 403
+            query_project_ids = [project_filter]
         else:
-            # Filter by accessible projects only
-            query = {'project_id': {'$in': accessible_project_ids}}
-
-        # Read from consolidated project_forecasts (filtered by accessible projects)
-        docs = list(project_forecasts_collection.find(query))
-        forecasts = []
-        for d in docs:
-            for f in d.get('forecasts', []):
-                if f.get('predictions'):
-                    f['_calc_forecast_total'] = sum_numeric_values(f.get('predictions', {}))
-                    f['_calc_actual_total'] = sum_numeric_values(f.get('actual_values', {}))
-                    forecasts.append(f)
-        print(f"Found {len(forecasts)} accessible forecasts for user {username}")
-
-        # Aggregate data by month
-        monthly_data = {}
-        
-        # Process forecasts and use stored actual values
-        for forecast in forecasts:
-            month = forecast.get('forecast_month')
-            if month and 'predictions' in forecast:
-                if month not in monthly_data:
-                    monthly_data[month] = {
-                        'forecast_total': 0, 
-                        'actual_total': 0, 
-                        'forecast_count': 0,
-                        'actual_count': 0,
-                        'month_name': month
-                    }
-                
-                # Calculate total forecast quantity
-                try:
-                    total_forecast = forecast.get('_calc_forecast_total', sum_numeric_values(forecast.get('predictions', {})))
-                    monthly_data[month]['forecast_total'] += total_forecast
-                    monthly_data[month]['forecast_count'] += 1
-                    
-                    # Use ONLY manually entered actual values (no random generation)
-                    # If not entered, treat as 0
-                    if 'actual_values' in forecast and forecast['actual_values'] is not None and forecast['actual_values']:
-                        total_actual = forecast.get('_calc_actual_total', sum_numeric_values(forecast.get('actual_values', {})))
-                        monthly_data[month]['actual_total'] += total_actual
-                        monthly_data[month]['actual_count'] += 1
-                        print(f"Added actual values for {month}: {total_actual} (project: {forecast.get('project_id', 'unknown')})")
-                    else:
-                        # No actual values entered - treat as 0
-                        monthly_data[month]['actual_total'] += 0
-                        monthly_data[month]['actual_count'] += 1
-                        print(f"Actual values for {month} not entered for project {forecast.get('project_id', 'unknown')} - treating as 0")
-                    
-                except (TypeError, ValueError) as e:
-                    print(f"Error processing forecast predictions: {e}")
-                    continue
+            query_project_ids = scope_project_ids(scope)
         
-        # Convert to array and format for chart
+        month_range = {}
+        for param, operator in (('from', '$gte'), ('to', '$lte')):
+            value = request.args.get(param)
+            if value:
+                try:
+                    month_range[operator] = datetime.strptime(value, '%Y-%m').strftime('%Y-%m')
+                except ValueError:
+                    return jsonify({'error': f'{param} must be a month in YYYY-MM format'}), 400
+        if month_range.get('$gte', '') > month_range.get('$lte', '9999-12'):
+            return jsonify({'error': 'from must not be after to'}), 400
+        
+        material = request.args.get('material')
+        if material:
+            if not re.fullmatch(r'[A-Za-z0-9_]+', material):
+                return jsonify({'error': 'Invalid material'}), 400
+            if not material.startswith('quantity_'):
+                material = f'quantity_{material}'
+            if model_bundle is not None and material not in model_bundle.target_cols:
+                return jsonify({'error': f'Unknown material {material}'}), 400
+        
+        started = time.perf_counter()
+        month_totals = trend_month_totals(query_project_ids, month_range, material)
+        
+        # A specific project shows its totals, the dashboard view averages
+        # across the accessible projects; months without entered actual
+        # values count as 0
         trend_data = []
-        for month_key, data in sorted(monthly_data.items()):
-            # If specific project selected: use totals
-            # If no project filter (dashboard view): use averages
-            if project_filter:
-                # Specific project selected - show actual totals
-                forecast_value = data['forecast_total']
-                actual_value = data['actual_total']
-                print(f"Month {month_key} (Project {project_filter}): forecast={forecast_value:.1f}, actual={actual_value:.1f}")
-            else:
-                # Dashboard view - show averages across all accessible projects
-                forecast_value = data['forecast_total'] / data['forecast_count'] if data['forecast_count'] > 0 else 0
-                actual_value = data['actual_total'] / data['actual_count'] if data['actual_count'] > 0 else 0
-                print(f"Month {month_key} (Average): forecast={forecast_value:.1f} (from {data['forecast_count']} projects), actual={actual_value:.1f} (from {data['actual_count']} projects with actuals)")
-            
-            # Convert YYYY-MM to month name
+        for row in month_totals:
             try:
-                month_date = datetime.strptime(month_key, '%Y-%m')
-                month_name = month_date.strftime('%b')
-                trend_data.append({
-                    'month': month_name,
-                    'forecast': round(forecast_value, 1),
-                    'actual': round(actual_value, 1),  # Always return a value (0 if not entered)
-                    'forecast_count': data['forecast_count'],
-                    'actual_count': data['actual_count']
-                })
-            except ValueError as e:
-                print(f"Error parsing month {month_key}: {e}")
+                label = datetime.strptime(row['_id'], '%Y-%m').strftime('%b %Y')
+            except (TypeError, ValueError):
+                print(f"Skipping trend month {row['_id']!r}")
                 continue
+            count = row['count']
+            if project_filter:
+                forecast_value, actual_value = row['forecast_total'], row['actual_total']
+            else:
+                forecast_value, actual_value = row['forecast_total'] / count, row['actual_total'] / count
+            trend_data.append({
+                'month': label,
+                'month_key': row['_id'],
+                'forecast': round(forecast_value, 1),
+                'actual': round(actual_value, 1),
+                'forecast_count': count,
+                'actual_count': count
+            })
         
-        # If no data, return empty array (no dummy data)
-        if not trend_data:
-            print("No trend data found, returning empty array")
-            trend_data = []
-        
-        print(f"Returning {len(trend_data)} trend data points")
+        print(f"Dashboard trends for {username}: {len(trend_data)} months in {(time.perf_counter() - started) * 1000:.1f} ms")
         return jsonify(trend_data)
     except Exception as e:
         print(f"Error in dashboard trends: {str(e)}")
@@ -1603,34 +1892,26 @@ def get_project_forecast_by_month(project_id, month):
         username = get_jwt_identity()
         
         # Check if user has access to this project
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
-        
-        # Verify project access
-        project = projects_collection.find_one({
-            'project_id': project_id,
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        })
-        
-        if not project:
+        scope = get_access_scope(username)
+        if not can_access_project(scope, project_id):
             return jsonify({'error': 'Project not found or access denied'}), 403
         
-        forecast = forecasts_collection.find_one({
-            'project_id': project_id,
-            'forecast_month': month
-        })
+        forecast = forecast_store.get_month(project_id, month)
+        if forecast:
+            forecast['project_id'] = project_id
+        elif forecast_store.legacy_read_enabled():
+            # Not migrated yet: old per-forecast documents
+            forecast = forecasts_collection.find_one({
+                'project_id': project_id,
+                'forecast_month': month
+            })
+            if forecast:
+                # Convert ObjectId to string for JSON serialization
+                forecast['_id'] = str(forecast['_id'])
         
         if not forecast:
             return jsonify({'error': f'No forecast found for project {project_id} in month {month}'}), 404
         
-        # Convert ObjectId to string for JSON serialization
-        forecast['_id'] = str(forecast['_id'])
         if 'created_at' in forecast:
             forecast['created_at'] = forecast['created_at'].isoformat()
         if 'updated_at' in forecast:
@@ -1648,31 +1929,12 @@ def get_actual_values(project_id, month):
         username = get_jwt_identity()
         
         # Check if user has access to this project
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
-        
-        # Verify project access
-        project = projects_collection.find_one({
-            'project_id': project_id,
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        })
-        
-        if not project:
+        scope = get_access_scope(username)
+        if not can_access_project(scope, project_id):
             return jsonify({'error': 'Project not found or access denied'}), 403
         
-        # Get the forecast data from consolidated doc
-        doc = project_forecasts_collection.find_one({'project_id': project_id})
-        forecast = None
-        for f in (doc.get('forecasts', []) if doc else []):
-            if f.get('forecast_month') == month:
-                forecast = f
-                break
+        # Get the forecast data for the month
+        forecast = forecast_store.get_month(project_id, month)
         
         if not forecast:
             return jsonify({'error': f'No forecast found for project {project_id} in month {month}'}), 404
@@ -1708,30 +1970,14 @@ def get_project_forecasts(project_id):
         username = get_jwt_identity()
         
         # Check if user has access to this project
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
-        
-        # Verify project access
-        project = projects_collection.find_one({
-            'project_id': project_id,
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        })
-        
-        if not project:
+        scope = get_access_scope(username)
+        if not can_access_project(scope, project_id):
             return jsonify({'error': 'Project not found or access denied'}), 403
         
         # New schema first
-        doc = project_forecasts_collection.find_one({'project_id': project_id})
-        forecasts = (doc.get('forecasts', []) if doc else [])
-        forecasts = [f for f in forecasts if f.get('predictions')]
-        # Fallback to legacy collection if empty (for older data)
-        if not forecasts:
+        forecasts = [f for f in forecast_store.project_months(project_id) if f.get('predictions')]
+        # Fallback to legacy collection if empty (for older data), until it has been migrated
+        if not forecasts and forecast_store.legacy_read_enabled():
             legacy = list(forecasts_collection.find({'project_id': project_id}))
             forecasts = []
             for f in legacy:
@@ -1827,6 +2073,9 @@ def save_material_actuals():
             {'$set': actual_data},
             upsert=True
         )
+        dashboard_rollups.write([
+            dashboard_rollups.material_actuals_op(actual_data['project_id'], actual_data['month'], actual_data['material_values'])
+        ])
         
         return jsonify({
             'message': 'Material actuals saved successfully',
@@ -1892,20 +2141,10 @@ def get_orders():
     try:
         username = get_jwt_identity()
         
-        # Get user's teams
-        user_teams = list(teams_collection.find({
-            'members.username': username
-        }, {'team_id': 1, '_id': 0}))
-        
-        team_ids = [team['team_id'] for team in user_teams]
+        scope = get_access_scope(username)
         
         # Get projects accessible to user (own projects + team projects)
-        accessible_projects = list(projects_collection.find({
-            '$or': [
-                {'created_by': username},
-                {'team_id': {'$in': team_ids}}
-            ]
-        }, {'project_id': 1, '_id': 0}))
+        accessible_projects = list(projects_collection.find(scope.project_query(), {'project_id': 1, '_id': 0}))
         
         project_ids = [project['project_id'] for project in accessible_projects]
         
@@ -1920,7 +2159,7 @@ def get_orders():
         
         orders = list(orders_collection.find(orders_query, {'_id': 0}).sort('created_at', -1))
         
-        print(f"GET /api/orders - Found {len(orders)} orders for user {username} (teams: {team_ids})")
+        print(f"GET /api/orders - Found {len(orders)} orders for user {username} (teams: {scope.team_ids})")
         
         return jsonify(orders)
     except errors.PyMongoError as e:
@@ -2096,38 +2335,14 @@ def save_actual_values(project_id):
         requested_month = data.get('month')  # optional 'YYYY-MM'
         actual_values = data.get('actual_values', {})
 
-        # Load consolidated project forecasts
-        doc = project_forecasts_collection.find_one({'project_id': project_id})
-        if not doc or not doc.get('forecasts'):
-            return jsonify({'error': 'No forecast found for this project'}), 404
-
-        # Determine target month: requested month or latest available
-        months = [f for f in doc['forecasts'] if f.get('predictions')]
-        if not months:
+        # Determine target month: requested month or latest available (YYYY-MM)
+        target_month = requested_month or forecast_store.latest_month(project_id)
+        if not target_month:
             return jsonify({'error': 'No forecast found for this project'}), 404
 
-        if requested_month:
-            target_month = requested_month
-        else:
-            # Latest by forecast_month string (YYYY-MM)
-            target_month = sorted((m.get('forecast_month') for m in months if m.get('forecast_month')), reverse=True)[0]
-
-        # Update the month entry using arrayFilters
-        result = project_forecasts_collection.update_one(
-            {'project_id': project_id},
-            {
-                '$set': {
-                    'forecasts.$[m].actual_values': actual_values,
-                    'forecasts.$[m].updated_at': datetime.now(timezone.utc),
-                    'forecasts.$[m].actual_values_updated_at': datetime.now(timezone.utc),
-                    'forecasts.$[m].actual_values_updated_by': get_jwt_identity()
-                }
-            },
-            array_filters=[{'m.forecast_month': target_month}]
-        )
-
-        if result.matched_count == 0:
+        if not forecast_store.set_actual_values(project_id, target_month, actual_values, get_jwt_identity()):
             return jsonify({'error': f'No forecast found for month {target_month}'}), 404
+        dashboard_rollups.write([dashboard_rollups.actuals_op(project_id, target_month, actual_values)])
 
         return jsonify({
             'message': 'Actual values saved successfully',
@@ -2139,6 +2354,174 @@ def save_actual_values(project_id):
     except Exception as e:
         return jsonify({'error': f'Failed to save actual values: {str(e)}'}), 500
 
+# Rows per bulk_write when importing actual values, and the most rows one upload may carry
+ACTUALS_IMPORT_CHUNK_ROWS = int(os.getenv('ACTUALS_IMPORT_CHUNK_ROWS', '1000'))
+ACTUALS_IMPORT_MAX_ROWS = int(os.getenv('ACTUALS_IMPORT_MAX_ROWS', '100000'))
+
+ACTUALS_IMPORT_KEY_FIELDS = ('project_id', 'month', 'forecast_month')
+
+def iter_actuals_import_rows(stream, upload_format):
+    """Yield (row_number, record or None, error) from a CSV or NDJSON byte stream, one line at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if upload_format == 'csv':
+        for row_number, record in enumerate(csv.DictReader(text), start=1):
+            yield row_number, record, None
+        return
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, 'Row must be a JSON object'
+            continue
+        yield row_number, record, None
+
+def parse_actuals_import_row(record, material_cols):
+    """Validate one import row; returns (project_id, month, actual_values) or raises ValueError"""
+    # csv.DictReader collects fields beyond the header under the None key
+    if None in record:
+        raise ValueError(f'Row has more fields than the header ({len(record[None])} extra)')
+    project_id = str(record.get('project_id') or '').strip()
+    if not project_id:
+        raise ValueError('project_id is required')
+    month = str(record.get('month') or record.get('forecast_month') or '').strip()
+    if not re.match(r'^\d{4}-(0[1-9]|1[0-2])$', month):
+        raise ValueError(f'Invalid month {month!r}, expected YYYY-MM')
+    unknown = [key for key in record if key not in material_cols and key not in ACTUALS_IMPORT_KEY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown material columns: {', '.join(sorted(map(str, unknown)))}")
+    
+    actual_values = {}
+    for col in material_cols:
+        value = record.get(col)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        try:
+            actual_values[col] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid value for {col}: {value!r}')
+    if not actual_values:
+        raise ValueError('Row has no material values')
+    return project_id, month, actual_values
+
+def apply_actuals_import_chunk(chunk, scope, report):
+    """Write one chunk of parsed rows with a single bulk_write; fills in report entries"""
+    username = scope.username
+    project_ids = list({row['project_id'] for row in chunk})
+    accessible = {p['project_id'] for p in projects_collection.find({
+        'project_id': {'$in': project_ids},
+        **scope.project_query()
+    }, {'project_id': 1, '_id': 0})}
+    existing = forecast_store.existing_months(accessible)
+    
+    # Months still only in the array layout move over before their actuals are written
+    for project_id in {pid for (pid, _), layout in existing.items() if layout != forecast_store.layout}:
+        forecast_store.migrate_project(project_id)
+    
+    # Group by project so updates to the same document sit together; the sort is
+    # stable, so a repeated (project, month) still resolves to the last row
+    write_ops = []
+    rollup_ops = []
+    for row in sorted(chunk, key=lambda r: r['project_id']):
+        entry = report[row['index']]
+        if row['project_id'] not in accessible:
+            entry.update(status='error', error='Project not found or access denied')
+        elif (row['project_id'], row['month']) not in existing:
+            entry.update(status='error', error=f"No forecast found for month {row['month']}")
+        else:
+            write_ops.append(forecast_store.actual_values_write_op(row['project_id'], row['month'], row['actual_values'], username))
+            rollup_ops.append(dashboard_rollups.actuals_op(row['project_id'], row['month'], row['actual_values']))
+            entry['status'] = 'saved'
+    
+    if write_ops:
+        forecast_store.bulk_write(write_ops)
+        dashboard_rollups.write(rollup_ops)
+    return len(write_ops)
+
+@app.route('/api/actual-values/import', methods=['POST'])
+@jwt_required()
+def import_actual_values():
+    """
+    Bulk actual-values upload. The body is streamed as CSV (text/csv) or NDJSON
+    (application/x-ndjson), or as given by ?format=csv|ndjson. Each row has
+    project_id, month (YYYY-MM) and any of the target material columns.
+    """
+    bundle = get_model_bundle()
+    if bundle is None:
+        return jsonify({'error': 'Model not available - still loading. Please try again in a moment.'}), 503
+    
+    upload_format = (request.args.get('format') or '').lower()
+    if not upload_format:
+        upload_format = 'csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson'
+    if upload_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    username = get_jwt_identity()
+    material_cols = set(bundle.target_cols)
+    scope = get_access_scope(username)
+    
+    started = time.perf_counter()
+    report = []
+    chunk = []
+    saved = 0
+    bulk_writes = 0
+    truncated = False
+    try:
+        for row_number, record, error in iter_actuals_import_rows(request.stream, upload_format):
+            if row_number > ACTUALS_IMPORT_MAX_ROWS:
+                truncated = True
+                break
+            entry = {'row': row_number}
+            report.append(entry)
+            if error is None:
+                try:
+                    project_id, month, actual_values = parse_actuals_import_row(record, material_cols)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                entry.update(status='error', error=error)
+                continue
+            entry.update(project_id=project_id, month=month)
+            chunk.append({'index': len(report) - 1, 'project_id': project_id, 'month': month, 'actual_values': actual_values})
+            
+            if len(chunk) >= ACTUALS_IMPORT_CHUNK_ROWS:
+                written = apply_actuals_import_chunk(chunk, scope, report)
+                saved += written
+                bulk_writes += 1 if written else 0
+                chunk = []
+        if chunk:
+            written = apply_actuals_import_chunk(chunk, scope, report)
+            saved += written
+            bulk_writes += 1 if written else 0
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Upload must be UTF-8 encoded', 'results': report}), 400
+    except errors.PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}', 'results': report}), 500
+    
+    elapsed = time.perf_counter() - started
+    print(f"Imported {saved}/{len(report)} actual-value rows for {username} in {elapsed:.2f}s")
+    return jsonify({
+        'success': True,
+        'results': report,
+        'summary': {
+            'format': upload_format,
+            'total_rows': len(report),
+            'saved_rows': saved,
+            'failed_rows': len(report) - saved,
+            'bulk_writes': bulk_writes,
+            'truncated': truncated,
+            'max_rows': ACTUALS_IMPORT_MAX_ROWS,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(len(report) / elapsed, 1) if elapsed > 0 else None
+        }
+    }), 200
+
 @app.route('/api/orders/<order_id>', methods=['PUT'])
 @jwt_required()
 def update_order_status(order_id):
@@ -2277,11 +2660,76 @@ def health_check():
     """Simple health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'models_loaded': model is not None,
-        'data_loaded': df is not None,
+        'models_loaded': readiness.is_ready('models'),
+        'data_loaded': readiness.is_ready('data'),
+        'readiness': readiness.status(),
+        'model_version': model_version,
+        'model_registry_version': model_bundle.registry_version if model_bundle else None,
+        'model_server': MODEL_SERVER_SOCKET or None,
+        'prediction_cache': prediction_cache.stats(),
+        'access_scope_cache': access_scopes.stats(),
+        'dataset_memory': dataset_memory,
+        'analytics_query_cache': aggregate_index.cache.stats() if aggregate_index else None,
+        'dashboard_rollups': dashboard_rollups.stats(),
         'timestamp': datetime.now(timezone.utc).isoformat()
     })
 
+# Model registry administration
+@app.route('/api/admin/model', methods=['GET'])
+@jwt_required()
+def get_model_status():
+    """Active model bundle and the versions available in the registry"""
+    if not is_admin(get_jwt_identity()):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    try:
+        bundle = model_bundle
+        return jsonify({
+            'active': {
+                'version': bundle.version,
+                'registry_version': bundle.registry_version,
+                'loaded_at': bundle.loaded_at.isoformat()
+            } if bundle else None,
+            'registry_current': model_registry.current_version(),
+            'versions': model_registry.versions(),
+            'readiness': readiness.status()['models']
+        })
+    except (RegistryError, OSError) as e:
+        return jsonify({'error': f'Failed to read model registry: {str(e)}'}), 500
+
+@app.route('/api/admin/model/activate', methods=['POST'])
+@jwt_required()
+def activate_model_version():
+    """Load, canary-check and hot-swap a registry version, then make it CURRENT"""
+    if not is_admin(get_jwt_identity()):
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    data = request.get_json() or {}
+    version = data.get('version')
+    if not version:
+        return jsonify({'error': 'version is required'}), 400
+    
+    try:
+        model_registry.manifest(version)
+    except RegistryError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    if not reload_models(version):
+        error = readiness.status()['models']['error'] or 'Another model load is in progress'
+        return jsonify({'error': f'Failed to activate model {version}: {error}'}), 409
+    
+    try:
+        # Other workers pick the new version up on their next registry poll
+        model_registry.activate(version)
+    except (RegistryError, OSError) as e:
+        return jsonify({'error': f'Model loaded but CURRENT could not be updated: {str(e)}'}), 500
+    
+    return jsonify({
+        'message': f'Model version {version} activated',
+        'version': version,
+        'model_version': model_bundle.version
+    }), 200
+
 # Inventory Management Endpoints
 @app.route('/api/inventory', methods=['GET'])
 @jwt_required()
@@ -2662,6 +3110,7 @@ def create_team():
         
         result = teams_collection.insert_one(team_data)
         team_data['_id'] = str(result.inserted_id)
+        access_scopes.invalidate_users(username)
         
         # Create notification for team creation
         create_notification(username, 'team_created', f'Team "{team_data["name"]}" created successfully')
@@ -2945,6 +3394,8 @@ def accept_team_invitation(invitation_token):
                 }
             }
         )
+        access_principals.member_added(invitation['team_id'], username)
+        access_scopes.invalidate_team(invitation['team_id'], username)
         
         # Mark invitation as accepted
         team_invitations_collection.update_one(
@@ -3025,11 +3476,12 @@ def accept_project_invitation(invitation_token):
             # Update project with new team_id
             projects_collection.update_one(
                 {'project_id': invitation['project_id']},
-                {'$set': {'team_id': new_team_id}}
+                access_principals.team_assigned_update(new_team_id, [project['created_by']])
             )
             
             # Update project variable with new team_id
             project['team_id'] = new_team_id
+            access_scopes.invalidate_project(project['created_by'], new_team_id)
         
         # Add user to the project's team
         # Check if user is already in the team
@@ -3052,6 +3504,8 @@ def accept_project_invitation(invitation_token):
                     }
                 }
             )
+            access_principals.member_added(project['team_id'], username)
+            access_scopes.invalidate_team(project['team_id'], username)
         
         # Mark invitation as accepted
         team_invitations_collection.update_one(
@@ -3131,6 +3585,8 @@ def remove_team_member(team_id, member_username):
             {'team_id': team_id},
             {'$pull': {'members': {'username': member_username}}}
         )
+        access_principals.members_removed(team_id, [member_username])
+        access_scopes.invalidate_team(team_id, member_username)
         
         # Create notification for removed member
         create_notification(member_username, 'team_removed', f'You were removed from team "{team["name"]}"')
@@ -3172,6 +3628,9 @@ def delete_team(team_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Team not found'}), 404
         
+        members = [m.get('username') for m in team.get('members', [])]
+        access_principals.team_deleted(team_id, members)
+        access_scopes.invalidate_team(team_id, *members)
         return jsonify({'message': 'Team deleted successfully'}), 200
         
     except errors.PyMongoError as e:
@@ -3535,14 +3994,8 @@ def get_user_teams(username):
 def get_team_members_for_user(username):
     """Get all team members from all teams that a user belongs to"""
     try:
-        teams = get_user_teams(username)
-        all_members = set([username])  # Include the user themselves
-        
-        for team in teams:
-            for member in team.get('members', []):
-                all_members.add(member['username'])
-        
-        return list(all_members)
+        # The user themselves is included
+        return list(get_access_scope(username).team_members)
     except Exception as e:
         print(f"Error getting team members: {e}")
         return [username]  # Fallback to just the user
@@ -0,0 +1,262 @@
+# Forecast inference benchmark
+# Drives the forecast path offline (in-memory stand-in for MongoDB, Flask test
+# client) at several batch sizes and reports latency percentiles, throughput
+# and peak RSS. Results are written as JSON so runs can be compared across
+# commits; the run fails when the regression budget is exceeded.
+#
+# Usage:
+#   python benchmark.py                                   # all sizes, writes benchmark_results.json
+#   python benchmark.py --sizes 1,100,1000 --output new.json
+#   python benchmark.py --baseline old.json               # also check regressions against an earlier run
+#
+# Scenarios:
+#   features      FeaturePipeline.transform on raw payloads
+#   predict       InferenceEngine.predict on an encoded matrix
+#   forecast      POST /api/forecast (one item per request, batch size 1 only)
+#   forecast_api  POST /api/forecast/batch end to end, including the JSON round trip
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000, 50000]
+DEFAULT_BUDGET_PATH = 'benchmark_budget.json'
+DATASET_PATH = '../powergrid_realistic_material_dataset1.csv'
+
+
+class _FakeCollection:
+    """Accepts the calls the forecast path and index setup make, without storing anything"""
+
+    def __init__(self):
+        self.write_ops = 0
+
+    def create_index(self, *args, **kwargs):
+        return None
+
+    def count_documents(self, *args, **kwargs):
+        return 0
+
+    def find_one(self, *args, **kwargs):
+        return None
+
+    def find(self, *args, **kwargs):
+        return iter(())
+
+    def bulk_write(self, operations, ordered=True):
+        self.write_ops += len(operations)
+        return None
+
+
+class _FakeDatabase(dict):
+    def __missing__(self, name):
+        collection = self[name] = _FakeCollection()
+        return collection
+
+
+class _FakeMongoClient:
+    def __init__(self, *args, **kwargs):
+        self.databases = {}
+
+    class admin:
+        @staticmethod
+        def command(*args, **kwargs):
+            return {'ok': 1}
+
+    def __getitem__(self, name):
+        return self.databases.setdefault(name, _FakeDatabase())
+
+
+def _import_app(max_batch):
+    """Import app.py against the fake MongoDB with caching and hot-swap polling off"""
+    import pymongo
+    pymongo.MongoClient = _FakeMongoClient
+    os.environ.setdefault('PREDICTION_CACHE_SIZE', '0')
+    os.environ.setdefault('MODEL_REGISTRY_POLL_SECONDS', '0')
+    os.environ['FORECAST_BATCH_MAX_ITEMS'] = str(max(max_batch, int(os.getenv('FORECAST_BATCH_MAX_ITEMS', '5000'))))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as app_module
+    return app_module
+
+
+def _payloads(feature_cols, size, rng):
+    """Forecast request bodies sampled from the training dataset"""
+    data = pd.read_csv(DATASET_PATH, usecols=lambda c: c in feature_cols or c == 'project_id')
+    rows = data.iloc[rng.integers(0, len(data), size)].to_dict('records')
+    for i, row in enumerate(rows):
+        row['forecast_month'] = f"2025-{(i % 12) + 1:02d}"
+    return rows
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _measure(fn, size, min_runs, max_runs, target_seconds):
+    fn()  # warm-up, not timed
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() - started < target_seconds):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings_ms = np.asarray(timings) * 1000
+    return {
+        'runs': len(timings),
+        'p50_ms': round(float(np.percentile(timings_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(timings_ms, 99)), 3),
+        'mean_ms': round(float(timings_ms.mean()), 3),
+        'rows_per_sec': round(size * len(timings) / (sum(timings) or 1e-9), 1),
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+
+def run_benchmarks(sizes, min_runs=5, max_runs=200, target_seconds=2.0):
+    app_module = _import_app(max(sizes))
+    bundle = app_module.get_model_bundle(wait_seconds=300)
+    if bundle is None:
+        raise SystemExit(f"Model failed to load: {app_module.readiness.status()['models']['error']}")
+
+    from flask_jwt_extended import create_access_token
+    with app_module.app.app_context():
+        headers = {'Authorization': f"Bearer {create_access_token(identity='benchmark')}"}
+    client = app_module.app.test_client()
+    rng = np.random.default_rng(0)
+    all_payloads = _payloads(bundle.feature_cols, max(sizes), rng)
+
+    def post(path, body):
+        response = client.post(path, json=body, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    results = []
+    for size in sizes:
+        payloads = all_payloads[:size]
+        matrix, _ = bundle.pipeline.transform(payloads)
+        scenarios = [
+            ('features', lambda: bundle.pipeline.transform(payloads)),
+            ('predict', lambda: bundle.engine.predict(matrix))
+        ]
+        if size == 1:
+            scenarios.append(('forecast', lambda: post('/api/forecast', payloads[0])))
+        scenarios.append(('forecast_api', lambda: post('/api/forecast/batch', {'items': payloads})))
+
+        for name, fn in scenarios:
+            # The routes log every upsert; keep that out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = _measure(fn, size, min_runs, max_runs, target_seconds)
+            result = {'scenario': name, 'batch_size': size, **stats}
+            results.append(result)
+            print(f"{name:<13} {size:>6}  p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+                  f"p99 {stats['p99_ms']:>9.3f} ms  {stats['rows_per_sec']:>12.1f} rows/s  rss {stats['peak_rss_mb']:.1f} MB")
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'xgboost': _xgboost_version(),
+            'inference_threads': app_module.INFERENCE_THREADS,
+            'model_server': bool(app_module.MODEL_SERVER_SOCKET)
+        },
+        'model_version': bundle.version,
+        'results': results
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _xgboost_version():
+    try:
+        import xgboost
+        return xgboost.__version__
+    except ImportError:
+        return None
+
+
+def check_budget(report, budget, baseline=None):
+    """
+    Returns a list of budget violations.
+    budget['limits'] holds absolute ceilings per "scenario:batch_size" key
+    (p95_ms, p99_ms, peak_rss_mb) and floors (min_rows_per_sec).
+    With a baseline report, p95 latency and throughput may not regress by
+    more than max_regression_pct; differences under min_delta_ms are noise.
+    """
+    violations = []
+    for result in report['results']:
+        key = f"{result['scenario']}:{result['batch_size']}"
+        limits = budget.get('limits', {}).get(key, {})
+        for metric in ('p95_ms', 'p99_ms', 'peak_rss_mb'):
+            if metric in limits and result[metric] > limits[metric]:
+                violations.append(f"{key} {metric} {result[metric]} exceeds limit {limits[metric]}")
+        if 'min_rows_per_sec' in limits and result['rows_per_sec'] < limits['min_rows_per_sec']:
+            violations.append(f"{key} rows_per_sec {result['rows_per_sec']} below limit {limits['min_rows_per_sec']}")
+
+    if baseline is not None:
+        allowed = budget.get('max_regression_pct', 20) / 100.0
+        min_delta_ms = budget.get('min_delta_ms', 0.5)
+        previous = {(r['scenario'], r['batch_size']): r for r in baseline.get('results', [])}
+        for result in report['results']:
+            base = previous.get((result['scenario'], result['batch_size']))
+            if base is None:
+                continue
+            key = f"{result['scenario']}:{result['batch_size']}"
+            if result['p95_ms'] > base['p95_ms'] * (1 + allowed) and result['p95_ms'] - base['p95_ms'] > min_delta_ms:
+                violations.append(f"{key} p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+            if result['rows_per_sec'] < base['rows_per_sec'] * (1 - allowed):
+                violations.append(f"{key} throughput {base['rows_per_sec']} -> {result['rows_per_sec']} rows/s")
+    return violations
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the forecast inference path')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES), help='comma separated batch sizes')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--budget', default=DEFAULT_BUDGET_PATH)
+    parser.add_argument('--baseline', help='earlier results file to check for regressions')
+    parser.add_argument('--seconds', type=float, default=2.0, help='target time spent per scenario')
+    args = parser.parse_args()
+
+    sizes = sorted({int(s) for s in args.sizes.split(',') if s.strip()})
+    report = run_benchmarks(sizes, target_seconds=args.seconds)
+
+    budget = _read_json(args.budget) if os.path.isfile(args.budget) else {}
+    baseline = _read_json(args.baseline) if args.baseline else None
+    violations = check_budget(report, budget, baseline)
+    report['budget_violations'] = violations
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if violations:
+        print('Regression budget exceeded:')
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
@@ -0,0 +1,160 @@
+# Compiled forecast model format for fast cold starts
+# Unpickling the sklearn MultiOutputRegressor rebuilds a large Python object
+# graph. The compiled format stores each target's native XGBoost booster as
+# UBJSON plus one small JSON manifest with the feature/target columns and the
+# label encoder classes, so loading needs neither pickle nor sklearn. The
+# manifest records the SHA-256 of every pickled artifact it was exported
+# from, and the export counts as stale once any of them changes.
+#
+#   compiled_model/
+#     manifest.json
+#     target_00.ubj ... target_12.ubj
+#
+# Usage:
+#   python compiled_model.py export [artifact_dir]     # default ..
+#   python compiled_model.py benchmark [artifact_dir]  # pickle vs compiled load time
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import xgboost as xgb
+
+from inference_engine import InferenceEngine
+from model_registry import ARTIFACT_FILES, artifact_checksums
+
+COMPILED_DIR_NAME = 'compiled_model'
+FORMAT_VERSION = 2
+
+
+class CompiledEncoder:
+    """Just enough of a LabelEncoder for FeaturePipeline: the ordered classes"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+
+class CompiledModel:
+    """Per-target native boosters loaded from UBJSON, predicting in target order"""
+
+    def __init__(self, boosters, iteration_ranges):
+        self.boosters = boosters
+        self.iteration_ranges = iteration_ranges
+        self._engine = InferenceEngine(self)
+
+    def predict(self, matrix):
+        return self._engine.predict(matrix)
+
+
+def export_compiled(artifact_paths, out_dir):
+    """Write the compiled format for the pickled artifacts at artifact_paths"""
+    model = joblib.load(artifact_paths['model'])
+    feature_cols = joblib.load(artifact_paths['feature_cols'])
+    target_cols = joblib.load(artifact_paths['target_cols'])
+    label_encoders = joblib.load(artifact_paths['label_encoders'])
+
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators or not all(hasattr(est, 'get_booster') for est in estimators):
+        raise ValueError('Only MultiOutputRegressor models of XGBoost estimators can be compiled')
+    if len(estimators) != len(target_cols):
+        raise ValueError(f'Model has {len(estimators)} estimators but there are {len(target_cols)} target columns')
+
+    os.makedirs(out_dir, exist_ok=True)
+    boosters = []
+    for i, est in enumerate(estimators):
+        name = f'target_{i:02d}.ubj'
+        est.get_booster().save_model(os.path.join(out_dir, name))
+        boosters.append({
+            'target': target_cols[i],
+            'file': name,
+            'iteration_range': list(InferenceEngine._iteration_range(est))
+        })
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'artifact_sha256': artifact_checksums({role: artifact_paths[role] for role in ARTIFACT_FILES}),
+        'feature_cols': list(feature_cols),
+        'target_cols': list(target_cols),
+        'label_encoders': {col: enc.classes_.tolist() for col, enc in label_encoders.items()},
+        'boosters': boosters
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(compiled_dir):
+    try:
+        with open(os.path.join(compiled_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def is_fresh(compiled_dir, checksums):
+    """
+    True when compiled_dir holds an export of the artifacts with the given
+    checksums (role -> SHA-256, e.g. as verified by the registry). Every
+    role given must match; a role the caller has no checksum for counts as stale.
+    """
+    manifest = read_manifest(compiled_dir)
+    if manifest is None or manifest.get('format_version') != FORMAT_VERSION:
+        return False
+    exported = manifest.get('artifact_sha256') or {}
+    return bool(checksums) and all(sha and exported.get(role) == sha for role, sha in checksums.items())
+
+
+def load_compiled(compiled_dir):
+    """Returns (model, feature_cols, target_cols, label_encoders) from the compiled format"""
+    manifest = read_manifest(compiled_dir)
+    if manifest is None:
+        raise FileNotFoundError(f'No compiled model in {compiled_dir}')
+
+    boosters = []
+    iteration_ranges = []
+    for entry in manifest['boosters']:
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(compiled_dir, entry['file']))
+        boosters.append(booster)
+        iteration_ranges.append(tuple(entry['iteration_range']))
+
+    label_encoders = {col: CompiledEncoder(classes) for col, classes in manifest['label_encoders'].items()}
+    return CompiledModel(boosters, iteration_ranges), manifest['feature_cols'], manifest['target_cols'], label_encoders
+
+
+def _artifact_paths(artifact_dir):
+    return {role: os.path.join(artifact_dir, name) for role, name in ARTIFACT_FILES.items()}
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    artifact_dir = sys.argv[2] if len(sys.argv) > 2 else '..'
+    paths = _artifact_paths(artifact_dir)
+    compiled_dir = os.path.join(artifact_dir, COMPILED_DIR_NAME)
+
+    if command == 'export':
+        manifest = export_compiled(paths, compiled_dir)
+        print(f"Exported {len(manifest['boosters'])} boosters to {compiled_dir}")
+    elif command == 'benchmark':
+        started = time.perf_counter()
+        model = joblib.load(paths['model'])
+        for role in ('feature_cols', 'target_cols', 'label_encoders'):
+            joblib.load(paths[role])
+        pickle_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        compiled, feature_cols, _, _ = load_compiled(compiled_dir)
+        compiled_seconds = time.perf_counter() - started
+
+        matrix = (np.random.default_rng(0).random((1000, len(feature_cols))) * 100).astype(np.float32)
+        identical = np.array_equal(model.predict(matrix), compiled.predict(matrix))
+        print(f"pickle load:   {pickle_seconds * 1000:8.1f} ms")
+        print(f"compiled load: {compiled_seconds * 1000:8.1f} ms  ({pickle_seconds / compiled_seconds:.1f}x faster)")
+        print(f"identical predictions: {identical}")
+    else:
+        raise SystemExit('Usage: python compiled_model.py [export | benchmark] [artifact_dir]')
@@ -0,0 +1,315 @@
+# Precomputed dashboard figures per project month
+# One dashboard_rollups document per (project_id, month) holds the totals the
+# dashboard needs, so metrics and trends read a few small documents instead
+# of re-summing every stored forecast:
+#
+#   forecast_total, actual_total   sums over the 13 quantity_* values
+#   forecast_values, actual_values the same per quantity_* column
+#   has_predictions, has_actuals   whether the month has predictions / an actuals object
+#   accuracy                       (1 - |actual - forecast| / forecast) * 100, or None
+#   material_actual_total          from /api/material-actuals, when entered for a forecast month
+#
+# The forecast and actuals routes update the rollup right after their own
+# write. Until a full rebuild has completed (DASHBOARD_ROLLUPS=auto) the
+# dashboard keeps reading the forecast storage directly. A (project_id, month)
+# whose rollup update fails is recorded in dashboard_rollups_dirty, and the
+# dashboard reads that project from the forecast storage until the next rebuild.
+#
+# Usage:
+#   python dashboard_rollups.py rebuild [batch_size]
+#   python dashboard_rollups.py status
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from forecast_store import forecast_totals, numeric_values, store_from_env, sum_numeric_values
+
+REBUILD_ID = 'dashboard_rollups_rebuild'
+
+
+def _accuracy_expr(forecast_total, actual_total):
+    return {'$multiply': [
+        {'$subtract': [1, {'$divide': [{'$abs': {'$subtract': [actual_total, forecast_total]}}, forecast_total]}]},
+        100
+    ]}
+
+
+class DashboardRollups:
+    def __init__(self, db, store, mode='auto'):
+        self.rollups = db['dashboard_rollups']
+        self.dirty = db['dashboard_rollups_dirty']
+        self.migrations = db['migrations']
+        self.material_actuals = db['material_actuals']
+        self.store = store
+        self.mode = mode
+        self._checked_at = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self._unmarked = {}  # (project_id, month) -> failed_at, not yet recorded in self.dirty
+        self.write_failures = 0
+        self.last_write_error = None
+
+    def enabled(self):
+        """
+        Whether the dashboard reads rollups: DASHBOARD_ROLLUPS=true/false, or
+        auto (the default) once a rebuild has completed. Rechecked at most
+        once a minute.
+        """
+        if self.mode != 'auto':
+            return self.mode == 'true'
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at > 60:
+            state = self.migrations.find_one({'_id': REBUILD_ID}, {'completed_at': 1})
+            self._ready = bool(state and state.get('completed_at'))
+            self._checked_at = now
+        return self._ready
+
+    def entry_fields(self, entry):
+        """Rollup fields for a raw (possibly compact) month entry"""
+        forecast_total, actual_total = (float(t[0]) for t in forecast_totals([entry]))
+        has_predictions = bool(entry.get('predictions'))
+        has_actuals = entry.get('actual_values') is not None
+        accuracy = None
+        if has_predictions and has_actuals and forecast_total > 0:
+            accuracy = (1 - abs(actual_total - forecast_total) / forecast_total) * 100
+        decoded = self.store.decode_entry(dict(entry))
+        return {
+            'forecast_total': forecast_total,
+            'actual_total': actual_total,
+            'forecast_values': numeric_values(decoded.get('predictions')),
+            'actual_values': numeric_values(decoded.get('actual_values')),
+            'has_predictions': has_predictions,
+            'has_actuals': has_actuals,
+            'accuracy': accuracy
+        }
+
+    # Incremental updates
+
+    def forecast_op(self, project_id, month, results):
+        """A forecast write resets the month's actuals, so the rollup follows from results alone"""
+        fields = self.entry_fields({'predictions': results, 'actual_values': {}})
+        return UpdateOne(
+            {'project_id': project_id, 'month': month},
+            {'$set': {**fields, 'updated_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    def actuals_op(self, project_id, month, actual_values):
+        """Pipeline update: accuracy is recomputed against the stored forecast_total"""
+        has_actuals = actual_values is not None
+        actual_total = sum_numeric_values(actual_values) if isinstance(actual_values, dict) else 0.0
+        accuracy = {'$cond': [
+            {'$and': ['$has_predictions', has_actuals, {'$gt': ['$forecast_total', 0]}]},
+            _accuracy_expr('$forecast_total', actual_total),
+            None
+        ]}
+        return UpdateOne(
+            {'project_id': project_id, 'month': month},
+            [{'$set': {
+                'actual_total': actual_total,
+                'actual_values': {'$literal': numeric_values(actual_values) if isinstance(actual_values, dict) else {}},
+                'has_actuals': has_actuals,
+                'accuracy': accuracy,
+                'updated_at': datetime.now(timezone.utc)
+            }}]
+        )
+
+    def material_actuals_op(self, project_id, month, material_values):
+        """Only months that have a forecast get a rollup"""
+        return UpdateOne(
+            {'project_id': project_id, 'month': month},
+            {'$set': {'material_actual_total': sum_numeric_values(material_values) if isinstance(material_values, dict) else 0.0}}
+        )
+
+    def write(self, operations):
+        """
+        Apply rollup ops in order. On failure their months are marked dirty, so
+        the dashboard reads them from the forecast storage until the next rebuild.
+        """
+        if not operations:
+            return
+        try:
+            self.rollups.bulk_write(operations, ordered=True)
+        except Exception as e:
+            print(f"Failed to update dashboard rollups: {e}")
+            failed_at = datetime.now(timezone.utc)
+            with self._lock:
+                self.write_failures += 1
+                self.last_write_error = str(e)[:200]
+                # Every rollup op filters on its (project_id, month)
+                for op in operations:
+                    self._unmarked[(op._filter['project_id'], op._filter['month'])] = failed_at
+        self._record_dirty()
+
+    def _record_dirty(self):
+        """Persist dirty months so every worker sees them; kept in memory while that fails"""
+        with self._lock:
+            pending = dict(self._unmarked)
+        if not pending:
+            return
+        try:
+            self.dirty.bulk_write([
+                UpdateOne({'project_id': project_id, 'month': month}, {'$set': {'failed_at': failed_at}}, upsert=True)
+                for (project_id, month), failed_at in pending.items()
+            ], ordered=False)
+        except Exception as e:
+            print(f"Failed to mark dashboard rollups dirty: {e}")
+            return
+        with self._lock:
+            for key, failed_at in pending.items():
+                if self._unmarked.get(key) == failed_at:
+                    del self._unmarked[key]
+
+    def dirty_months(self, project_ids=None):
+        """(project_id, month) pairs whose rollup missed an update, optionally only for project_ids"""
+        self._record_dirty()
+        query = {}
+        if project_ids is not None:
+            project_ids = set(project_ids)
+            query = {'project_id': {'$in': list(project_ids)}}
+        found = {(d['project_id'], d['month']) for d in self.dirty.find(query, {'_id': 0, 'project_id': 1, 'month': 1})}
+        with self._lock:
+            found.update(key for key in self._unmarked if project_ids is None or key[0] in project_ids)
+        return found
+
+    def stats(self):
+        """Write failures in this process and the months currently marked dirty"""
+        try:
+            dirty_months = self.dirty.count_documents({})
+        except Exception:
+            dirty_months = None
+        with self._lock:
+            return {
+                'write_failures': self.write_failures,
+                'last_write_error': self.last_write_error,
+                'dirty_months': dirty_months,
+                'unrecorded_dirty_months': len(self._unmarked)
+            }
+
+    # Reads
+
+    def lookup_stages(self):
+        """Aggregation stages that turn documents carrying a project_id into its rollups"""
+        return [
+            {'$lookup': {'from': self.rollups.name, 'localField': 'project_id', 'foreignField': 'project_id', 'as': '_rollups'}},
+            {'$unwind': '$_rollups'},
+            {'$replaceRoot': {'newRoot': '$_rollups'}}
+        ]
+
+    def monthly_totals(self, project_ids, month_range=None, column=None):
+        """
+        Forecast and actual totals per month over the projects' months with
+        predictions, all of them or one quantity_* column, as
+        [{'_id': month, 'forecast_total', 'actual_total', 'count'}] in month order.
+        month_range is a {'$gte'/'$lte': 'YYYY-MM'} condition on the
+        (project_id, month) index.
+        """
+        query = {'project_id': {'$in': list(project_ids)}, 'has_predictions': True}
+        if month_range:
+            query['month'] = month_range
+        forecast, actual = (f'$forecast_values.{column}', f'$actual_values.{column}') if column else ('$forecast_total', '$actual_total')
+        return list(self.rollups.aggregate([
+            {'$match': query},
+            {'$group': {
+                '_id': '$month',
+                'forecast_total': {'$sum': forecast},
+                'actual_total': {'$sum': actual},
+                'count': {'$sum': 1}
+            }},
+            {'$sort': {'_id': 1}}
+        ]))
+
+    # Rebuild
+
+    def rebuild(self, batch_size=1000, log=print):
+        """
+        Regenerate every rollup from the forecast storage. Rollups are upserted
+        in place and the ones no longer backed by a month are removed at the
+        end, so the dashboard never sees an empty collection.
+        """
+        started = datetime.now(timezone.utc)
+        # Months that failed before the rebuild started are regenerated by it
+        dirty = list(self.dirty.find({}, {'failed_at': 1}))
+        self.migrations.update_one(
+            {'_id': REBUILD_ID},
+            {'$set': {'started_at': started, 'months': 0}, '$unset': {'completed_at': ''}},
+            upsert=True
+        )
+        ops = []
+        months = 0
+        for project_id, entry in self.store.all_entries():
+            month = entry.get('forecast_month')
+            if not month:
+                continue
+            ops.append(UpdateOne(
+                {'project_id': project_id, 'month': month},
+                {'$set': {**self.entry_fields(entry), 'updated_at': datetime.now(timezone.utc)}},
+                upsert=True
+            ))
+            if len(ops) >= batch_size:
+                self.rollups.bulk_write(ops, ordered=False)
+                months += len(ops)
+                ops = []
+                log(f"{REBUILD_ID}: {months} months")
+        if ops:
+            self.rollups.bulk_write(ops, ordered=False)
+            months += len(ops)
+
+        ops = [
+            self.material_actuals_op(m.get('project_id'), m.get('month'), m.get('material_values'))
+            for m in self.material_actuals.find({}, {'project_id': 1, 'month': 1, 'material_values': 1, '_id': 0})
+        ]
+        for start in range(0, len(ops), batch_size):
+            self.rollups.bulk_write(ops[start:start + batch_size], ordered=False)
+
+        # Rollups untouched since the start belong to months that are gone
+        removed = self.rollups.delete_many({'updated_at': {'$lt': started}}).deleted_count
+        if dirty:
+            self.dirty.delete_many({'$or': [{'_id': d['_id'], 'failed_at': d['failed_at']} for d in dirty]})
+        with self._lock:
+            self._unmarked = {key: failed_at for key, failed_at in self._unmarked.items() if failed_at >= started}
+        self.migrations.update_one(
+            {'_id': REBUILD_ID},
+            {'$set': {'months': months, 'removed': removed, 'completed_at': datetime.now(timezone.utc)}}
+        )
+        self._checked_at = None
+        return {'months': months, 'removed': removed}
+
+    def status(self):
+        return {
+            'mode': self.mode,
+            'enabled': self.enabled(),
+            'rebuild': self.migrations.find_one({'_id': REBUILD_ID}, {'_id': 0}),
+            'rollups': self.rollups.estimated_document_count(),
+            'dirty_months': self.dirty.count_documents({})
+        }
+
+
+def rollups_from_env(db, store):
+    return DashboardRollups(db, store, mode=os.getenv('DASHBOARD_ROLLUPS', 'auto').lower())
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/PLANGRID_DATA'), serverSelectionTimeoutMS=5000)
+    db = client[os.getenv('MONGO_DB', 'material_forecast')]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    rollups = rollups_from_env(db, store_from_env(db))
+
+    if command == 'rebuild':
+        rollups.rollups.create_index([('project_id', 1), ('month', 1)], unique=True)
+        rollups.dirty.create_index([('project_id', 1), ('month', 1)], unique=True)
+        totals = rollups.rebuild(batch_size=int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+        print(f"Rebuild complete: {totals['months']} months, {totals['removed']} stale rollups removed")
+    elif command == 'status':
+        print(rollups.status())
+    else:
+        raise SystemExit('Usage: python dashboard_rollups.py [rebuild [batch_size] | status]')
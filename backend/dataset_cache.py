@@ -0,0 +1,154 @@
+# Columnar cache for the reference dataset CSVs
+# Parsing the CSV and inferring dtypes on every worker start is the slow part
+# of loading the dataset. The first load writes a typed Arrow/Feather copy
+# (uncompressed, so it can be memory-mapped) next to a small manifest holding
+# the CSV's SHA-256; later loads map that file instead, and workers on the
+# same host share its pages through the OS page cache. The cached frame is
+# the compacted one (dataset_schema.py), so categoricals and narrow dtypes come
+# back as stored. A changed CSV no longer matches the checksum, a changed schema
+# no longer matches the schema version, and the cache is rebuilt.
+#
+#   dataset_cache/
+#     powergrid_realistic_material_dataset1.feather
+#     powergrid_realistic_material_dataset1.json
+#
+# Usage:
+#   python dataset_cache.py build [csv ...]    # default: both ../*.csv datasets
+#   python dataset_cache.py status [csv ...]
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from dataset_schema import SCHEMA_VERSION, compact_frame
+from model_registry import file_sha256
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; without it the CSV is parsed every time
+    feather = None
+
+FORMAT_VERSION = 1
+DEFAULT_DATASETS = (
+    '../powergrid_realistic_material_dataset1.csv',
+    '../powergrid_realistic_material_dataset_with_dates.csv'
+)
+
+
+def cache_paths(csv_path, cache_dir):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f'{name}.feather'), os.path.join(cache_dir, f'{name}.json')
+
+
+def read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def is_fresh(csv_path, cache_dir, source_sha256=None):
+    """True when cache_dir holds a cache of csv_path's current contents"""
+    data_path, manifest_path = cache_paths(csv_path, cache_dir)
+    manifest = read_manifest(manifest_path)
+    if manifest is None or manifest.get('format_version') != FORMAT_VERSION or not os.path.isfile(data_path):
+        return False
+    if manifest.get('schema_version') != SCHEMA_VERSION:
+        return False
+    return manifest.get('source_sha256') == (source_sha256 or file_sha256(csv_path))
+
+
+def read_csv(csv_path):
+    """Parse and compact the CSV; returns (frame, seconds)"""
+    started = time.perf_counter()
+    frame = compact_frame(pd.read_csv(csv_path))
+    return frame, time.perf_counter() - started
+
+
+def build_cache(csv_path, cache_dir, frame=None, source_sha256=None, parse_seconds=None):
+    """Write the Feather copy and manifest of csv_path (a compacted frame); returns the manifest"""
+    if feather is None:
+        raise RuntimeError('pyarrow is required for the dataset cache')
+    if frame is None:
+        frame, parse_seconds = read_csv(csv_path)
+    data_path, manifest_path = cache_paths(csv_path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Written under a per-process name and renamed into place, so workers
+    # building at the same time never read a half-written file
+    suffix = f'.{os.getpid()}.tmp'
+    feather.write_feather(frame, data_path + suffix, compression='uncompressed')
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'schema_version': SCHEMA_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'source': os.path.basename(csv_path),
+        'source_sha256': source_sha256 or file_sha256(csv_path),
+        'rows': len(frame),
+        'columns': {col: str(dtype) for col, dtype in frame.dtypes.items()},
+        'csv_parse_seconds': round(parse_seconds, 4) if parse_seconds is not None else None
+    }
+    with open(manifest_path + suffix, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(data_path + suffix, data_path)
+    os.replace(manifest_path + suffix, manifest_path)
+    return manifest
+
+
+def load_dataset(csv_path, cache_dir, use_cache=True, log=print):
+    """
+    The compacted dataset at csv_path, memory-mapped from the cache when it
+    is fresh, otherwise parsed from the CSV (and cached for next time)
+    """
+    name = os.path.basename(csv_path)
+    if not use_cache or feather is None:
+        if use_cache:
+            log("pyarrow not installed, reading the dataset CSV without the cache")
+        return read_csv(csv_path)[0]
+
+    source_sha256 = file_sha256(csv_path)
+    data_path, manifest_path = cache_paths(csv_path, cache_dir)
+    if is_fresh(csv_path, cache_dir, source_sha256):
+        started = time.perf_counter()
+        frame = feather.read_table(data_path, memory_map=True).to_pandas(split_blocks=True)
+        seconds = time.perf_counter() - started
+        parse_seconds = read_manifest(manifest_path).get('csv_parse_seconds')
+        if parse_seconds is not None:
+            log(f"Loaded {name} from {data_path} in {seconds:.3f}s (CSV parse took {parse_seconds:.3f}s, saved {parse_seconds - seconds:.3f}s)")
+        else:
+            log(f"Loaded {name} from {data_path} in {seconds:.3f}s")
+        return frame
+
+    frame, parse_seconds = read_csv(csv_path)
+    try:
+        build_cache(csv_path, cache_dir, frame, source_sha256, parse_seconds)
+        log(f"Parsed {name} in {parse_seconds:.3f}s and cached it in {data_path}")
+    except (OSError, RuntimeError, ValueError) as e:
+        log(f"Could not write the dataset cache for {name}: {e}")
+    return frame
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    datasets = sys.argv[2:] or list(DEFAULT_DATASETS)
+    cache_dir = os.getenv('DATASET_CACHE_DIR', '../dataset_cache')
+
+    if command == 'build':
+        for csv_path in datasets:
+            manifest = build_cache(csv_path, cache_dir)
+            print(f"Cached {csv_path}: {manifest['rows']} rows, CSV parse {manifest['csv_parse_seconds']:.3f}s")
+            started = time.perf_counter()
+            load_dataset(csv_path, cache_dir, log=lambda message: None)
+            print(f"  memory-mapped load {time.perf_counter() - started:.3f}s")
+    elif command == 'status':
+        for csv_path in datasets:
+            manifest = read_manifest(cache_paths(csv_path, cache_dir)[1])
+            state = 'fresh' if is_fresh(csv_path, cache_dir) else ('stale' if manifest else 'missing')
+            print(f"{csv_path}: {state}" + (f" (built {manifest['created_at']}, {manifest['rows']} rows)" if manifest else ''))
+    else:
+        raise SystemExit('Usage: python dataset_cache.py [build [csv ...] | status [csv ...]]')
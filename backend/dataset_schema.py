@@ -0,0 +1,113 @@
+# In-memory schema of the reference dataset
+# read_csv leaves the label columns as strings and every number as 64-bit,
+# and each gunicorn worker holds its own copy. compact_frame() narrows that:
+#
+#   label columns (CATEGORICAL_COLUMNS)  -> category
+#   integer columns                      -> smallest int type holding their range
+#   FLOAT32 columns                      -> float32, when every value restores exactly
+#   anything else                        -> as read
+#
+# The FLOAT32 columns carry two decimals; float32 keeps them to within a
+# rounding step, so widen() restores the exact float64 values the CSV parse
+# produced. Aggregations run on widened columns and give the same results
+# as on the original frame.
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+CATEGORICAL_COLUMNS = ('project_id', 'project_location', 'tower_type', 'substation_type', 'region_risk_flag', 'season')
+FLOAT32_DECIMALS = 2
+
+# Calendar month -> season, matching the season column of the training dataset
+# (the month of each row's start_date)
+SEASON_BY_MONTH = {
+    1: 'Winter', 2: 'Winter', 3: 'Summer', 4: 'Summer', 5: 'Summer', 6: 'Summer',
+    7: 'Monsoon', 8: 'Monsoon', 9: 'Monsoon', 10: 'Winter', 11: 'Winter', 12: 'Winter'
+}
+
+
+def float32_candidate(column):
+    """Columns stored as float32: quantities in tons and the price index (two decimals)"""
+    return column == 'commodity_price_index' or (column.startswith('quantity_') and column.endswith('_tons'))
+
+
+def _restore(values):
+    return np.round(values.astype(np.float64), FLOAT32_DECIMALS)
+
+
+def compact_frame(frame, log=print):
+    """frame with the narrow dtypes above (a new frame; the argument is left as is)"""
+    columns = {}
+    for col in frame.columns:
+        values = frame[col]
+        if col in CATEGORICAL_COLUMNS:
+            values = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, downcast='integer')
+        elif float32_candidate(col) and values.dtype == np.float64:
+            narrow = values.astype(np.float32)
+            original = values.to_numpy()
+            if np.array_equal(_restore(narrow.to_numpy()), original, equal_nan=True):
+                values = narrow
+            else:
+                log(f"Keeping {col} as float64: not all values fit float32 at {FLOAT32_DECIMALS} decimals")
+        columns[col] = values
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def widen(frame, columns=None):
+    """
+    The given columns (default: all numeric) at 64 bits: float32 restored
+    exactly, narrow integers as int64
+    """
+    columns = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])] if columns is None else list(columns)
+    wide = {}
+    for col in columns:
+        values = frame[col]
+        if values.dtype == np.float32:
+            values = pd.Series(_restore(values.to_numpy()), index=frame.index, name=col)
+        elif pd.api.types.is_integer_dtype(values):
+            values = values.astype(np.int64)
+        wide[col] = values
+    return pd.DataFrame(wide, index=frame.index)
+
+
+def season_values(frame):
+    """
+    Season of every row as strings: the season column when the dataset has
+    one, else SEASON_BY_MONTH of the start_date, project_start_month or
+    timestamp month, whichever exists first; None when none do
+    """
+    if 'season' in frame.columns:
+        return frame['season'].astype(str)
+    if 'start_date' in frame.columns:
+        months = pd.to_datetime(frame['start_date'], errors='coerce').dt.month
+    elif 'project_start_month' in frame.columns:
+        months = frame['project_start_month']
+    elif 'timestamp' in frame.columns:
+        months = pd.to_datetime(frame['timestamp'], errors='coerce').dt.month
+    else:
+        return None
+    return months.map(SEASON_BY_MONTH).astype(str)
+
+
+def memory_report(frame):
+    """Bytes held by frame, and what the same data takes with read_csv's default dtypes"""
+    compact = int(frame.memory_usage(deep=True).sum())
+    default = int(frame.index.memory_usage())
+    for col in frame.columns:
+        values = frame[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(values.cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(values):
+            values = values.astype(np.int64)
+        elif values.dtype == np.float32:
+            values = values.astype(np.float64)
+        default += int(values.memory_usage(deep=True, index=False))
+    return {
+        'bytes': compact,
+        'default_dtype_bytes': default,
+        'saved_pct': round((1 - compact / default) * 100, 1) if default else 0.0
+    }
@@ -0,0 +1,106 @@
+# Compiled feature pipeline for the forecast model
+# Turns request payloads into the float32 feature matrix expected by the model
+# without going through pandas or sklearn on the request path.
+
+import numpy as np
+
+# Default feature values used when a forecast payload omits a field or sends
+# something that cannot be converted to a number
+FEATURE_DEFAULTS = {
+    'budget': 30000000.0,
+    'tax_rate': 18.0,
+    'project_size_km': 100.0,
+    'project_start_month': 1.0,
+    'project_end_month': 12.0,
+    'lead_time_days': 45.0,
+    'commodity_price_index': 105.0
+}
+
+CATEGORICAL_FIELDS = ['project_location', 'tower_type', 'substation_type', 'region_risk_flag']
+
+# Per-column handling modes
+_NUMERIC = 0
+_CATEGORICAL = 1
+
+
+class FeaturePipeline:
+    """Precompiled defaults, numeric coercion and category lookup tables"""
+
+    def __init__(self, feature_cols, label_encoders):
+        self.feature_cols = list(feature_cols)
+        self.lookups = {}
+        self.columns = []
+
+        for col in self.feature_cols:
+            if col in CATEGORICAL_FIELDS and col in label_encoders:
+                self.lookups[col] = self._build_lookup(label_encoders[col])
+                self.columns.append((col, _CATEGORICAL, self.lookups[col], FEATURE_DEFAULTS.get(col, 0.0)))
+            else:
+                self.columns.append((col, _NUMERIC, None, FEATURE_DEFAULTS.get(col, 0.0)))
+
+    @staticmethod
+    def _build_lookup(encoder):
+        """Category -> code table equivalent to encoder.transform for known classes"""
+        lookup = {}
+        for code, value in enumerate(encoder.classes_.tolist()):
+            lookup[value] = code
+            # Payloads arrive as JSON, so also accept the string form of each class
+            lookup.setdefault(str(value), code)
+        return lookup
+
+    @staticmethod
+    def _encode_category(lookup, value):
+        """Return the code for value, or 0 for unknown categories"""
+        try:
+            code = lookup.get(value)
+        except TypeError:
+            return 0
+        if code is None and not isinstance(value, str):
+            code = lookup.get(str(value))
+        if code is None and isinstance(value, str):
+            code = lookup.get(value.strip())
+        return code if code is not None else 0
+
+    def encode(self, data, out=None):
+        """
+        Encode one payload into out (or a new float32 row).
+        Returns the row and the encoded values keyed by feature column.
+        """
+        if out is None:
+            out = np.empty(len(self.feature_cols), dtype=np.float32)
+        input_used = {}
+
+        for i, (col, kind, lookup, default) in enumerate(self.columns):
+            if col not in data:
+                # Missing fields fall back to the default before encoding
+                value = default
+            else:
+                value = data[col]
+
+            if kind == _CATEGORICAL:
+                encoded = self._encode_category(lookup, value)
+            else:
+                try:
+                    encoded = float(value)
+                except (ValueError, TypeError):
+                    encoded = default
+
+            out[i] = encoded
+            input_used[col] = encoded
+
+        return out, input_used
+
+    def transform_one(self, data):
+        """Encode a single payload into a contiguous (1, n_features) matrix"""
+        row = np.empty((1, len(self.feature_cols)), dtype=np.float32)
+        _, input_used = self.encode(data, row[0])
+        return row, input_used
+
+    def transform(self, payloads):
+        """Encode many payloads into a contiguous (n_rows, n_features) matrix"""
+        matrix = np.empty((len(payloads), len(self.feature_cols)), dtype=np.float32)
+        encoded = []
+        for i, data in enumerate(payloads):
+            _, input_used = self.encode(data, matrix[i])
+            encoded.append(input_used)
+        return matrix, encoded
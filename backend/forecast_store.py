@@ -0,0 +1,634 @@
+# Storage for month-wise project forecasts
+# Two layouts are supported:
+#   array    one project_forecasts document per project with a forecasts[] array
+#            (a month upsert takes three ordered writes: ensure doc, $set, $push)
+#   monthly  one project_forecast_months document per (project_id, forecast_month)
+#            with a compound unique index, so a month upsert is one atomic write
+#
+# FORECAST_STORAGE picks the layout used for writes. While existing array
+# documents are being migrated, FORECAST_DUAL_READ merges both layouts on read
+# (monthly entries win) and converts a project on first actuals write.
+#
+# FORECAST_ENCODING=compact stores predictions/actual_values as arrays in
+# target_cols order instead of dicts keyed by the 13 quantity_* names; the
+# entry's 'schema' field names the column list in forecast_schemas. Reads
+# decode back to dicts, so either encoding can be mixed in one collection.
+#
+# Usage:
+#   python forecast_store.py migrate [batch_size]          # resumable, safe to run while the app is live
+#   python forecast_store.py migrate-legacy [batch_size]   # fold the old forecasts collection in
+#   python forecast_store.py status
+
+import hashlib
+import os
+import socket
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+LAYOUT_ARRAY = 'array'
+LAYOUT_MONTHLY = 'monthly'
+ENCODING_DICT = 'dict'
+ENCODING_COMPACT = 'compact'
+MIGRATION_ID = 'project_forecasts_to_monthly'
+LEGACY_MIGRATION_ID = 'legacy_forecasts_to_project_forecasts'
+
+# A running migration holds a lease on its checkpoint document, renewed after
+# every batch; another process takes over only once the lease has expired
+MIGRATION_LEASE_SECONDS = 300
+
+# Month entry fields copied between layouts
+ENTRY_FIELDS = (
+    'forecast_month', 'predictions', 'actual_values', 'created_at', 'updated_at',
+    'actual_values_updated_at', 'actual_values_updated_by', 'schema', 'actual_values_schema'
+)
+
+
+def sum_numeric_values(obj):
+    try:
+        return sum(float(v) for v in obj.values() if isinstance(v, (int, float)) or (isinstance(v, str) and v.strip() != ''))
+    except Exception:
+        total = 0.0
+        for v in obj.values():
+            try:
+                total += float(v)
+            except Exception:
+                continue
+        return total
+
+
+def schema_id(columns):
+    return hashlib.sha1('\n'.join(columns).encode('utf-8')).hexdigest()[:12]
+
+
+def forecast_totals(entries):
+    """
+    Total predicted and actual quantity per raw (undecoded) month entry.
+    Compact arrays of the same width are summed with NumPy in one go; dict
+    entries go through sum_numeric_values.
+    """
+    totals = np.zeros((2, len(entries)))
+    for row, field in enumerate(('predictions', 'actual_values')):
+        groups = {}
+        for i, entry in enumerate(entries):
+            values = entry.get(field)
+            if isinstance(values, list):
+                if values:
+                    groups.setdefault(len(values), []).append(i)
+            elif values:
+                totals[row, i] = sum_numeric_values(values)
+        for indexes in groups.values():
+            # None (an actual not entered) becomes NaN and counts as 0
+            matrix = np.array([entries[i][field] for i in indexes], dtype=np.float64)
+            totals[row, indexes] = np.nansum(matrix, axis=1)
+    return totals[0], totals[1]
+
+
+def values_total_expr(field):
+    """
+    Aggregation expression for the total of a stored predictions/actual_values
+    field, dict or compact array alike; like sum_numeric_values, values that
+    do not convert to a number count as 0.
+    """
+    values = {'$cond': [
+        {'$isArray': field},
+        field,
+        {'$map': {'input': {'$objectToArray': field}, 'as': 'kv', 'in': '$$kv.v'}}
+    ]}
+    return {'$sum': {'$map': {
+        'input': values,
+        'as': 'v',
+        'in': {'$convert': {'input': '$$v', 'to': 'double', 'onError': 0, 'onNull': 0}}
+    }}}
+
+
+def numeric_values(obj):
+    """{column: float} for the values of a dict that convert to a number"""
+    values = {}
+    for k, v in (obj or {}).items():
+        try:
+            values[k] = float(v)
+        except (TypeError, ValueError):
+            continue
+    return values
+
+
+class ForecastStore:
+    def __init__(self, db, layout=LAYOUT_ARRAY, dual_read=True, encoding=ENCODING_DICT, legacy_read='auto'):
+        if layout not in (LAYOUT_ARRAY, LAYOUT_MONTHLY):
+            raise ValueError(f'Unknown forecast storage layout {layout!r}')
+        if encoding not in (ENCODING_DICT, ENCODING_COMPACT):
+            raise ValueError(f'Unknown forecast encoding {encoding!r}')
+        self.layout = layout
+        self.dual_read = dual_read and layout == LAYOUT_MONTHLY
+        self.encoding = encoding
+        self.projects = db['project_forecasts']
+        self.months = db['project_forecast_months']
+        self.migrations = db['migrations']
+        self.schemas = db['forecast_schemas']
+        self.schema_columns = {}  # schema id -> columns, filled lazily
+        self.current_schema = None
+        self.legacy_read = legacy_read
+        self._legacy_pending = True
+        self._legacy_checked_at = None
+
+    # Compact encoding
+
+    def set_schema(self, columns):
+        """Register the target columns new compact entries are encoded with"""
+        columns = list(columns)
+        sid = schema_id(columns)
+        if sid not in self.schema_columns:
+            self.schemas.update_one({'_id': sid}, {'$setOnInsert': {'columns': columns}}, upsert=True)
+            self.schema_columns[sid] = columns
+        self.current_schema = sid
+        return sid
+
+    def _columns(self, sid):
+        columns = self.schema_columns.get(sid)
+        if columns is None:
+            doc = self.schemas.find_one({'_id': sid})
+            if doc is None:
+                raise KeyError(f'Unknown forecast schema {sid!r}')
+            columns = self.schema_columns[sid] = doc['columns']
+        return columns
+
+    def _encode(self, values, sid):
+        """values as an array in schema order, or None when it does not fit the schema"""
+        columns = self.schema_columns[sid]
+        if not set(values) <= set(columns):
+            return None
+        try:
+            return [None if values.get(col) is None else float(values[col]) for col in columns]
+        except (TypeError, ValueError):
+            return None
+
+    def decode_entry(self, entry):
+        """Month entry with compact arrays expanded to the dicts the API returns"""
+        sid = entry.pop('schema', None)
+        actuals_sid = entry.pop('actual_values_schema', None) or sid
+        for field, field_sid in (('predictions', sid), ('actual_values', actuals_sid)):
+            values = entry.get(field)
+            if isinstance(values, list):
+                columns = self._columns(field_sid) if values else []
+                entry[field] = {col: v for col, v in zip(columns, values) if v is not None}
+        return entry
+
+    @property
+    def reads_array(self):
+        return self.layout == LAYOUT_ARRAY or self.dual_read
+
+    # Writes
+
+    def month_write_ops(self, project_id, forecast_month, results):
+        """Write operations that upsert one month's predictions (run them in order)"""
+        now = datetime.now(timezone.utc)
+        stored = {'predictions': results, 'actual_values': {}}
+        # A rewritten month drops schema fields that no longer describe its values
+        stale = ['schema', 'actual_values_schema']
+        if self.encoding == ENCODING_COMPACT:
+            sid = self.set_schema(results.keys())
+            stored = {'predictions': self._encode(results, sid), 'actual_values': [], 'schema': sid}
+            stale = ['actual_values_schema']
+
+        if self.layout == LAYOUT_MONTHLY:
+            return [UpdateOne(
+                {'project_id': project_id, 'forecast_month': forecast_month},
+                {
+                    '$set': {**stored, 'updated_at': now},
+                    '$unset': {key: '' for key in stale},
+                    '$setOnInsert': {'created_at': now}
+                },
+                upsert=True
+            )]
+        return [
+            UpdateOne(
+                {'project_id': project_id},
+                {'$setOnInsert': {'project_id': project_id, 'forecasts': []}},
+                upsert=True
+            ),
+            UpdateOne(
+                {'project_id': project_id, 'forecasts.forecast_month': forecast_month},
+                {
+                    '$set': {**{f'forecasts.$.{key}': value for key, value in stored.items()}, 'forecasts.$.updated_at': now},
+                    '$unset': {f'forecasts.$.{key}': '' for key in stale}
+                }
+            ),
+            UpdateOne(
+                {'project_id': project_id, 'forecasts.forecast_month': {'$ne': forecast_month}},
+                {
+                    '$push': {
+                        'forecasts': {
+                            'forecast_month': forecast_month,
+                            **stored,
+                            'created_at': now,
+                            'updated_at': now
+                        }
+                    }
+                }
+            )
+        ]
+
+    def bulk_write(self, operations):
+        """Apply month_write_ops output in one ordered round trip"""
+        collection = self.months if self.layout == LAYOUT_MONTHLY else self.projects
+        return collection.bulk_write(operations, ordered=True)
+
+    def save_month(self, project_id, forecast_month, results):
+        return self.bulk_write(self.month_write_ops(project_id, forecast_month, results))
+
+    def _actual_values_fields(self, actual_values, username):
+        now = datetime.now(timezone.utc)
+        fields = {
+            'actual_values': actual_values,
+            'updated_at': now,
+            'actual_values_updated_at': now,
+            'actual_values_updated_by': username
+        }
+        if self.encoding == ENCODING_COMPACT and self.current_schema and isinstance(actual_values, dict):
+            encoded = self._encode(actual_values, self.current_schema)
+            if encoded is not None:
+                fields['actual_values'] = encoded if actual_values else []
+                fields['actual_values_schema'] = self.current_schema
+        return fields
+
+    def actual_values_write_op(self, project_id, forecast_month, actual_values, username):
+        """Update that replaces the actuals of an existing month (no upsert)"""
+        fields = self._actual_values_fields(actual_values, username)
+        # Actuals stored as a dict carry no schema of their own
+        stale = [] if 'actual_values_schema' in fields else ['actual_values_schema']
+        if self.layout == LAYOUT_MONTHLY:
+            update = {'$set': fields}
+            if stale:
+                update['$unset'] = {key: '' for key in stale}
+            return UpdateOne({'project_id': project_id, 'forecast_month': forecast_month}, update)
+        # Matching on the month too makes matched_count report whether it exists
+        update = {'$set': {f'forecasts.$[m].{key}': value for key, value in fields.items()}}
+        if stale:
+            update['$unset'] = {f'forecasts.$[m].{key}': '' for key in stale}
+        return UpdateOne(
+            {'project_id': project_id, 'forecasts.forecast_month': forecast_month},
+            update,
+            array_filters=[{'m.forecast_month': forecast_month}]
+        )
+
+    def set_actual_values(self, project_id, forecast_month, actual_values, username):
+        """Store actuals on an existing month; returns False when the month does not exist"""
+        op = self.actual_values_write_op(project_id, forecast_month, actual_values, username)
+        result = self.bulk_write([op])
+        if result.matched_count == 0 and self.dual_read and self.migrate_project(project_id):
+            result = self.bulk_write([op])
+        return result.matched_count > 0
+
+    def existing_months(self, project_ids):
+        """(project_id, forecast_month) -> layout holding it, for every stored month of the projects"""
+        found = {}
+        if self.reads_array:
+            for doc in self.projects.find({'project_id': {'$in': list(project_ids)}}, {'_id': 0, 'project_id': 1, 'forecasts.forecast_month': 1}):
+                for entry in doc.get('forecasts', []):
+                    found[(doc['project_id'], entry.get('forecast_month'))] = LAYOUT_ARRAY
+        if self.layout == LAYOUT_MONTHLY:
+            for doc in self.months.find({'project_id': {'$in': list(project_ids)}}, {'_id': 0, 'project_id': 1, 'forecast_month': 1}):
+                found[(doc['project_id'], doc['forecast_month'])] = LAYOUT_MONTHLY
+        return found
+
+    # Reads
+
+    def _array_entries(self, query):
+        for doc in self.projects.find(query, {'_id': 0}):
+            for entry in doc.get('forecasts', []):
+                yield doc['project_id'], entry
+
+    def _monthly_entries(self, query):
+        for doc in self.months.find(query, {'_id': 0}):
+            yield doc.pop('project_id'), doc
+
+    def _entries(self, project_query):
+        """(project_id, entry) pairs from the active layout(s), monthly entries taking precedence"""
+        seen = set()
+        if self.layout == LAYOUT_MONTHLY:
+            for project_id, entry in self._monthly_entries(project_query):
+                seen.add((project_id, entry.get('forecast_month')))
+                yield project_id, entry
+        if self.reads_array:
+            for project_id, entry in self._array_entries(project_query):
+                if (project_id, entry.get('forecast_month')) not in seen:
+                    yield project_id, entry
+
+    def _array_month(self, project_id, forecast_month):
+        # $elemMatch projection: only the requested month leaves the server
+        doc = self.projects.find_one(
+            {'project_id': project_id, 'forecasts.forecast_month': forecast_month},
+            {'_id': 0, 'forecasts': {'$elemMatch': {'forecast_month': forecast_month}}}
+        )
+        return doc['forecasts'][0] if doc and doc.get('forecasts') else None
+
+    def _array_latest_month(self, project_id):
+        # $max over the months that have predictions, computed server-side
+        result = list(self.projects.aggregate([
+            {'$match': {'project_id': project_id}},
+            {'$project': {
+                '_id': 0,
+                'months': {'$filter': {
+                    'input': {'$ifNull': ['$forecasts', []]},
+                    'as': 'f',
+                    'cond': {'$ne': [{'$ifNull': ['$$f.predictions', {}]}, {}]}
+                }}
+            }},
+            {'$project': {'latest': {'$max': '$months.forecast_month'}}}
+        ]))
+        return result[0].get('latest') if result else None
+
+    def get_month(self, project_id, forecast_month):
+        """One month entry for a project, or None"""
+        entry = None
+        if self.layout == LAYOUT_MONTHLY:
+            entry = self.months.find_one({'project_id': project_id, 'forecast_month': forecast_month}, {'_id': 0, 'project_id': 0})
+        if entry is None and self.reads_array:
+            entry = self._array_month(project_id, forecast_month)
+        return self.decode_entry(entry) if entry is not None else None
+
+    def project_months(self, project_id):
+        """Every month entry stored for a project"""
+        return [self.decode_entry(entry) for _, entry in self._entries({'project_id': project_id})]
+
+    def entry_lookup_stages(self):
+        """
+        Aggregation stages that turn documents carrying a project_id into that
+        project's raw month entries, monthly entries winning as in _entries().
+        """
+        stages = []
+        sources = []
+        if self.layout == LAYOUT_MONTHLY:
+            stages.append({'$lookup': {'from': self.months.name, 'localField': 'project_id', 'foreignField': 'project_id', 'as': '_months'}})
+            sources.append('$_months')
+        if self.reads_array:
+            # project_id is unique in project_forecasts: at most one document per project
+            stages.append({'$lookup': {'from': self.projects.name, 'localField': 'project_id', 'foreignField': 'project_id', 'as': '_stored'}})
+            stages.append({'$unwind': {'path': '$_stored', 'preserveNullAndEmptyArrays': True}})
+            array_entries = {'$ifNull': ['$_stored.forecasts', []]}
+            if sources:
+                array_entries = {'$filter': {
+                    'input': array_entries,
+                    'as': 'f',
+                    'cond': {'$not': {'$in': ['$$f.forecast_month', '$_months.forecast_month']}}
+                }}
+            sources.append(array_entries)
+        return stages + [
+            {'$project': {'_entries': {'$concatArrays': sources}}},
+            {'$unwind': '$_entries'},
+            {'$replaceRoot': {'newRoot': '$_entries'}}
+        ]
+
+    def column_value_expr(self, field, column):
+        """
+        Aggregation expression for one column of a stored predictions or
+        actual_values field: a key lookup for dict entries, a position in the
+        entry's schema for compact ones. Missing values count as 0.
+        """
+        schema = '$schema' if field == 'predictions' else {'$ifNull': ['$actual_values_schema', '$schema']}
+        branches = []
+        for doc in self.schemas.find({}, {'columns': 1}):
+            self.schema_columns[doc['_id']] = doc['columns']
+            if column in doc['columns']:
+                branches.append({
+                    'case': {'$eq': [schema, doc['_id']]},
+                    'then': {'$arrayElemAt': [f'${field}', doc['columns'].index(column)]}
+                })
+        compact = {'$switch': {'branches': branches, 'default': None}} if branches else None
+        value = {'$cond': [{'$isArray': f'${field}'}, compact, f'${field}.{column}']}
+        return {'$convert': {'input': value, 'to': 'double', 'onError': 0, 'onNull': 0}}
+
+    def all_entries(self):
+        """(project_id, raw entry) for every stored month, monthly entries taking precedence"""
+        return self._entries({})
+
+    def latest_month(self, project_id):
+        """Latest forecast_month (YYYY-MM) that has predictions, or None"""
+        months = []
+        if self.layout == LAYOUT_MONTHLY:
+            latest = self.months.find_one(
+                {'project_id': project_id, 'predictions': {'$nin': [None, {}, []]}},
+                {'_id': 0, 'forecast_month': 1},
+                sort=[('forecast_month', -1)]
+            )
+            if latest:
+                months.append(latest['forecast_month'])
+        if self.reads_array:
+            months.append(self._array_latest_month(project_id))
+        months = [m for m in months if m]
+        return max(months) if months else None
+
+    # Migration from the array layout
+
+    def _migration_ops(self, doc):
+        ops = []
+        for entry in doc.get('forecasts', []):
+            if not entry.get('forecast_month'):
+                continue
+            fields = {key: entry[key] for key in ENTRY_FIELDS if key in entry and key != 'forecast_month'}
+            # $setOnInsert: months written by the app since the switch are newer, keep them
+            ops.append(UpdateOne(
+                {'project_id': doc['project_id'], 'forecast_month': entry['forecast_month']},
+                {'$setOnInsert': fields},
+                upsert=True
+            ))
+        return ops
+
+    def migrate_project(self, project_id):
+        """Copy one project's array entries to the monthly layout; True if it had any"""
+        doc = self.projects.find_one({'project_id': project_id}, {'_id': 0})
+        ops = self._migration_ops(doc) if doc else []
+        if ops:
+            self.months.bulk_write(ops, ordered=False)
+        return bool(ops)
+
+    def _acquire_migration_lease(self, migration_id, owner):
+        """Take the migration's lease unless another run holds a live one"""
+        now = datetime.now(timezone.utc)
+        try:
+            self.migrations.update_one(
+                {'_id': migration_id, '$or': [{'lease_until': None}, {'lease_until': {'$lt': now}}]},
+                {'$set': {'lease_owner': owner, 'lease_until': now + timedelta(seconds=MIGRATION_LEASE_SECONDS)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The checkpoint exists and its lease belongs to someone else
+            return False
+        return True
+
+    def _release_migration_lease(self, migration_id, owner, fields=None):
+        update = {'$unset': {'lease_owner': '', 'lease_until': ''}}
+        if fields:
+            update['$set'] = fields
+        self.migrations.update_one({'_id': migration_id, 'lease_owner': owner}, update)
+
+    def _run_migration(self, migration_id, source, query, convert, write, batch_size, log):
+        """
+        Convert source documents matching query in _id order, batch_size at a
+        time, saving a checkpoint after each batch so an interrupted run resumes
+        where it stopped. Returns None when another run holds the migration.
+        """
+        owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        if not self._acquire_migration_lease(migration_id, owner):
+            log(f"{migration_id}: already running in another process")
+            return None
+        state = self.migrations.find_one({'_id': migration_id}) or {}
+        last_id = state.get('last_id')
+        documents = state.get('documents', 0)
+        write_ops = state.get('write_ops', 0)
+
+        try:
+            while True:
+                batch_query = {**query, '_id': {'$gt': last_id}} if last_id is not None else query
+                batch = list(source.find(batch_query).sort('_id', 1).limit(batch_size))
+                if not batch:
+                    break
+                ops = []
+                for doc in batch:
+                    ops.extend(convert(doc))
+                if ops:
+                    write(ops)
+                last_id = batch[-1]['_id']
+                documents += len(batch)
+                write_ops += len(ops)
+                now = datetime.now(timezone.utc)
+                saved = self.migrations.update_one(
+                    {'_id': migration_id, 'lease_owner': owner},
+                    {'$set': {
+                        'last_id': last_id, 'documents': documents, 'write_ops': write_ops, 'updated_at': now,
+                        'lease_until': now + timedelta(seconds=MIGRATION_LEASE_SECONDS)
+                    }}
+                )
+                if not saved.matched_count:
+                    log(f"{migration_id}: lease lost to another process, stopping")
+                    return None
+                log(f"{migration_id}: {documents} documents ({write_ops} write ops)")
+        except Exception:
+            # The next run resumes from the last checkpoint without waiting for the lease to expire
+            self._release_migration_lease(migration_id, owner)
+            raise
+
+        self._release_migration_lease(migration_id, owner, {'completed_at': datetime.now(timezone.utc)})
+        return {'documents': documents, 'write_ops': write_ops}
+
+    def migrate(self, batch_size=200, log=print):
+        """Copy every array-layout project document to the monthly layout"""
+        return self._run_migration(
+            MIGRATION_ID, self.projects, {}, self._migration_ops,
+            lambda ops: self.months.bulk_write(ops, ordered=False), batch_size, log
+        )
+
+    def migration_status(self):
+        out = {}
+        for migration_id in (MIGRATION_ID, LEGACY_MIGRATION_ID):
+            out[migration_id] = self.migrations.find_one({'_id': migration_id}, {'_id': 0, 'last_id': 0})
+        out['array_documents'] = self.projects.estimated_document_count()
+        out['monthly_documents'] = self.months.estimated_document_count()
+        return out
+
+    # Legacy per-forecast documents (the old forecasts collection)
+
+    def insert_month_ops(self, project_id, entry):
+        """Ops that add a month in the active layout only if the project does not have it yet"""
+        month = entry['forecast_month']
+        fields = {key: entry[key] for key in ENTRY_FIELDS if key in entry and key != 'forecast_month'}
+        fields.setdefault('actual_values', {})
+        predictions = fields.get('predictions')
+        if self.encoding == ENCODING_COMPACT and isinstance(predictions, dict) and 'schema' not in fields:
+            sid = self.set_schema(predictions.keys())
+            encoded = self._encode(predictions, sid)
+            actuals = self._encode(fields['actual_values'], sid) if isinstance(fields['actual_values'], dict) else None
+            if encoded is not None and actuals is not None:
+                fields.update(predictions=encoded, actual_values=actuals if fields['actual_values'] else [], schema=sid)
+
+        if self.layout == LAYOUT_MONTHLY:
+            return [UpdateOne({'project_id': project_id, 'forecast_month': month}, {'$setOnInsert': fields}, upsert=True)]
+        return [
+            UpdateOne(
+                {'project_id': project_id},
+                {'$setOnInsert': {'project_id': project_id, 'forecasts': []}},
+                upsert=True
+            ),
+            UpdateOne(
+                {'project_id': project_id, 'forecasts.forecast_month': {'$ne': month}},
+                {'$push': {'forecasts': {'forecast_month': month, **fields}}}
+            )
+        ]
+
+    def _legacy_ops(self, doc):
+        if not doc.get('project_id') or not doc.get('forecast_month') or not doc.get('predictions'):
+            return []
+        return self.insert_month_ops(doc['project_id'], doc)
+
+    def migrate_legacy(self, legacy_collection, batch_size=500, log=print):
+        """
+        Fold legacy forecasts documents into the consolidated storage. Months
+        the project already has are left alone, so re-runs are harmless.
+        Returns None when another process is running the migration.
+        """
+        totals = self._run_migration(
+            LEGACY_MIGRATION_ID, legacy_collection,
+            {'forecast_month': {'$exists': True}, 'predictions': {'$exists': True}},
+            self._legacy_ops, self.bulk_write, batch_size, log
+        )
+        self._legacy_checked_at = None
+        return totals
+
+    def legacy_read_enabled(self):
+        """
+        Whether reads still fall back to the legacy forecasts collection:
+        LEGACY_FORECASTS_READ=true/false, or auto (the default) to stop once
+        the legacy migration has completed. Rechecked at most once a minute.
+        """
+        if self.legacy_read != 'auto':
+            return self.legacy_read == 'true'
+        now = time.monotonic()
+        if self._legacy_checked_at is None or now - self._legacy_checked_at > 60:
+            state = self.migrations.find_one({'_id': LEGACY_MIGRATION_ID}, {'completed_at': 1})
+            self._legacy_pending = not (state and state.get('completed_at'))
+            self._legacy_checked_at = now
+        return self._legacy_pending
+
+
+def store_from_env(db):
+    return ForecastStore(
+        db,
+        layout=os.getenv('FORECAST_STORAGE', LAYOUT_ARRAY).lower(),
+        dual_read=os.getenv('FORECAST_DUAL_READ', 'true').lower() == 'true',
+        encoding=os.getenv('FORECAST_ENCODING', ENCODING_DICT).lower(),
+        legacy_read=os.getenv('LEGACY_FORECASTS_READ', 'auto').lower()
+    )
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017/PLANGRID_DATA'), serverSelectionTimeoutMS=5000)
+    db = client[os.getenv('MONGO_DB', 'material_forecast')]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    if command == 'migrate':
+        store = ForecastStore(db, layout=LAYOUT_MONTHLY, encoding=os.getenv('FORECAST_ENCODING', ENCODING_DICT).lower())
+        store.months.create_index([('project_id', 1), ('forecast_month', 1)], unique=True)
+        totals = store.migrate(batch_size=batch_size or 200)
+        if totals:
+            print(f"Migration complete: {totals['documents']} projects, {totals['write_ops']} months")
+    elif command == 'migrate-legacy':
+        # Writes with the layout/encoding the app is configured for
+        store = store_from_env(db)
+        totals = store.migrate_legacy(db['forecasts'], batch_size=batch_size or 500)
+        if totals:
+            print(f"Legacy migration complete: {totals['documents']} forecasts, {totals['write_ops']} write ops")
+    elif command == 'status':
+        print(store_from_env(db).migration_status())
+    else:
+        raise SystemExit('Usage: python forecast_store.py [migrate [batch_size] | migrate-legacy [batch_size] | status]')
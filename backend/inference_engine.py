@@ -0,0 +1,98 @@
+# Native multi-target inference for the forecast model
+# The trained model is a sklearn MultiOutputRegressor wrapping one XGBRegressor
+# per target column. Its predict() goes through the sklearn and XGBoost Python
+# wrappers once per target, converting the input every time; this engine
+# builds one DMatrix per request and runs every native booster over it, which
+# produces the same values with a single input conversion.
+#
+# Benchmark against the wrapped model:
+#   python inference_engine.py
+
+import os
+import time
+
+import numpy as np
+import xgboost as xgb
+
+
+class InferenceEngine:
+    def __init__(self, model, nthread=None):
+        self.model = model
+        self.nthread = nthread or -1
+        self.boosters = None
+        self.iteration_ranges = None
+
+        estimators = getattr(model, 'estimators_', None)
+        if getattr(model, 'boosters', None) is not None:
+            # Already native (compiled_model.CompiledModel)
+            self.boosters = list(model.boosters)
+            self.iteration_ranges = list(model.iteration_ranges)
+        elif estimators and all(hasattr(est, 'get_booster') for est in estimators):
+            self.boosters = [est.get_booster() for est in estimators]
+            self.iteration_ranges = [self._iteration_range(est) for est in estimators]
+
+        if self.boosters and nthread:
+            for booster in self.boosters:
+                booster.set_param({'nthread': nthread})
+
+    @staticmethod
+    def _iteration_range(estimator):
+        """Match XGBRegressor.predict, which stops at best_iteration after early stopping"""
+        try:
+            best_iteration = estimator.best_iteration
+        except AttributeError:
+            return (0, 0)
+        return (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+
+    @property
+    def native(self):
+        return self.boosters is not None
+
+    @property
+    def n_features(self):
+        """Input width the model was trained on, or None when the model does not say"""
+        if self.native:
+            return self.boosters[0].num_features()
+        return getattr(self.model, 'n_features_in_', None)
+
+    def predict(self, matrix):
+        """Predict all targets for a (n_rows, n_features) matrix, in target_cols order"""
+        if not self.native:
+            return self.model.predict(matrix)
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        dmatrix = xgb.DMatrix(matrix, nthread=self.nthread)
+        out = np.empty((matrix.shape[0], len(self.boosters)), dtype=np.float32)
+        for i, (booster, iteration_range) in enumerate(zip(self.boosters, self.iteration_ranges)):
+            out[:, i] = booster.predict(dmatrix, iteration_range=iteration_range, validate_features=False)
+        return out
+
+
+def _time_per_call(fn, matrix, min_seconds=0.5):
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(matrix)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+if __name__ == '__main__':
+    import joblib
+
+    model = joblib.load('../multi_xgb_model.joblib')
+    feature_cols = joblib.load('../feature_cols1.joblib')
+    engine = InferenceEngine(model, nthread=int(os.getenv('INFERENCE_THREADS', '0')) or None)
+    if not engine.native:
+        raise SystemExit('Model is not a MultiOutputRegressor of XGBoost estimators')
+
+    rng = np.random.default_rng(42)
+    print(f"{'batch':>8} {'sklearn ms':>12} {'engine ms':>12} {'speedup':>8}  identical")
+    for batch_size in (1, 100, 10000):
+        matrix = (rng.random((batch_size, len(feature_cols))) * 100).astype(np.float32)
+        identical = np.array_equal(model.predict(matrix), engine.predict(matrix))
+        wrapped = _time_per_call(model.predict, matrix)
+        native = _time_per_call(engine.predict, matrix)
+        print(f"{batch_size:>8} {wrapped * 1000:>12.3f} {native * 1000:>12.3f} {wrapped / native:>7.1f}x  {identical}")
@@ -0,0 +1,195 @@
+# Versioned model registry
+# Each version is a directory holding the four forecast artifacts plus a
+# manifest with their SHA-256 checksums; CURRENT names the active version.
+#
+#   model_registry/
+#     CURRENT
+#     2025-10-01/manifest.json
+#     2025-10-01/multi_xgb_model.joblib, feature_cols1.joblib, ...
+#
+# Usage:
+#   python model_registry.py list
+#   python model_registry.py publish <version>    # snapshot the artifacts in ../
+#   python model_registry.py activate <version>   # workers hot-swap on their next poll
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from feature_pipeline import FeaturePipeline
+from inference_engine import InferenceEngine
+
+# Artifact role -> file name, shared by the registry and the legacy ../ layout
+ARTIFACT_FILES = {
+    'model': 'multi_xgb_model.joblib',
+    'feature_cols': 'feature_cols1.joblib',
+    'target_cols': 'target_cols1.joblib',
+    'label_encoders': 'label_encoders.joblib'
+}
+
+LEGACY_ARTIFACT_DIR = '..'
+
+
+class RegistryError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def legacy_artifact_paths():
+    return {role: os.path.join(LEGACY_ARTIFACT_DIR, name) for role, name in ARTIFACT_FILES.items()}
+
+
+def artifact_checksums(paths):
+    """role -> SHA-256 of each artifact file"""
+    return {role: file_sha256(path) for role, path in paths.items()}
+
+
+def checksum_fingerprint(checksums):
+    """Model fingerprint over the per-artifact checksums (role -> SHA-256)"""
+    digest = hashlib.sha256()
+    for role in ARTIFACT_FILES:
+        digest.update(f"{role}:{checksums[role]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """Everything forecast() needs from one model version, swapped as a unit"""
+
+    def __init__(self, model, feature_cols, target_cols, label_encoders, version, registry_version=None, nthread=None):
+        self.model = model
+        self.feature_cols = feature_cols
+        self.target_cols = target_cols
+        self.label_encoders = label_encoders
+        self.version = version
+        self.registry_version = registry_version
+        self.pipeline = FeaturePipeline(feature_cols, label_encoders)
+        self.engine = InferenceEngine(model, nthread=nthread)
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def canary(self):
+        """Predict the default row and check the output is usable"""
+        row, _ = self.pipeline.transform_one({})
+        predictions = np.asarray(self.engine.predict(row))
+        if predictions.shape != (1, len(self.target_cols)):
+            raise RegistryError(f'Canary prediction has shape {predictions.shape}, expected (1, {len(self.target_cols)})')
+        if not np.all(np.isfinite(predictions)):
+            raise RegistryError('Canary prediction contains non-finite values')
+        return predictions
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+
+    def _version_dir(self, version):
+        if not version or os.path.basename(version) != version or version.startswith('.'):
+            raise RegistryError(f'Invalid version name {version!r}')
+        return os.path.join(self.root, version)
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def manifest(self, version):
+        try:
+            with open(os.path.join(self._version_dir(version), 'manifest.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise RegistryError(f'Unknown model version {version!r}')
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            if os.path.isfile(os.path.join(self.root, name, 'manifest.json')):
+                out.append(self.manifest(name))
+        return out
+
+    def verify(self, version):
+        """Check every artifact against the manifest; returns role -> path"""
+        manifest = self.manifest(version)
+        paths = {}
+        for role in ARTIFACT_FILES:
+            entry = manifest.get('files', {}).get(role)
+            if not entry:
+                raise RegistryError(f'Version {version!r} is missing the {role} artifact')
+            path = os.path.join(self._version_dir(version), entry['path'])
+            if not os.path.isfile(path) or file_sha256(path) != entry['sha256']:
+                raise RegistryError(f'Checksum mismatch for {role} in version {version!r}')
+            paths[role] = path
+        return paths
+
+    def checksums(self, version):
+        """role -> SHA-256 recorded in the manifest (what verify() checks the files against)"""
+        files = self.manifest(version)['files']
+        return {role: files[role]['sha256'] for role in ARTIFACT_FILES}
+
+    def fingerprint(self, version):
+        """Model fingerprint derived from the manifest checksums"""
+        return checksum_fingerprint(self.checksums(version))
+
+    def publish(self, version, source_paths):
+        """Copy a set of artifacts into a new version directory with a manifest"""
+        version_dir = self._version_dir(version)
+        if os.path.exists(version_dir):
+            raise RegistryError(f'Version {version!r} already exists')
+        os.makedirs(version_dir)
+        files = {}
+        for role, name in ARTIFACT_FILES.items():
+            shutil.copy2(source_paths[role], os.path.join(version_dir, name))
+            files[role] = {'path': name, 'sha256': file_sha256(os.path.join(version_dir, name))}
+        manifest = {
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'files': files
+        }
+        with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def activate(self, version):
+        """Point CURRENT at a verified version (atomic rename)"""
+        self.verify(version)
+        tmp_path = os.path.join(self.root, f'.CURRENT.{os.getpid()}')
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, 'CURRENT'))
+
+
+if __name__ == '__main__':
+    registry = ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', '../model_registry'))
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+
+    try:
+        if command == 'list':
+            current = registry.current_version()
+            for manifest in registry.versions():
+                marker = '*' if manifest['version'] == current else ' '
+                print(f"{marker} {manifest['version']}  {manifest['created_at']}")
+        elif command == 'publish' and len(sys.argv) == 3:
+            os.makedirs(registry.root, exist_ok=True)
+            registry.publish(sys.argv[2], legacy_artifact_paths())
+            print(f"Published version {sys.argv[2]} to {registry.root}")
+        elif command == 'activate' and len(sys.argv) == 3:
+            registry.activate(sys.argv[2])
+            print(f"Activated version {sys.argv[2]}")
+        else:
+            raise SystemExit('Usage: python model_registry.py [list | publish <version> | activate <version>]')
+    except RegistryError as e:
+        raise SystemExit(f'Error: {e}')
@@ -0,0 +1,307 @@
+# Shared model server for forecast predictions
+# Owns the forecast model in one process and serves predictions to the Flask
+# workers over a Unix socket, coalescing concurrent requests into one
+# model.predict call (micro-batching).
+#
+# Start it next to gunicorn and point the workers at it:
+#   python model_server.py
+#   MODEL_SERVER_SOCKET=/tmp/plangrid-model.sock gunicorn app:app
+
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import joblib
+import numpy as np
+from dotenv import load_dotenv
+
+from compiled_model import COMPILED_DIR_NAME, is_fresh, load_compiled
+from inference_engine import InferenceEngine
+from model_registry import ModelRegistry, artifact_checksums, checksum_fingerprint, legacy_artifact_paths
+
+load_dotenv()
+
+DEFAULT_SOCKET_PATH = '/tmp/plangrid-model.sock'
+
+# Frame header: op, rows, cols (requests) / status, rows, cols (responses)
+_HEADER = struct.Struct('!BII')
+OP_PREDICT = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError('Model server connection closed')
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _send_error(sock, message):
+    payload = message.encode('utf-8')
+    sock.sendall(_HEADER.pack(STATUS_ERROR, len(payload), 0) + payload)
+
+
+class _PendingPrediction:
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects prediction requests for a short window and predicts them together"""
+
+    def __init__(self, predict_fn, window_ms=3.0, max_rows=4096):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, matrix):
+        request = _PendingPrediction(matrix)
+        self.pending.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        rows = batch[0].matrix.shape[0]
+        deadline = time.monotonic() + self.window
+        while rows < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += request.matrix.shape[0]
+        return batch, rows
+
+    def _predict(self, batch):
+        try:
+            matrix = batch[0].matrix if len(batch) == 1 else np.vstack([r.matrix for r in batch])
+            predictions = np.asarray(self.predict_fn(matrix), dtype=np.float64)
+            offset = 0
+            for request in batch:
+                n = request.matrix.shape[0]
+                request.result = predictions[offset:offset + n]
+                offset += n
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            for request in batch:
+                request.done.set()
+
+    def _run(self):
+        while True:
+            batch, rows = self._collect()
+            # Matrices of different widths cannot be stacked; each width is
+            # predicted on its own so a malformed request only fails itself
+            by_width = {}
+            for request in batch:
+                by_width.setdefault(request.matrix.shape[1], []).append(request)
+            for group in by_width.values():
+                self._predict(group)
+
+            with self.lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.rows += rows
+
+    def stats(self):
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'rows': self.rows,
+                'avg_requests_per_batch': round(self.requests / self.batches, 2) if self.batches else 0.0
+            }
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # A full backlog refuses Unix socket connects outright (EAGAIN) rather
+    # than queueing them, so leave room for every worker thread reconnecting at once
+    request_queue_size = int(os.getenv('MODEL_SERVER_BACKLOG', '128'))
+
+    def __init__(self, socket_path, model_path, model_sha256, model_version, window_ms=3.0, max_rows=4096):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("Model server loading model...")
+        started = time.perf_counter()
+        compiled_dir = os.path.join(os.path.dirname(model_path), COMPILED_DIR_NAME)
+        # Only the boosters are used here, so only the model file has to match
+        if is_fresh(compiled_dir, {'model': model_sha256}):
+            self.model = load_compiled(compiled_dir)[0]
+        else:
+            self.model = joblib.load(model_path)
+        self.model_version = model_version
+        self.engine = InferenceEngine(self.model, nthread=int(os.getenv('INFERENCE_THREADS', '0')) or None)
+        self.n_features = self.engine.n_features
+        self.batcher = MicroBatcher(self.engine.predict, window_ms=window_ms, max_rows=max_rows)
+        print(f"Model server loaded model {self.model_version[:12]} in {time.perf_counter() - started:.2f}s")
+        super().__init__(socket_path, _ModelRequestHandler)
+
+    def info(self):
+        return {
+            'model_version': self.model_version,
+            'pid': os.getpid(),
+            'batching': self.batcher.stats()
+        }
+
+
+class _ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                op, rows, cols = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+            except ConnectionError:
+                return
+
+            try:
+                if op == OP_PREDICT:
+                    matrix = np.frombuffer(_recv_exact(sock, rows * cols * 4), dtype=np.float32).reshape(rows, cols)
+                    n_features = self.server.n_features
+                    if n_features is not None and cols != n_features:
+                        _send_error(sock, f'Expected {n_features} feature columns, got {cols}')
+                        continue
+                    predictions = np.ascontiguousarray(self.server.batcher.submit(matrix), dtype=np.float64)
+                    out_rows, out_cols = predictions.shape
+                    sock.sendall(_HEADER.pack(STATUS_OK, out_rows, out_cols) + predictions.tobytes())
+                elif op == OP_INFO:
+                    payload = json.dumps(self.server.info()).encode('utf-8')
+                    sock.sendall(_HEADER.pack(STATUS_OK, len(payload), 0) + payload)
+                else:
+                    _send_error(sock, f'Unknown op {op}')
+            except ConnectionError:
+                return
+            except Exception as e:
+                print(f"Model server request failed: {e}")
+                _send_error(sock, str(e))
+
+
+class ModelServerError(Exception):
+    pass
+
+
+class ModelServerClient:
+    """Drop-in stand-in for the model: predict() runs on the shared model server"""
+
+    def __init__(self, socket_path, timeout=10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connect(self):
+        # EAGAIN means the server's backlog is full for the moment; back off
+        # and retry until the timeout instead of failing the prediction
+        deadline = time.monotonic() + self.timeout
+        delay = 0.005
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+                return sock
+            except BlockingIOError:
+                sock.close()
+                if time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.25)
+
+    def _drop_connection(self, sock):
+        if sock is not None:
+            sock.close()
+        self.local.sock = None
+
+    def _request(self, frame):
+        # One connection per thread. Reconnect and resend once only when the
+        # frame cannot have reached the server (connect failed, or a stale
+        # connection broke on send, e.g. after a server restart). Once it is
+        # sent, a timeout or dropped reply is raised rather than resent, so an
+        # overloaded server is not handed the same batch twice.
+        for attempt in range(2):
+            sock = getattr(self.local, 'sock', None)
+            try:
+                if sock is None:
+                    sock = self.local.sock = self._connect()
+                sock.sendall(frame)
+                break
+            except socket.timeout:
+                self._drop_connection(sock)
+                raise
+            except OSError:
+                self._drop_connection(sock)
+                if attempt == 1:
+                    raise
+
+        try:
+            status, rows, cols = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+            if status != STATUS_OK:
+                raise ModelServerError(_recv_exact(sock, rows).decode('utf-8'))
+            body_size = rows * cols * 8 if cols else rows
+            return rows, cols, _recv_exact(sock, body_size)
+        except OSError:
+            self._drop_connection(sock)
+            raise
+
+    def predict(self, matrix):
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        rows, cols = matrix.shape
+        out_rows, out_cols, body = self._request(_HEADER.pack(OP_PREDICT, rows, cols) + matrix.tobytes())
+        return np.frombuffer(body, dtype=np.float64).reshape(out_rows, out_cols)
+
+    def info(self):
+        _, _, body = self._request(_HEADER.pack(OP_INFO, 0, 0))
+        return json.loads(body.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    socket_path = os.getenv('MODEL_SERVER_SOCKET', DEFAULT_SOCKET_PATH)
+    # Serve the registry's active version when there is one, else ../*.joblib
+    registry = ModelRegistry(os.getenv('MODEL_REGISTRY_DIR', '../model_registry'))
+    registry_version = registry.current_version()
+    if registry_version:
+        artifact_paths = registry.verify(registry_version)
+        checksums = registry.checksums(registry_version)
+    else:
+        artifact_paths = legacy_artifact_paths()
+        checksums = artifact_checksums(artifact_paths)
+    server = ModelServer(
+        socket_path,
+        model_path=artifact_paths['model'],
+        model_sha256=checksums['model'],
+        model_version=checksum_fingerprint(checksums),
+        window_ms=float(os.getenv('MODEL_SERVER_BATCH_WINDOW_MS', '3')),
+        max_rows=int(os.getenv('MODEL_SERVER_MAX_BATCH_ROWS', '4096'))
+    )
+    print(f"Model server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,117 @@
+# In-process LRU + TTL cache for model predictions
+# Keyed on the encoded feature row plus a fingerprint of the loaded model
+# artifacts, so a swapped model never serves stale predictions.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self.entries = OrderedDict()  # key -> (expires_at, prediction row)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def set_model_version(self, model_version):
+        """Record the active model fingerprint, dropping entries from any other model"""
+        with self.lock:
+            if model_version != self.model_version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.model_version = model_version
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def make_key(self, row, model_version=None):
+        """Hash of the encoded float32 feature row and the model version"""
+        row = np.ascontiguousarray(row, dtype=np.float32)
+        version = model_version if model_version is not None else self.model_version
+        return f"{version}:{hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()}"
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def predict(self, predict_fn, matrix, model_version=None):
+        """
+        Predict a feature matrix, serving rows from the cache where possible.
+        Rows that miss are predicted together with one predict_fn call.
+        model_version names the model behind predict_fn; requests still running
+        on a model that has since been swapped out bypass the cache.
+        """
+        if model_version is None:
+            model_version = self.model_version
+        if not self.enabled or model_version != self.model_version:
+            return predict_fn(matrix)
+
+        keys = [self.make_key(row, model_version) for row in matrix]
+        cached = [self.get(key) for key in keys]
+        missing = [i for i, value in enumerate(cached) if value is None]
+
+        if missing:
+            fresh = np.asarray(predict_fn(matrix[missing]))
+            for j, i in enumerate(missing):
+                cached[i] = fresh[j].copy()
+                # Skip storing rows computed by a model that was swapped mid-call
+                if model_version == self.model_version:
+                    self.put(keys[i], cached[i])
+
+        return np.vstack(cached)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'model_version': self.model_version[:12] if self.model_version else None,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,130 @@
+# Readiness tracking for lazily loaded resources (ML models, dataset)
+# Guarantees a single loader per resource, lets request handlers wait a bounded
+# time for a load in progress, and records per-phase load timings.
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _Resource:
+    def __init__(self, name):
+        self.name = name
+        self.load_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.done = threading.Event()  # set whenever no load is in progress
+        self.done.set()
+        self.loaded = False
+        self.loading = False
+        self.error = None
+        self.attempts = 0
+        self.last_failure = None
+        self.load_seconds = None
+        self.loaded_at = None
+        self.phases = {}
+
+
+class ReadinessManager:
+    def __init__(self, names, retry_after_seconds=10.0):
+        self.resources = {name: _Resource(name) for name in names}
+        self.retry_after_seconds = retry_after_seconds
+
+    def is_ready(self, name):
+        return self.resources[name].loaded
+
+    def is_loading(self, name):
+        return self.resources[name].loading
+
+    def _claim(self, res, reload):
+        """Become the only loader of res; False if a load is running or not needed"""
+        if not res.load_lock.acquire(blocking=False):
+            return False
+        if res.loaded and not reload:
+            res.load_lock.release()
+            return False
+        with res.lock:
+            res.loading = True
+            res.attempts += 1
+            res.phases = {}
+            res.done.clear()
+        return True
+
+    def _run(self, res, loader):
+        started = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            with res.lock:
+                res.error = str(e)
+                res.last_failure = time.monotonic()
+            print(f"Loading {res.name} failed: {e}")
+            return False
+        else:
+            with res.lock:
+                res.loaded = True
+                res.error = None
+                res.load_seconds = round(time.perf_counter() - started, 3)
+                res.loaded_at = time.time()
+            print(f"{res.name} ready in {res.load_seconds:.2f}s")
+            return True
+        finally:
+            with res.lock:
+                res.loading = False
+            res.done.set()
+            res.load_lock.release()
+
+    def load(self, name, loader, reload=False):
+        """
+        Run loader() as the only loader of this resource, in the calling thread.
+        Returns True when this call loaded the resource or it was already ready
+        (and reload was not requested); concurrent callers never load twice.
+        """
+        res = self.resources[name]
+        if not self._claim(res, reload):
+            return res.loaded and not reload
+        return self._run(res, loader)
+
+    def load_in_background(self, name, loader):
+        """Start a background load unless one is running or a recent attempt just failed"""
+        res = self.resources[name]
+        if res.last_failure is not None and time.monotonic() - res.last_failure < self.retry_after_seconds:
+            return
+        if self._claim(res, reload=False):
+            threading.Thread(target=self._run, args=(res, loader), daemon=True).start()
+
+    def wait(self, name, timeout):
+        """Block up to timeout seconds for a load in progress; returns readiness"""
+        res = self.resources[name]
+        if not res.loaded and timeout and timeout > 0:
+            res.done.wait(timeout)
+        return res.loaded
+
+    @contextmanager
+    def phase(self, name, phase):
+        """Time one phase of a resource load"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.resources[name].phases[phase] = round(time.perf_counter() - started, 3)
+
+    def status(self):
+        out = {}
+        for name, res in self.resources.items():
+            with res.lock:
+                if res.loading:
+                    state = 'reloading' if res.loaded else 'loading'
+                elif res.loaded:
+                    state = 'ready'
+                elif res.error is not None:
+                    state = 'failed'
+                else:
+                    state = 'idle'
+                out[name] = {
+                    'state': state,
+                    'attempts': res.attempts,
+                    'error': res.error,
+                    'load_seconds': res.load_seconds,
+                    'phases': dict(res.phases)
+                }
+        return out
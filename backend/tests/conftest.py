@@ -0,0 +1,105 @@
+# Shared fixtures: app.py imported against an in-memory MongoDB (mongomock)
+#
+# Run from backend/:
+#   pip install -r requirements-dev.txt
+#   python -m pytest
+
+import os
+import sys
+
+import mongomock
+import pymongo
+import pytest
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+# No background model polling, caches or dataset cache files during tests
+os.environ.setdefault('MODEL_REGISTRY_POLL_SECONDS', '0')
+os.environ.setdefault('PREDICTION_CACHE_SIZE', '0')
+os.environ.setdefault('DATASET_CACHE', 'false')
+os.environ.setdefault('DATASET_PATH', os.path.join(REPO_DIR, 'powergrid_realistic_material_dataset1.csv'))
+os.environ.setdefault('ACCESS_SCOPE_TTL_SECONDS', '0')
+os.environ.setdefault('JWT_SECRET_KEY', 'plangrid-test-suite-secret-key-0123456789')
+
+
+def _bulk_write(self, requests, ordered=True, **kwargs):
+    """
+    mongomock's bulk_write cannot take pymongo 4 operation objects; apply
+    them one by one with the single-document methods instead
+    """
+    counts = {'nInserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'nUpserted': 0, 'upserted': []}
+    for index, op in enumerate(requests):
+        if isinstance(op, (UpdateOne, UpdateMany)):
+            update = self.update_one if isinstance(op, UpdateOne) else self.update_many
+            options = {'upsert': op._upsert}
+            if op._array_filters:
+                options['array_filters'] = op._array_filters
+            result = update(op._filter, op._doc, **options)
+            counts['nMatched'] += result.matched_count
+            counts['nModified'] += result.modified_count
+            if result.upserted_id is not None:
+                counts['nUpserted'] += 1
+                counts['upserted'].append({'index': index, '_id': result.upserted_id})
+        elif isinstance(op, ReplaceOne):
+            result = self.replace_one(op._filter, op._doc, upsert=op._upsert)
+            counts['nMatched'] += result.matched_count
+            counts['nModified'] += result.modified_count
+        elif isinstance(op, InsertOne):
+            self.insert_one(op._doc)
+            counts['nInserted'] += 1
+        elif isinstance(op, (DeleteOne, DeleteMany)):
+            delete = self.delete_one if isinstance(op, DeleteOne) else self.delete_many
+            counts['nRemoved'] += delete(op._filter).deleted_count
+        else:
+            raise TypeError(f'Unsupported bulk operation {op!r}')
+    return BulkWriteResult(counts, True)
+
+
+mongomock.Collection.bulk_write = _bulk_write
+
+
+class _MockClient(mongomock.MongoClient):
+    """Accepts (and ignores) the pool/timeout options app.init_db passes"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+
+
+@pytest.fixture(scope='session')
+def appmod():
+    original = pymongo.MongoClient
+    pymongo.MongoClient = _MockClient
+    try:
+        import app
+    finally:
+        pymongo.MongoClient = original
+    return app
+
+
+@pytest.fixture
+def db(appmod):
+    """The app's database, emptied before each test"""
+    for name in appmod.db.list_collection_names():
+        appmod.db[name].delete_many({})
+    appmod.access_scopes.clear()
+    return appmod.db
+
+
+@pytest.fixture
+def auth_headers(appmod):
+    from flask_jwt_extended import create_access_token
+
+    def headers(username):
+        with appmod.app.app_context():
+            return {'Authorization': f'Bearer {create_access_token(identity=username)}'}
+    return headers
+
+
+@pytest.fixture
+def mongo_db():
+    """A fresh in-memory database, for tests of the storage classes on their own"""
+    return mongomock.MongoClient()['test']
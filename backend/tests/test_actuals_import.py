@@ -0,0 +1,162 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from dashboard_rollups import DashboardRollups
+from forecast_store import LAYOUT_MONTHLY, ForecastStore
+
+MATERIALS = ['quantity_steel_tons', 'quantity_copper_tons', 'quantity_cement_tons']
+
+
+@pytest.fixture
+def store(appmod, db, monkeypatch):
+    """Monthly-layout store with forecasts for alice's P1 (Jan-Mar 2025) and bob's P2"""
+    store = ForecastStore(db, layout=LAYOUT_MONTHLY)
+    monkeypatch.setattr(appmod, 'forecast_store', store)
+    monkeypatch.setattr(appmod, 'dashboard_rollups', DashboardRollups(db, store, mode='false'))
+    monkeypatch.setattr(appmod, 'get_model_bundle', lambda wait_seconds=None: SimpleNamespace(target_cols=MATERIALS))
+
+    db['projects'].insert_many([
+        {'project_id': 'P1', 'name': 'Alice line', 'created_by': 'alice'},
+        {'project_id': 'P2', 'name': 'Bob line', 'created_by': 'bob'}
+    ])
+    for project_id in ('P1', 'P2'):
+        for month in ('2025-01', '2025-02', '2025-03'):
+            store.save_month(project_id, month, {col: 10.0 for col in MATERIALS})
+    return store
+
+
+def upload(client, headers, body, content_type='text/csv'):
+    return client.post('/api/actual-values/import', data=body, content_type=content_type, headers=headers)
+
+
+def actuals(store, project_id, month):
+    entry = store.months.find_one({'project_id': project_id, 'forecast_month': month})
+    return entry.get('actual_values')
+
+
+def test_csv_rows_are_saved(appmod, store, auth_headers):
+    body = (
+        'project_id,month,quantity_steel_tons,quantity_copper_tons\n'
+        'P1,2025-01,12.5,3\n'
+        'P1,2025-02,,4.25\n'
+    )
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body)
+
+    assert response.status_code == 200
+    summary = response.json['summary']
+    assert summary['saved_rows'] == 2 and summary['failed_rows'] == 0
+    assert [row['status'] for row in response.json['results']] == ['saved', 'saved']
+    assert actuals(store, 'P1', '2025-01') == {'quantity_steel_tons': 12.5, 'quantity_copper_tons': 3.0}
+    # Empty cells are left out rather than stored as zero
+    assert actuals(store, 'P1', '2025-02') == {'quantity_copper_tons': 4.25}
+
+
+def test_ndjson_rows_are_saved(appmod, store, auth_headers):
+    body = '\n'.join(json.dumps(row) for row in [
+        {'project_id': 'P1', 'forecast_month': '2025-03', 'quantity_cement_tons': 7},
+        {'project_id': 'P1', 'month': '2025-13', 'quantity_cement_tons': 7}
+    ])
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body, 'application/x-ndjson')
+
+    results = response.json['results']
+    assert results[0]['status'] == 'saved'
+    assert results[1] == {'row': 2, 'status': 'error', 'error': "Invalid month '2025-13', expected YYYY-MM"}
+    assert actuals(store, 'P1', '2025-03') == {'quantity_cement_tons': 7.0}
+
+
+def test_row_with_more_fields_than_header(appmod, store, auth_headers):
+    body = 'project_id,month,quantity_steel_tons\nP1,2025-01,1,2,3\nP1,2025-02,4\n'
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body)
+
+    first, second = response.json['results']
+    assert first['status'] == 'error'
+    assert first['error'] == 'Row has more fields than the header (2 extra)'
+    assert second['status'] == 'saved'
+    assert actuals(store, 'P1', '2025-01') == {}
+
+
+def test_unknown_material_columns(appmod, store, auth_headers):
+    body = 'project_id,month,quantity_steel_tons,quantity_gold_tons,notes\nP1,2025-01,1,2,x\n'
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body)
+
+    entry = response.json['results'][0]
+    assert entry['status'] == 'error'
+    assert entry['error'] == 'Unknown material columns: notes, quantity_gold_tons'
+    assert response.json['summary']['saved_rows'] == 0
+
+
+def test_invalid_value_and_empty_row(appmod, store, auth_headers):
+    body = 'project_id,month,quantity_steel_tons\nP1,2025-01,lots\nP1,2025-02,\n'
+    results = upload(appmod.app.test_client(), auth_headers('alice'), body).json['results']
+
+    assert results[0]['error'] == "Invalid value for quantity_steel_tons: 'lots'"
+    assert results[1]['error'] == 'Row has no material values'
+
+
+def test_rows_over_the_limit_are_not_read(appmod, store, auth_headers, monkeypatch):
+    monkeypatch.setattr(appmod, 'ACTUALS_IMPORT_MAX_ROWS', 2)
+    body = 'project_id,month,quantity_steel_tons\n' + ''.join(f'P1,2025-0{m},{m}\n' for m in (1, 2, 3))
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body)
+
+    summary = response.json['summary']
+    assert summary['truncated'] is True
+    assert summary['total_rows'] == 2 and summary['saved_rows'] == 2
+    assert actuals(store, 'P1', '2025-03') == {}
+
+
+def test_other_users_project_is_denied(appmod, store, auth_headers):
+    body = 'project_id,month,quantity_steel_tons\nP2,2025-01,5\nP1,2025-01,6\nP1,2030-01,7\n'
+    results = upload(appmod.app.test_client(), auth_headers('alice'), body).json['results']
+
+    assert results[0] == {'row': 1, 'project_id': 'P2', 'month': '2025-01', 'status': 'error', 'error': 'Project not found or access denied'}
+    assert results[1]['status'] == 'saved'
+    assert results[2]['error'] == 'No forecast found for month 2030-01'
+    assert actuals(store, 'P2', '2025-01') == {}
+
+
+def test_chunk_boundary(appmod, store, auth_headers, monkeypatch):
+    monkeypatch.setattr(appmod, 'ACTUALS_IMPORT_CHUNK_ROWS', 2)
+    # Rows 2 and 3 update the same month from different chunks; the later row wins
+    body = (
+        'project_id,month,quantity_steel_tons\n'
+        'P1,2025-01,1\n'
+        'P1,2025-02,2\n'
+        'P1,2025-02,3\n'
+        'P2,2025-01,4\n'
+        'P1,2025-03,5\n'
+    )
+    response = upload(appmod.app.test_client(), auth_headers('alice'), body)
+
+    summary = response.json['summary']
+    assert summary['total_rows'] == 5
+    assert summary['saved_rows'] == 4
+    # Chunks [1, 2], [3, 4] and [5]; each with a saved row makes one bulk write
+    assert summary['bulk_writes'] == 3
+    assert [row['status'] for row in response.json['results']] == ['saved', 'saved', 'saved', 'error', 'saved']
+    assert actuals(store, 'P1', '2025-02') == {'quantity_steel_tons': 3.0}
+    assert actuals(store, 'P1', '2025-03') == {'quantity_steel_tons': 5.0}
+
+
+def test_array_layout_writes_use_array_filters(appmod, db, store, auth_headers, monkeypatch):
+    array_store = ForecastStore(db)
+    array_store.save_month('P1', '2025-04', {col: 10.0 for col in MATERIALS})
+    writes = []
+    monkeypatch.setattr(appmod, 'forecast_store', array_store)
+    monkeypatch.setattr(array_store, 'bulk_write', writes.append)
+
+    body = 'project_id,month,quantity_steel_tons\nP1,2025-04,9\n'
+    assert upload(appmod.app.test_client(), auth_headers('alice'), body).json['summary']['saved_rows'] == 1
+
+    (op,), = writes
+    assert op._filter == {'project_id': 'P1', 'forecasts.forecast_month': '2025-04'}
+    assert op._array_filters == [{'m.forecast_month': '2025-04'}]
+    assert op._doc['$set']['forecasts.$[m].actual_values'] == {'quantity_steel_tons': 9.0}
+
+
+def test_rejects_unknown_format(appmod, store, auth_headers):
+    response = appmod.app.test_client().post(
+        '/api/actual-values/import?format=xlsx', data=b'', headers=auth_headers('alice')
+    )
+    assert response.status_code == 400
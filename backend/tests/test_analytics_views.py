@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics_views import AggregateIndex
+from dataset_schema import SEASON_BY_MONTH, compact_frame
+
+from conftest import REPO_DIR
+
+METRICS = ['budget', 'quantity_steel_tons', 'lead_time_days']
+
+
+def sample_frame(rows=400, seed=7):
+    rng = np.random.default_rng(seed)
+    start_months = rng.integers(1, 13, rows)
+    frame = pd.DataFrame({
+        'timestamp': rng.choice(['01-01-2025', '02-01-2025', '03-01-2025'], rows),
+        'project_id': [f'P{i % 40:04d}' for i in range(rows)],
+        'budget': np.round(rng.uniform(1e6, 5e7, rows), 2),
+        'project_location': rng.choice(['North', 'South', 'East'], rows),
+        'tower_type': rng.choice(['Tension', 'Suspension'], rows),
+        'substation_type': rng.choice(['132 kV AIS', '220 kV GIS'], rows),
+        'project_start_month': start_months,
+        'lead_time_days': rng.integers(10, 90, rows),
+        'region_risk_flag': rng.choice(['Low', 'Medium', 'High'], rows),
+        'quantity_steel_tons': np.round(rng.uniform(5, 50, rows), 2)
+    })
+    # A few missing values, which count/mean/min/max skip like pandas does
+    frame.loc[rng.choice(rows, 20, replace=False), 'quantity_steel_tons'] = np.nan
+    return frame
+
+
+def expected(frame, group_by, filters=None):
+    for dim, values in (filters or {}).items():
+        frame = frame[frame[dim].isin(values)]
+    grouped = frame.groupby(group_by, sort=True)
+    out = grouped[METRICS].agg(['sum', 'mean', 'min', 'max'])
+    out.columns = [f'{col}_{agg}' for col, agg in out.columns]
+    out['count'] = grouped.size()
+    return out.reset_index()
+
+
+def query(index, group_by, filters=None):
+    metrics = [('count', None)] + [(col, agg) for col in METRICS for agg in ('sum', 'mean', 'min', 'max')]
+    return pd.DataFrame(index.query(*index.normalize(group_by, metrics, filters or {})))
+
+
+def assert_matches(index, frame, group_by, filters=None):
+    got = query(index, group_by, filters)
+    want = expected(frame, group_by, filters)
+    assert list(got[group_by].itertuples(index=False)) == list(want[group_by].itertuples(index=False))
+    assert got['count'].tolist() == want['count'].tolist()
+    for col in METRICS:
+        for agg in ('sum', 'mean', 'min', 'max'):
+            name = f'{col}_{agg}'
+            np.testing.assert_allclose(got[name].astype(float), want[name].astype(float), rtol=1e-12, err_msg=name)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('group_by,filters', [
+    (['project_location'], None),
+    (['project_location', 'tower_type'], {'region_risk_flag': ['Low', 'High']}),
+    (['season', 'substation_type'], {'tower_type': ['Tension']}),
+    (['month'], None)
+])
+def test_matches_pandas_groupby_with_season_column(compact, group_by, filters):
+    frame = sample_frame()
+    frame['season'] = frame['project_start_month'].map(SEASON_BY_MONTH)
+    raw = frame.assign(month=pd.to_datetime(frame['timestamp']).dt.to_period('M').astype(str))
+
+    index = AggregateIndex.build(compact_frame(frame, log=lambda message: None) if compact else frame)
+
+    assert_matches(index, raw, group_by, filters)
+
+
+def test_season_derived_from_start_date():
+    frame = sample_frame()
+    months = frame['project_start_month']
+    # start_date wins over project_start_month when both are present
+    frame['start_date'] = [f'2024-{(m % 12) + 1:02d}-15' for m in months]
+    raw = frame.assign(season=((months % 12) + 1).map(SEASON_BY_MONTH))
+
+    index = AggregateIndex.build(frame)
+
+    assert 'season' in index.dimensions
+    assert_matches(index, raw, ['season', 'project_location'])
+
+
+def test_season_derived_from_project_start_month():
+    frame = sample_frame()
+    raw = frame.assign(season=frame['project_start_month'].map(SEASON_BY_MONTH))
+
+    index = AggregateIndex.build(frame)
+
+    assert_matches(index, raw, ['season'], {'season': ['Summer', 'Winter']})
+
+
+def test_season_dimension_dropped_without_a_month_source():
+    frame = sample_frame().drop(columns=['project_start_month', 'timestamp'])
+
+    index = AggregateIndex.build(frame)
+
+    assert 'season' not in index.dimensions and 'month' not in index.dimensions
+    with pytest.raises(ValueError, match='Cannot group by season'):
+        index.normalize(['season'], [('count', None)], {})
+
+
+def test_unknown_values_are_rejected():
+    index = AggregateIndex.build(sample_frame())
+    with pytest.raises(ValueError, match="Unknown season 'Spring'"):
+        index.normalize([], [('count', None)], {'season': ['Spring']})
+    with pytest.raises(ValueError, match='Unknown aggregation median'):
+        index.normalize([], [('budget', 'median')], {})
+
+
+DATASET1 = os.path.join(REPO_DIR, 'powergrid_realistic_material_dataset1.csv')
+
+
+@pytest.mark.skipif(not os.path.exists(DATASET1), reason='dataset1 CSV not available')
+def test_readme_season_example_on_dataset1():
+    frame = pd.read_csv(DATASET1)
+    assert 'season' not in frame.columns
+    raw = frame.assign(season=frame['project_start_month'].map(SEASON_BY_MONTH))
+
+    index = AggregateIndex.build(compact_frame(frame, log=lambda message: None))
+
+    got = query(index, ['project_location', 'season'], {'season': ['Summer', 'Winter']})
+    want = expected(raw, ['project_location', 'season'], {'season': ['Summer', 'Winter']})
+    assert got['count'].tolist() == want['count'].tolist()
+    np.testing.assert_allclose(got['quantity_steel_tons_sum'], want['quantity_steel_tons_sum'], rtol=1e-12)
@@ -0,0 +1,58 @@
+import json
+import os
+
+import pytest
+
+from compiled_model import FORMAT_VERSION, is_fresh
+from model_registry import ARTIFACT_FILES, ModelRegistry, artifact_checksums, checksum_fingerprint
+
+CHECKSUMS = {role: f'{index:064x}' for index, role in enumerate(ARTIFACT_FILES, start=1)}
+
+
+def write_manifest(compiled_dir, artifact_sha256, format_version=FORMAT_VERSION):
+    os.makedirs(compiled_dir, exist_ok=True)
+    with open(os.path.join(compiled_dir, 'manifest.json'), 'w') as f:
+        json.dump({'format_version': format_version, 'artifact_sha256': artifact_sha256}, f)
+
+
+def test_fresh_when_every_checksum_matches(tmp_path):
+    write_manifest(tmp_path, CHECKSUMS)
+    assert is_fresh(str(tmp_path), CHECKSUMS)
+    # The model server only checks the boosters
+    assert is_fresh(str(tmp_path), {'model': CHECKSUMS['model']})
+
+
+def test_stale_when_a_checksum_differs(tmp_path):
+    write_manifest(tmp_path, CHECKSUMS)
+    assert not is_fresh(str(tmp_path), {**CHECKSUMS, 'label_encoders': 'f' * 64})
+
+
+@pytest.mark.parametrize('checksums', [{}, {'model': None}, {'model': ''}])
+def test_stale_without_a_checksum(tmp_path, checksums):
+    write_manifest(tmp_path, CHECKSUMS)
+    assert not is_fresh(str(tmp_path), checksums)
+
+
+def test_stale_when_the_export_lacks_a_role(tmp_path):
+    write_manifest(tmp_path, {role: sha for role, sha in CHECKSUMS.items() if role != 'feature_cols'})
+    assert not is_fresh(str(tmp_path), CHECKSUMS)
+
+
+def test_stale_without_manifest_or_on_old_format(tmp_path):
+    assert not is_fresh(str(tmp_path / 'missing'), CHECKSUMS)
+    write_manifest(tmp_path, CHECKSUMS, format_version=FORMAT_VERSION - 1)
+    assert not is_fresh(str(tmp_path), CHECKSUMS)
+
+
+def test_registry_checksums_match_the_files(tmp_path):
+    source = {}
+    for role, name in ARTIFACT_FILES.items():
+        source[role] = str(tmp_path / name)
+        with open(source[role], 'wb') as f:
+            f.write(role.encode('utf-8'))
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    registry.publish('v1', source)
+
+    paths = registry.verify('v1')
+    assert registry.checksums('v1') == artifact_checksums(paths) == artifact_checksums(source)
+    assert registry.fingerprint('v1') == checksum_fingerprint(artifact_checksums(source))
@@ -0,0 +1,129 @@
+import pytest
+
+from dashboard_rollups import DashboardRollups
+from forecast_store import LAYOUT_MONTHLY, ForecastStore
+
+MATERIALS = ['quantity_steel_tons', 'quantity_copper_tons']
+
+
+def fail_bulk_write(*args, **kwargs):
+    raise RuntimeError('rollups unavailable')
+
+
+@pytest.fixture
+def rollups(appmod, db, monkeypatch):
+    """Rollups in use (rebuilt) over alice's P1 and P2, Jan-Feb 2025"""
+    store = ForecastStore(db, layout=LAYOUT_MONTHLY)
+    rollups = DashboardRollups(db, store, mode='true')
+    monkeypatch.setattr(appmod, 'forecast_store', store)
+    monkeypatch.setattr(appmod, 'dashboard_rollups', rollups)
+    db['projects'].insert_many([
+        {'project_id': 'P1', 'created_by': 'alice', 'status': 'IN PROGRESS'},
+        {'project_id': 'P2', 'created_by': 'alice', 'status': 'IN PROGRESS'}
+    ])
+    for project_id in ('P1', 'P2'):
+        for month in ('2025-01', '2025-02'):
+            store.save_month(project_id, month, {col: 10.0 for col in MATERIALS})
+            store.set_actual_values(project_id, month, {col: 8.0 for col in MATERIALS}, 'alice')
+    rollups.rebuild(log=lambda message: None)
+    return rollups
+
+
+def save_forecast(appmod, rollups, project_id, month, value):
+    """Store a forecast and its rollup update, the way the forecast routes do"""
+    results = {col: value for col in MATERIALS}
+    appmod.forecast_store.bulk_write(appmod.forecast_store.month_write_ops(project_id, month, results))
+    rollups.write([rollups.forecast_op(project_id, month, results)])
+
+
+def test_failed_write_is_counted_and_marked_dirty(appmod, rollups, monkeypatch):
+    monkeypatch.setattr(rollups.rollups, 'bulk_write', fail_bulk_write)
+    save_forecast(appmod, rollups, 'P1', '2025-02', 50.0)
+
+    assert rollups.dirty_months() == {('P1', '2025-02')}
+    assert rollups.dirty_months(['P2']) == set()
+    stats = rollups.stats()
+    assert stats['write_failures'] == 1 and stats['dirty_months'] == 1
+    assert 'rollups unavailable' in stats['last_write_error']
+
+
+def test_dirty_months_are_kept_in_memory_until_they_can_be_recorded(appmod, rollups, monkeypatch):
+    monkeypatch.setattr(rollups.rollups, 'bulk_write', fail_bulk_write)
+    monkeypatch.setattr(rollups.dirty, 'bulk_write', fail_bulk_write)
+    save_forecast(appmod, rollups, 'P1', '2025-02', 50.0)
+    assert rollups.dirty_months() == {('P1', '2025-02')}
+    assert rollups.stats()['unrecorded_dirty_months'] == 1
+
+    monkeypatch.undo()
+    assert rollups.dirty_months() == {('P1', '2025-02')}
+    assert rollups.stats()['unrecorded_dirty_months'] == 0
+    assert rollups.dirty.count_documents({}) == 1
+
+
+def test_rebuild_clears_dirty_months(appmod, rollups, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(rollups.rollups, 'bulk_write', fail_bulk_write)
+        save_forecast(appmod, rollups, 'P1', '2025-02', 50.0)
+    rollups.rebuild(log=lambda message: None)
+
+    assert rollups.dirty_months() == set()
+    assert rollups.rollups.find_one({'project_id': 'P1', 'month': '2025-02'})['forecast_total'] == 100.0
+
+
+def stored_totals(store, project_ids, month_range=None, column=None):
+    """What stored_month_totals() aggregates, summed in Python (mongomock lacks $convert)"""
+    totals = {}
+    for project_id in project_ids:
+        for entry in store.project_months(project_id):
+            month = totals.setdefault(entry['forecast_month'], {'forecast_total': 0, 'actual_total': 0, 'count': 0})
+            for field, key in (('predictions', 'forecast_total'), ('actual_values', 'actual_total')):
+                values = entry.get(field) or {}
+                month[key] += values.get(column, 0) if column else sum(values.values())
+            month['count'] += 1
+    return [{'_id': month, **totals[month]} for month in sorted(totals)]
+
+
+@pytest.mark.parametrize('column', [None, 'quantity_steel_tons'])
+def test_trends_read_dirty_projects_from_storage(appmod, rollups, monkeypatch, column):
+    save_forecast(appmod, rollups, 'P2', '2025-03', 30.0)
+    with monkeypatch.context() as patch:
+        patch.setattr(rollups.rollups, 'bulk_write', fail_bulk_write)
+        save_forecast(appmod, rollups, 'P1', '2025-02', 50.0)
+        save_forecast(appmod, rollups, 'P1', '2025-04', 5.0)
+
+    stored_reads = []
+
+    def stored_month_totals(project_ids, month_range=None, column=None):
+        stored_reads.append(set(project_ids))
+        return stored_totals(rollups.store, project_ids, month_range, column)
+
+    monkeypatch.setattr(appmod, 'stored_month_totals', stored_month_totals)
+    expected = stored_totals(rollups.store, ['P1', 'P2'], column=column)
+    assert [month['_id'] for month in expected] == ['2025-01', '2025-02', '2025-03', '2025-04']
+    assert appmod.trend_month_totals(['P1', 'P2'], column=column) == expected
+    assert stored_reads == [{'P1'}]
+    # The stale rollups alone would still report the old P1 forecasts
+    assert rollups.monthly_totals(['P1', 'P2'], column=column) != expected
+
+
+def test_metrics_and_health_report_dirty_rollups(appmod, rollups, monkeypatch, auth_headers):
+    client = appmod.app.test_client()
+    pipelines = []
+    aggregate = appmod.projects_collection.aggregate
+    monkeypatch.setattr(appmod.projects_collection, 'aggregate', lambda stages: pipelines.append(stages) or aggregate(stages))
+    assert client.get('/api/dashboard/metrics', headers=auth_headers('alice')).status_code == 200
+    assert 'dashboard_rollups' in str(pipelines.pop())
+
+    with monkeypatch.context() as patch:
+        patch.setattr(rollups.rollups, 'bulk_write', fail_bulk_write)
+        save_forecast(appmod, rollups, 'P1', '2025-02', 50.0)
+
+    # A scope with a dirty month runs on the stored entries, as with rollups off
+    for mode in ('true', 'false'):
+        monkeypatch.setattr(rollups, 'mode', mode)
+        assert client.get('/api/dashboard/metrics', headers=auth_headers('alice')).status_code == 200
+    assert pipelines[0] == pipelines[1]
+    assert 'dashboard_rollups' not in str(pipelines[0])
+
+    health = client.get('/api/health').json['dashboard_rollups']
+    assert health['write_failures'] == 1 and health['dirty_months'] == 1
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from dashboard_rollups import DashboardRollups
+from feature_pipeline import FeaturePipeline
+from forecast_store import LAYOUT_MONTHLY, ForecastStore
+
+FEATURES = ['budget', 'project_size_km', 'project_start_month', 'project_end_month']
+MATERIALS = ['quantity_steel_tons', 'quantity_copper_tons']
+
+
+class RecordingPipeline(FeaturePipeline):
+    def __init__(self):
+        super().__init__(FEATURES, {})
+        self.rows = []
+
+    def transform(self, payloads):
+        self.rows.extend(payloads)
+        return super().transform(payloads)
+
+
+@pytest.fixture
+def bundle(appmod, db, monkeypatch):
+    store = ForecastStore(db, layout=LAYOUT_MONTHLY)
+    bundle = SimpleNamespace(
+        feature_cols=FEATURES,
+        target_cols=MATERIALS,
+        version='test-model',
+        pipeline=RecordingPipeline(),
+        engine=SimpleNamespace(predict=lambda matrix: np.ones((len(matrix), len(MATERIALS))))
+    )
+    monkeypatch.setattr(appmod, 'forecast_store', store)
+    monkeypatch.setattr(appmod, 'dashboard_rollups', DashboardRollups(db, store, mode='false'))
+    monkeypatch.setattr(appmod, 'get_model_bundle', lambda wait_seconds=None: bundle)
+    db['projects'].insert_one({'project_id': 'P1', 'created_by': 'alice', 'cost': 5e6, 'project_size_km': 40})
+    return bundle
+
+
+def test_model_rows_hold_only_feature_columns(appmod, bundle, auth_headers):
+    response = appmod.app.test_client().post(
+        '/api/projects/P1/forecast-horizon',
+        json={'start_month': '2025-11', 'horizon': 3, 'project_start_month': 1, 'project_end_month': 4},
+        headers=auth_headers('alice')
+    )
+
+    assert response.status_code == 200
+    assert all(set(row) <= set(FEATURES) for row in bundle.pipeline.rows)
+    assert [row['project_start_month'] for row in bundle.pipeline.rows] == [11, 12, 1]
+    assert [row['project_end_month'] for row in bundle.pipeline.rows] == [2, 3, 4]
+
+    forecasts = response.json['forecasts']
+    assert [f['forecast_month'] for f in forecasts] == ['2025-11', '2025-12', '2026-01']
+    # The season is reported alongside each month but never fed to the model
+    assert all(f['season'] for f in forecasts)
+    assert all(set(f['input_used']) == set(FEATURES) for f in forecasts)
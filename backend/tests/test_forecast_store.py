@@ -0,0 +1,159 @@
+import pytest
+
+from forecast_store import ENCODING_COMPACT, LAYOUT_ARRAY, LAYOUT_MONTHLY, ForecastStore, schema_id
+
+COLUMNS = ['quantity_steel_tons', 'quantity_copper_tons', 'quantity_cement_tons']
+RESULTS = {'quantity_steel_tons': 12.5, 'quantity_copper_tons': 3.0, 'quantity_cement_tons': 40.25}
+
+
+def raw_month(store, project_id, forecast_month):
+    """The stored entry, before decoding"""
+    if store.layout == LAYOUT_MONTHLY:
+        return store.months.find_one({'project_id': project_id, 'forecast_month': forecast_month}, {'_id': 0})
+    doc = store.projects.find_one({'project_id': project_id})
+    return next(entry for entry in doc['forecasts'] if entry['forecast_month'] == forecast_month)
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_MONTHLY, LAYOUT_ARRAY])
+def test_compact_round_trip(mongo_db, layout):
+    store = ForecastStore(mongo_db, layout=layout, encoding=ENCODING_COMPACT)
+    store.save_month('P1', '2025-01', RESULTS)
+
+    raw = raw_month(store, 'P1', '2025-01')
+    assert raw['predictions'] == [12.5, 3.0, 40.25]
+    assert raw['actual_values'] == []
+    assert raw['schema'] == schema_id(COLUMNS)
+
+    entry = store.get_month('P1', '2025-01')
+    assert entry['predictions'] == RESULTS
+    assert entry['actual_values'] == {}
+    assert 'schema' not in entry and 'actual_values_schema' not in entry
+
+
+def test_compact_decode_reads_schema_from_the_collection(mongo_db):
+    ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT).save_month('P1', '2025-01', RESULTS)
+
+    # Another worker that has not seen the schema yet
+    assert ForecastStore(mongo_db, layout=LAYOUT_MONTHLY).get_month('P1', '2025-01')['predictions'] == RESULTS
+
+
+def test_compact_actuals_round_trip(mongo_db):
+    store = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    store.save_month('P1', '2025-01', RESULTS)
+    assert store.set_actual_values('P1', '2025-01', {'quantity_copper_tons': 2.5}, 'alice')
+
+    raw = raw_month(store, 'P1', '2025-01')
+    # Columns without a value are stored as null and left out on decode
+    assert raw['actual_values'] == [None, 2.5, None]
+    assert raw['actual_values_schema'] == raw['schema']
+    assert store.get_month('P1', '2025-01')['actual_values'] == {'quantity_copper_tons': 2.5}
+
+
+def test_actuals_outside_the_schema_fall_back_to_a_dict(mongo_db):
+    store = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    store.save_month('P1', '2025-01', RESULTS)
+    actuals = {'quantity_steel_tons': 1.0, 'quantity_gold_tons': 2.0}
+    store.set_actual_values('P1', '2025-01', actuals, 'alice')
+
+    raw = raw_month(store, 'P1', '2025-01')
+    assert raw['actual_values'] == actuals
+    assert 'actual_values_schema' not in raw
+    entry = store.get_month('P1', '2025-01')
+    assert entry['actual_values'] == actuals
+    assert entry['predictions'] == RESULTS
+
+
+def test_actuals_keep_their_own_schema(mongo_db):
+    store = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    store.save_month('P1', '2025-01', RESULTS)
+    # A new model version reorders its target columns
+    new_columns = list(reversed(COLUMNS)) + ['quantity_oil_tons']
+    store.set_schema(new_columns)
+    store.set_actual_values('P1', '2025-01', {'quantity_steel_tons': 7.0, 'quantity_oil_tons': 1.5}, 'alice')
+
+    raw = raw_month(store, 'P1', '2025-01')
+    assert raw['schema'] == schema_id(COLUMNS)
+    assert raw['actual_values_schema'] == schema_id(new_columns)
+    assert raw['actual_values'] == [None, None, 7.0, 1.5]
+
+    entry = store.get_month('P1', '2025-01')
+    assert entry['predictions'] == RESULTS
+    assert entry['actual_values'] == {'quantity_steel_tons': 7.0, 'quantity_oil_tons': 1.5}
+
+
+@pytest.mark.parametrize('layout', [LAYOUT_MONTHLY, LAYOUT_ARRAY])
+def test_rewrite_without_compact_encoding_drops_schema_fields(mongo_db, layout):
+    compact = ForecastStore(mongo_db, layout=layout, encoding=ENCODING_COMPACT)
+    compact.save_month('P1', '2025-01', RESULTS)
+    if layout == LAYOUT_MONTHLY:
+        compact.set_actual_values('P1', '2025-01', {'quantity_steel_tons': 1.0}, 'alice')
+        assert 'actual_values_schema' in raw_month(compact, 'P1', '2025-01')
+
+    plain = ForecastStore(mongo_db, layout=layout)
+    plain.save_month('P1', '2025-01', {**RESULTS, 'quantity_steel_tons': 99.0})
+
+    raw = raw_month(plain, 'P1', '2025-01')
+    assert raw['predictions'] == {**RESULTS, 'quantity_steel_tons': 99.0}
+    assert raw['actual_values'] == {}
+    assert 'schema' not in raw and 'actual_values_schema' not in raw
+
+
+def test_compact_rewrite_drops_the_old_actuals_schema(mongo_db):
+    store = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    store.save_month('P1', '2025-01', RESULTS)
+    store.set_actual_values('P1', '2025-01', {'quantity_steel_tons': 1.0}, 'alice')
+    store.save_month('P1', '2025-01', RESULTS)
+
+    raw = raw_month(store, 'P1', '2025-01')
+    assert raw['actual_values'] == [] and 'actual_values_schema' not in raw
+
+
+def test_dict_actuals_drop_a_compact_actuals_schema(mongo_db):
+    compact = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    compact.save_month('P1', '2025-01', RESULTS)
+    compact.set_actual_values('P1', '2025-01', {'quantity_steel_tons': 1.0}, 'alice')
+
+    ForecastStore(mongo_db, layout=LAYOUT_MONTHLY).set_actual_values('P1', '2025-01', {'quantity_steel_tons': 2.0}, 'bob')
+
+    raw = raw_month(compact, 'P1', '2025-01')
+    assert raw['actual_values'] == {'quantity_steel_tons': 2.0}
+    assert 'actual_values_schema' not in raw
+    assert raw['schema'] == schema_id(COLUMNS)
+    assert compact.get_month('P1', '2025-01')['predictions'] == RESULTS
+
+
+def test_array_layout_actuals_unset_the_stale_schema():
+    store = ForecastStore.__new__(ForecastStore)
+    store.layout, store.encoding, store.current_schema = LAYOUT_ARRAY, 'dict', None
+
+    op = store.actual_values_write_op('P1', '2025-01', {'quantity_steel_tons': 1.0}, 'alice')
+
+    assert op._doc['$unset'] == {'forecasts.$[m].actual_values_schema': ''}
+    assert op._array_filters == [{'m.forecast_month': '2025-01'}]
+
+
+def test_column_value_expr_reads_dict_and_compact_entries(mongo_db):
+    compact = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY, encoding=ENCODING_COMPACT)
+    compact.save_month('P1', '2025-01', RESULTS)
+    new_columns = ['quantity_cement_tons', 'quantity_copper_tons']
+    compact.set_schema(new_columns)
+    compact.set_actual_values('P1', '2025-01', {'quantity_copper_tons': 4.0}, 'alice')
+    plain = ForecastStore(mongo_db, layout=LAYOUT_MONTHLY)
+    plain.save_month('P2', '2025-01', {'quantity_copper_tons': 5.0})
+    plain.set_actual_values('P2', '2025-01', {'quantity_copper_tons': 6.0}, 'alice')
+
+    def column(field, name):
+        expr = compact.column_value_expr(field, name)['$convert']
+        assert expr['onNull'] == 0 and expr['onError'] == 0
+        # mongomock has no $convert; evaluate what it converts
+        docs = compact.months.aggregate([
+            {'$sort': {'project_id': 1}},
+            {'$project': {'_id': 0, 'project_id': 1, 'value': expr['input']}}
+        ])
+        return {doc['project_id']: doc.get('value') for doc in docs}
+
+    assert column('predictions', 'quantity_copper_tons') == {'P1': 3.0, 'P2': 5.0}
+    assert column('predictions', 'quantity_cement_tons') == {'P1': 40.25, 'P2': None}
+    # P1's actuals use the second schema, where copper is at position 1
+    assert column('actual_values', 'quantity_copper_tons') == {'P1': 4.0, 'P2': 6.0}
+    assert column('actual_values', 'quantity_steel_tons') == {'P1': None, 'P2': None}
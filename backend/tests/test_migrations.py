@@ -0,0 +1,143 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import forecast_store
+from forecast_store import LEGACY_MIGRATION_ID, ForecastStore
+
+
+def quiet(message):
+    pass
+
+
+@pytest.fixture
+def legacy(mongo_db):
+    """Five legacy forecasts documents, one month each for P0..P4"""
+    mongo_db['forecasts'].insert_many([
+        {'project_id': f'P{i}', 'forecast_month': '2025-01', 'predictions': {'quantity_steel_tons': float(i)}}
+        for i in range(5)
+    ])
+    return mongo_db['forecasts']
+
+
+def checkpoint(db):
+    return db['migrations'].find_one({'_id': LEGACY_MIGRATION_ID})
+
+
+def hold_lease(db, owner, seconds):
+    db['migrations'].update_one(
+        {'_id': LEGACY_MIGRATION_ID},
+        {'$set': {'lease_owner': owner, 'lease_until': datetime.now(timezone.utc) + timedelta(seconds=seconds)}},
+        upsert=True
+    )
+
+
+def test_migration_completes_and_releases_its_lease(mongo_db, legacy):
+    store = ForecastStore(mongo_db)
+    assert store.migrate_legacy(legacy, batch_size=2, log=quiet) == {'documents': 5, 'write_ops': 10}
+
+    state = checkpoint(mongo_db)
+    assert state['documents'] == 5 and state['completed_at']
+    assert 'lease_owner' not in state and 'lease_until' not in state
+    assert mongo_db['project_forecasts'].count_documents({}) == 5
+    assert store.legacy_read_enabled() is False
+
+
+def test_live_lease_blocks_another_run(mongo_db, legacy):
+    hold_lease(mongo_db, 'other-worker', 60)
+    messages = []
+
+    assert ForecastStore(mongo_db).migrate_legacy(legacy, log=messages.append) is None
+    assert messages == [f'{LEGACY_MIGRATION_ID}: already running in another process']
+    assert mongo_db['project_forecasts'].count_documents({}) == 0
+    assert checkpoint(mongo_db)['lease_owner'] == 'other-worker'
+
+
+def test_concurrent_claimers_get_one_lease(mongo_db):
+    stores = [ForecastStore(mongo_db) for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    won = []
+
+    def claim(store, owner):
+        barrier.wait()
+        if store._acquire_migration_lease(LEGACY_MIGRATION_ID, owner):
+            won.append(owner)
+
+    threads = [threading.Thread(target=claim, args=(store, f'worker-{i}')) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(won) == 1
+    assert checkpoint(mongo_db)['lease_owner'] == won[0]
+
+
+def test_expired_lease_is_taken_over(mongo_db, legacy):
+    hold_lease(mongo_db, 'crashed-worker', -1)
+
+    assert ForecastStore(mongo_db).migrate_legacy(legacy, log=quiet)['documents'] == 5
+    assert 'lease_owner' not in checkpoint(mongo_db)
+
+
+def test_failed_batch_resumes_from_the_checkpoint(mongo_db, legacy):
+    store = ForecastStore(mongo_db)
+    real_write = store.bulk_write
+    calls = []
+
+    def failing_write(ops):
+        calls.append([op._filter['project_id'] for op in ops])
+        if len(calls) == 2:
+            raise RuntimeError('connection reset')
+        return real_write(ops)
+
+    store.bulk_write = failing_write
+    with pytest.raises(RuntimeError):
+        store.migrate_legacy(legacy, batch_size=2, log=quiet)
+
+    # The first batch is checkpointed and the lease released for the next run
+    state = checkpoint(mongo_db)
+    assert state['documents'] == 2 and 'completed_at' not in state
+    assert 'lease_owner' not in state
+
+    calls.clear()
+    store.bulk_write = lambda ops: calls.append([op._filter['project_id'] for op in ops]) or real_write(ops)
+    assert store.migrate_legacy(legacy, batch_size=2, log=quiet) == {'documents': 5, 'write_ops': 10}
+    # Only the documents after the checkpoint are read again
+    assert [ids[0] for ids in calls] == ['P2', 'P4']
+    assert mongo_db['project_forecasts'].count_documents({}) == 5
+
+
+def test_lost_lease_stops_without_checkpointing(mongo_db, legacy):
+    store = ForecastStore(mongo_db)
+    real_write = store.bulk_write
+
+    def write_then_lose_lease(ops):
+        real_write(ops)
+        # Another worker took over after this one stalled past its lease
+        hold_lease(mongo_db, 'other-worker', 60)
+
+    store.bulk_write = write_then_lose_lease
+    messages = []
+    assert store.migrate_legacy(legacy, batch_size=2, log=messages.append) is None
+    assert messages == [f'{LEGACY_MIGRATION_ID}: lease lost to another process, stopping']
+
+    state = checkpoint(mongo_db)
+    assert state['lease_owner'] == 'other-worker'
+    assert 'documents' not in state
+
+
+def test_each_run_claims_with_its_own_owner(mongo_db, monkeypatch):
+    owners = []
+    real_acquire = ForecastStore._acquire_migration_lease
+    monkeypatch.setattr(
+        ForecastStore, '_acquire_migration_lease',
+        lambda self, migration_id, owner: owners.append(owner) or real_acquire(self, migration_id, owner)
+    )
+    store = ForecastStore(mongo_db)
+    store.migrate_legacy(mongo_db['forecasts'], log=quiet)
+    store.migrate_legacy(mongo_db['forecasts'], log=quiet)
+
+    assert len(set(owners)) == 2
+    assert all(owner.startswith(f'{forecast_store.socket.gethostname()}:') for owner in owners)
@@ -0,0 +1,132 @@
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from model_server import _HEADER, STATUS_OK, MicroBatcher, ModelServerClient, _recv_exact
+
+
+class FakeServer:
+    """Unix socket server that records each predict frame and answers via reply(conn, count)"""
+
+    def __init__(self, path, reply):
+        self.path = path
+        self.reply = reply
+        self.frames = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen(8)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    _, rows, cols = _HEADER.unpack(_recv_exact(conn, _HEADER.size))
+                    _recv_exact(conn, rows * cols * 4)
+                except (ConnectionError, OSError):
+                    return
+                with self.lock:
+                    self.frames += 1
+                    count = self.frames
+                if not self.reply(conn, count):
+                    return
+
+    def close(self):
+        self.listener.close()
+
+
+def ok(conn, count):
+    predictions = np.full((1, 2), float(count))
+    conn.sendall(_HEADER.pack(STATUS_OK, 1, 2) + predictions.tobytes())
+    return True
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'model.sock')
+
+
+def test_read_timeout_is_raised_without_resending(socket_path):
+    server = FakeServer(socket_path, lambda conn, count: time.sleep(1.0) or True)
+    client = ModelServerClient(socket_path, timeout=0.2)
+    with pytest.raises(socket.timeout):
+        client.predict(np.zeros((1, 3)))
+    time.sleep(0.3)
+    assert (server.frames, server.connections) == (1, 1)
+    server.close()
+
+
+def test_dropped_reply_is_raised_without_resending(socket_path):
+    server = FakeServer(socket_path, lambda conn, count: False)
+    client = ModelServerClient(socket_path, timeout=1.0)
+    with pytest.raises(ConnectionError):
+        client.predict(np.zeros((1, 3)))
+    time.sleep(0.1)
+    assert server.frames == 1
+    server.close()
+
+
+def test_reconnects_when_a_stale_connection_breaks_on_send(socket_path):
+    # The first connection is closed right after its reply, as on a server restart
+    server = FakeServer(socket_path, lambda conn, count: ok(conn, count) and count > 1)
+    client = ModelServerClient(socket_path, timeout=1.0)
+    assert client.predict(np.zeros((1, 3))).tolist() == [[1.0, 1.0]]
+    time.sleep(0.1)
+    assert client.predict(np.zeros((1, 3))).tolist() == [[2.0, 2.0]]
+    assert (server.frames, server.connections) == (2, 2)
+    server.close()
+
+
+def test_connect_failure_is_raised_after_one_retry(socket_path):
+    client = ModelServerClient(socket_path, timeout=0.2)
+    with pytest.raises(FileNotFoundError):
+        client.predict(np.zeros((1, 3)))
+
+
+def test_batcher_predicts_each_width_separately():
+    calls = []
+
+    def predict(matrix):
+        calls.append(matrix.shape)
+        if matrix.shape[1] != 3:
+            raise ValueError('wrong width')
+        return matrix[:, :1] * 2
+
+    batcher = MicroBatcher(predict, window_ms=500)
+    results = {}
+
+    def submit(name, matrix):
+        try:
+            results[name] = batcher.submit(matrix)
+        except ValueError as e:
+            results[name] = e
+
+    threads = [
+        threading.Thread(target=submit, args=('a', np.ones((2, 3)))),
+        threading.Thread(target=submit, args=('b', np.ones((1, 3)) * 5)),
+        threading.Thread(target=submit, args=('bad', np.ones((1, 4))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results['a'].tolist() == [[2.0], [2.0]]
+    assert results['b'].tolist() == [[10.0]]
+    assert isinstance(results['bad'], ValueError)
+    assert sorted(calls) == [(1, 4), (3, 3)]